@@ -1,13 +1,73 @@
 import streamlit as st
-import anthropic
 from datetime import datetime
-import time
-import json
-import csv
-import io
-import hashlib
+import os
 import re
-from typing import Dict, List, Optional
+import tempfile
+import time
+import uuid
+from typing import Callable, Optional
+
+# Start of this script run, for the rerun-cost metric recorded at the end
+RERUN_STARTED = time.perf_counter()
+
+from cv_translator import core, documents
+from cv_translator.bulk import (
+    USE_FAKE_BATCHES,
+    collect_bulk_job,
+    get_batches_api,
+    load_bulk_manifests,
+    release_bulk_job,
+    submit_bulk_job,
+)
+from cv_translator.cache import (
+    CACHE_DB_PATH,
+    CACHE_MAX_ENTRIES,
+    CACHE_TTL_DAYS,
+    PersistentTranslationCache,
+    TieredTranslationCache,
+    open_default_cache,
+)
+from cv_translator.core import (
+    CACHE_READ_MULTIPLIER,
+    CACHE_WRITE_MULTIPLIER,
+    CLAUDE_MODELS,
+    calculate_estimated_cost,
+    get_default_drill_prompt,
+    get_default_general_prompt,
+    get_model_cost_per_token,
+    make_http_client,
+    make_scheduled_client,
+    safe_get,
+    split_batch_input,
+)
+from cv_translator.export import EXPORT_FORMATS, pyarrow_available, write_export
+from cv_translator.history import (
+    HISTORY_PAGE_SIZES,
+    HistoryStats,
+    RecordedHistory,
+    SharedHistoryStore,
+    TeamHistoryMirror,
+    get_entry_tokens,
+    open_default_history_store,
+)
+from cv_translator.jobs import CANCELLED, DONE, FAILED, QUEUED, RUNNING, Job, JobQueue
+from cv_translator.memory import (
+    MEMORY_BUDGET_MB,
+    CompactCache,
+    TextStore,
+    format_bytes,
+    get_records_size,
+    open_default_text_store,
+)
+from cv_translator.metrics import METRICS, METRICS_PORT, start_metrics_server
+from cv_translator.normalize import normalize_drill_text
+from cv_translator.scheduler import RequestScheduler
+from cv_translator.search import HistorySearchIndex
+from cv_translator.sections import translate_drill_incremental
+from cv_translator.service import SERVICE_PORT, TranslationService, start_translation_server
+from cv_translator.similar import NearDuplicateIndex, same_numbers, translate_against_neighbour
+from cv_translator.structured import translate_drill_structured
+from cv_translator.tokens import TokenEstimator, count_tokens_api
 
 # Set up the page with improved config
 st.set_page_config(
@@ -16,15 +76,8 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Available Claude models (updated with new models and pricing)
-CLAUDE_MODELS = {
-    "claude-sonnet-4-5-20250929": "Claude Sonnet 4.5 (Recommended)",
-    "claude-sonnet-4-20250514": "Claude Sonnet 4",
-    "claude-3-5-haiku-20241022": "Claude Haiku 3.5"
-}
-
 # Cleaner, more modern CSS
-st.markdown("""
+PAGE_CSS = """
 <style>
     /* Clean, modern design system */
     :root {
@@ -221,167 +274,124 @@ st.markdown("""
         }
     }
 </style>
-""", unsafe_allow_html=True)
-
-def get_default_drill_prompt():
-    """Return the default drill translation prompt"""
-    return """You are a specialized translator for soccer coaching content. Your task is to translate Spanish football drill descriptions into clear, actionable English coaching formats that American coaches can immediately understand and implement.
-
-Here is the Spanish drill description to translate:
+"""
 
-<spanish_drill_description>
-{spanish_text}
-</spanish_drill_description>
+CSS_COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.DOTALL)
 
-## Translation Requirements
+@st.cache_data
+def get_page_css() -> str:
+    """The page CSS without comments and indentation, minified once per process
+    
+    Streamlit needs it re-emitted on every rerun; this keeps that message small.
+    """
+    css = re.sub(r'\s+', ' ', CSS_COMMENT_PATTERN.sub('', PAGE_CSS))
+    return re.sub(r'\s*([{};])\s*', r'\1', css).strip()
 
-Key Principles:
-- Prioritize clarity and natural English over literal translation
-- Convert all measurements from meters to yards (practical rounding is acceptable)
-- Use terminology familiar to American coaches while preserving technical accuracy  
-- Write descriptions that flow naturally and avoid clunky, overly formal language
-- Ensure every instruction is concrete and immediately actionable
-- When you see "Z1", "Z2", "Z3", etc., translate these to "Zone 1", "Zone 2", "Zone 3" with a capital Z
+st.markdown(get_page_css(), unsafe_allow_html=True)
 
-Terminology Guidelines:
-- Keep "rondo" as-is (widely understood in coaching)
-- "centro" → "crossing" or "cross"
-- "activación/calentamiento" → indicates warm-up content
-- Convert measurements: multiply meters by 1.09, round to practical coaching measurements
-- "GRADIENTE (+)" → "More advanced:"
-- "GRADIENTE (-)" → "Simplified:"
-- "Z1", "Z2", "Z3", etc. → "Zone 1", "Zone 2", "Zone 3" with capital Z
+@st.cache_resource
+def get_persistent_cache() -> PersistentTranslationCache:
+    """Open the process-wide persistent cache once and share it across sessions"""
+    return open_default_cache()
 
-## Output Format
+@st.cache_resource
+def get_request_scheduler() -> RequestScheduler:
+    """One scheduler per process, so rate limits and circuit breakers cover every session"""
+    return RequestScheduler()
 
-Provide ONLY the translated content in this exact structure. Do NOT include any analysis, reasoning, or breakdown before the translation. Start directly with the formatted translation:
+@st.cache_resource
+def get_history_store() -> SharedHistoryStore:
+    """One background-written history store per process, shared by every curator"""
+    return open_default_history_store()
 
-Topic
-- [Main skill or technique focus]
+@st.cache_resource
+def get_text_store() -> TextStore:
+    """Process-wide store of history and cache bodies, kept within CV_TRANSLATOR_MEMORY_BUDGET_MB"""
+    return open_default_text_store()
 
-Principle 
-- [Key coaching instruction or technical teaching point]
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """Background translation jobs of every session, served by one pool of worker threads"""
+    return JobQueue()
 
-Microcycle day
-- [When this drill fits in training cycles]
+@st.cache_resource
+def get_similarity_index() -> NearDuplicateIndex:
+    """Near-duplicate index over every drill in the team history, shared across sessions"""
+    return NearDuplicateIndex()
 
-Time
-- [Duration and number of sets]
-
-Players
-- [Total number of players needed]
-
-Physical focus
-- [Specific conditioning aspect]
-
-Space/equipment
-- [Field dimensions in yards and required equipment]
-
-Description
-- [Clear, step-by-step explanation in natural, flowing English]
-
-Progressions
-- More advanced: [Ways to increase difficulty]
-- Simplified: [Ways to reduce complexity]
-
-Coaching points
-- [Brief title]: [Specific, actionable instruction]
-- [Brief title]: [Specific, actionable instruction]  
-- [Brief title]: [Specific, actionable instruction]"""
-
-def get_default_general_prompt():
-    """Return the default general translation prompt"""
-    return """You are a professional Spanish to English translator specializing in soccer/football content. Translate the following Spanish text into clear, natural English that American soccer coaches and players will easily understand.
-
-<spanish_text>
-{spanish_text}
-</spanish_text>
-
-Guidelines:
-- Use American soccer terminology where appropriate
-- Convert metric measurements to yards/feet
-- Keep technical soccer terms accurate
-- Ensure the translation sounds natural in English
-- Preserve the original meaning and tone
-- When you see "Z1", "Z2", "Z3", etc., translate these to "Zone 1", "Zone 2", "Zone 3" with a capital Z
-
-Provide only the English translation without any additional commentary."""
-
-def get_text_hash(text: str) -> str:
-    """Generate a hash for caching purposes"""
-    return hashlib.md5(text.encode()).hexdigest()
-
-def estimate_tokens(text: str, model: str = "claude-sonnet-4-5-20250929") -> int:
-    """Rough estimation of tokens based on model"""
-    if not text:
-        return 0
-    
-    base_estimate = len(text) // 4
-    
-    model_multipliers = {
-        "claude-sonnet-4-5-20250929": 1.0,
-        "claude-sonnet-4-20250514": 1.0,
-        "claude-3-5-haiku-20241022": 0.95
-    }
-    
-    multiplier = model_multipliers.get(model, 1.0)
-    return int(base_estimate * multiplier)
+def find_similar_drills(text: str) -> list:
+    """Already translated drills close to text, as (history entry, similarity) pairs"""
+    store = get_history_store()
+    index = get_similarity_index()
+    index.sync_store(store)
+    return [(store.get(entry_id), similarity) for entry_id, similarity in index.query(text)]
 
-def get_model_cost_per_token(model: str) -> dict:
-    """Get cost per token for input/output (USD per 1M tokens)"""
-    costs = {
-        "claude-sonnet-4-5-20250929": {"input": 3.0, "output": 15.0},
-        "claude-sonnet-4-20250514": {"input": 3.0, "output": 15.0},
-        "claude-3-5-haiku-20241022": {"input": 0.8, "output": 4.0}
-    }
-    return costs.get(model, {"input": 3.0, "output": 15.0})
+@st.cache_resource
+def start_metrics_endpoint():
+    """Serve Prometheus metrics on CV_TRANSLATOR_METRICS_PORT (once per process) when it is set"""
+    return start_metrics_server(METRICS_PORT) if METRICS_PORT else None
 
-def calculate_estimated_cost(input_tokens: int, output_tokens: int, model: str) -> float:
-    """Calculate estimated cost for a translation"""
-    costs = get_model_cost_per_token(model)
-    input_cost = (input_tokens / 1_000_000) * costs["input"]
-    output_cost = (output_tokens / 1_000_000) * costs["output"]
-    return input_cost + output_cost
+@st.cache_resource
+def start_translation_endpoint():
+    """Serve /v1/translate on CV_TRANSLATOR_SERVICE_PORT (once per process) when it is set
+    
+    The service uses this process's persistent cache and API client, so other tools
+    and the app's curators share translations and connections.
+    """
+    if not SERVICE_PORT or "ANTHROPIC_API_KEY" not in st.secrets:
+        return None
+    service = TranslationService(get_api_client(st.secrets["ANTHROPIC_API_KEY"]), cache=get_persistent_cache())
+    return start_translation_server(service, SERVICE_PORT)
 
-def safe_get(item: dict, key: str, default=0):
-    """Safely get a value from a dictionary"""
-    try:
-        return item.get(key, default)
-    except (AttributeError, TypeError):
-        return default
+# (metric name, label, unit) shown in the Settings performance table
+PERFORMANCE_METRICS = [
+    ("translation_latency_seconds", "Translation latency", "s"),
+    ("translation_ttft_seconds", "Time to first token", "s"),
+    ("translation_output_tokens_per_second", "Output tokens/s", ""),
+    ("api_call_seconds", "API attempt", "s"),
+    ("rate_limit_wait_seconds", "Rate limiter wait", "s"),
+    ("streamlit_rerun_seconds", "Page rerun", "s"),
+    ("job_queue_wait_seconds", "Job queue wait", "s"),
+]
 
-def clean_translation_output(text: str) -> str:
-    """Remove analysis/reasoning sections and clean up the translation output"""
-    # Remove content between XML-style tags (like <translation_breakdown>)
-    text = re.sub(r'<[^>]+>.*?</[^>]+>', '', text, flags=re.DOTALL)
-    
-    # Remove any remaining XML-style tags
-    text = re.sub(r'<[^>]+>', '', text)
-    
-    # Find where the actual formatted translation starts (look for **Topic** or similar)
-    match = re.search(r'\*\*Topic\*\*', text, re.IGNORECASE)
-    if match:
-        text = text[match.start():]
-    
-    # Clean up excessive blank lines (more than 2 consecutive newlines)
-    text = re.sub(r'\n{3,}', '\n\n', text)
-    
-    # Ensure proper spacing after section headers
-    text = re.sub(r'(\*\*[^*]+\*\*)\n([^\n])', r'\1\n\n\2', text)
-    
-    return text.strip()
+def get_session_cache() -> TieredTranslationCache:
+    """The session cache layered over the persistent cache shared by all sessions"""
+    return TieredTranslationCache(st.session_state.translation_cache, get_persistent_cache())
 
 def initialize_session_state():
     """Initialize session state with defaults"""
+    # Per-session objects are built only for a new session, not on every rerun
+    factories = {
+        'session_id': lambda: uuid.uuid4().hex,
+        'translation_history': lambda: RecordedHistory(get_history_store(), bodies=get_text_store()),
+        'translation_cache': lambda: CompactCache(get_text_store()),
+        'token_estimator': TokenEstimator,
+        'history_index': HistorySearchIndex,
+        'history_stats': HistoryStats,
+        'team_history': lambda: TeamHistoryMirror(get_history_store(), bodies=get_text_store()),
+        'team_history_index': HistorySearchIndex,
+        'team_history_stats': HistoryStats,
+    }
+    for key, factory in factories.items():
+        if key not in st.session_state:
+            st.session_state[key] = factory()
+    
     defaults = {
-        'translation_history': [],
+        'curator_name': "",
         'translated_text': "",
         'drill_prompt': get_default_drill_prompt(),
         'general_prompt': get_default_general_prompt(),
         'saved_drill_prompt': get_default_drill_prompt(),
         'saved_general_prompt': get_default_general_prompt(),
-        'translation_cache': {},
         'current_batch_results': [],
+        'stream_output': True,
+        'batch_concurrency': 4,
+        'exact_token_count': False,
+        'incremental_sections': True,
+        'structured_output': False,
+        'normalize_input': True,
+        'history_export': None,
+        'history_page': 1,
         'selected_model': "claude-sonnet-4-5-20250929",
         'api_ready': False,
         'spanish_input': "",
@@ -397,14 +407,26 @@ def initialize_session_state():
         if key not in st.session_state:
             st.session_state[key] = value
     
+    st.session_state.translation_history.user = st.session_state.curator_name
+    
     # Fix any invalid model selection
     if st.session_state.selected_model not in CLAUDE_MODELS:
         st.session_state.selected_model = "claude-sonnet-4-5-20250929"
 
+@st.cache_resource
+def get_api_client(api_key: str):
+    """One scheduled client per API key for the whole process
+    
+    Building a client per rerun also built a new connection pool, so every
+    translation paid for fresh TCP and TLS handshakes. This one keeps its
+    connections alive across reruns and sessions.
+    """
+    return make_scheduled_client(api_key, scheduler=get_request_scheduler(), http_client=make_http_client())
+
 def setup_api_client():
     """Setup Anthropic API client"""
     try:
-        client = anthropic.Anthropic(api_key=st.secrets["ANTHROPIC_API_KEY"])
+        client = get_api_client(st.secrets["ANTHROPIC_API_KEY"])
         st.session_state.api_ready = True
         return client
     except KeyError:
@@ -416,60 +438,198 @@ def setup_api_client():
         st.session_state.api_ready = False
         return None
 
-def translate_text(client, text: str, prompt_template: str, model: str):
-    """Generic translation function"""
-    if not text.strip():
-        return None, "Please enter text to translate"
-    
-    cache_key = get_text_hash(text + prompt_template + model)
+def prepare_input(text: str) -> str:
+    """Apply the deterministic normalization pass (meters, zones, glossary) when enabled"""
+    return normalize_drill_text(text) if st.session_state.normalize_input else text
+
+def translate_text(client, text: str, prompt_template: str, model: str, on_progress: Optional[Callable[[str], None]] = None):
+    """Translate through the core, using this session's cache and history"""
+    return core.translate_text(
+        client, prepare_input(text), prompt_template, model,
+        cache=get_session_cache(),
+        history=st.session_state.translation_history,
+        on_progress=on_progress,
+        original_text=text
+    )
+
+def translate_document(text: str, prompt_template: str, model: str, on_chunk: Optional[Callable[[int, int], None]] = None):
+    """Translate a long document in concurrent chunks, using this session's cache and history"""
+    return documents.translate_document(
+        prepare_input(text), prompt_template, model,
+        api_key=st.secrets["ANTHROPIC_API_KEY"],
+        cache=get_session_cache(),
+        history=st.session_state.translation_history,
+        scheduler=get_request_scheduler(),
+        on_chunk=on_chunk,
+        original_text=text
+    )
+
+def translate_drill(client, text: str, prompt_template: str, model: str, on_progress: Optional[Callable[[str], None]] = None,
+                    neighbour: Optional[dict] = None):
+    """Translate a drill, re-translating only edited sections when that setting is on
+    
+    With a neighbour (a similar drill from history), only the sections that differ from it are translated.
+    In structured mode the drill is translated into typed fields and rendered locally.
+    """
+    if st.session_state.structured_output and neighbour is None:
+        return translate_drill_structured(
+            client, prepare_input(text), prompt_template, model,
+            cache=get_session_cache(),
+            history=st.session_state.translation_history,
+            on_progress=on_progress,
+            original_text=text
+        )
+    if not st.session_state.incremental_sections and neighbour is None:
+        return translate_text(client, text, prompt_template, model, on_progress=on_progress)
+    
+    stats = {}
+    if neighbour is not None:
+        translation, error = translate_against_neighbour(
+            # History keeps the typed input; sections are compared as they are sent
+            client, prepare_input(text), dict(neighbour, spanish_input=prepare_input(neighbour['spanish_input'])),
+            prompt_template, model,
+            cache=get_session_cache(),
+            history=st.session_state.translation_history,
+            stats=stats,
+            on_progress=on_progress,
+            original_text=text
+        )
+    else:
+        translation, error = translate_drill_incremental(
+            client, prepare_input(text), prompt_template, model,
+            cache=get_session_cache(),
+            history=st.session_state.translation_history,
+            stats=stats,
+            on_progress=on_progress,
+            original_text=text
+        )
+    if translation and stats['sections_reused']:
+        st.toast(f"♻️ Reused {stats['sections_reused']} of {stats['sections_total']} sections from earlier translations")
+    return translation, error
+
+def queue_drill_translation(client, text: str, prompt_template: str, model: str) -> int:
+    """Translate a drill in a background job; returns the job id
+    
+    Settings, cache and history are captured now, so the job does not touch
+    session state from its worker thread. It records into this session's cache
+    and history (both safe to append to from another thread) even if the page
+    is closed before it finishes.
+    """
+    prepared = prepare_input(text)
+    cache = get_session_cache()
+    history = st.session_state.translation_history
+    incremental = st.session_state.incremental_sections
+    structured = st.session_state.structured_output
+    
+    def run(job: Job):
+        if structured:
+            # Not streamed, so no progress to report: a request already in flight finishes and is kept
+            return translate_drill_structured(client, prepared, prompt_template, model, cache=cache,
+                                              history=history, original_text=text)
+        if incremental:
+            return translate_drill_incremental(client, prepared, prompt_template, model, cache=cache,
+                                               history=history, on_progress=job.report, original_text=text)
+        return core.translate_text(client, prepared, prompt_template, model, cache=cache, history=history,
+                                   on_progress=job.report, original_text=text)
+    
+    label = next((line.strip() for line in text.splitlines() if line.strip()), "Drill")[:60]
+    return get_job_queue().submit(run, label, owner=st.session_state.session_id, kind="drill", source=text)
+
+# Seconds between refreshes of the job list while jobs are queued or running
+JOB_POLL_SECONDS = 1.0
+JOB_STATUS_ICONS = {QUEUED: "🕒", RUNNING: "⏳", DONE: "✅", FAILED: "❌", CANCELLED: "🚫"}
+
+def render_job_list():
+    """This session's background jobs with their status, progress and actions"""
+    jobs = get_job_queue()
+    for job in jobs.jobs(owner=st.session_state.session_id):
+        col_a, col_b, col_c = st.columns([4, 1, 1])
+        with col_a:
+            status = "cancelling" if job.cancel_requested and not job.finished else job.status
+            timing = f" • {job.elapsed:.1f}s" if job.started_at else ""
+            st.markdown(f"{JOB_STATUS_ICONS[job.status]} **#{job.id}** {job.label} • {status}{timing}")
+            if job.status == RUNNING and job.progress:
+                st.caption(f"{len(job.progress):,} characters received")
+            elif job.status == FAILED:
+                st.caption(f"Error: {job.error}")
+        with col_b:
+            if not job.finished:
+                if st.button("✖️ Cancel", key=f"cancel_job_{job.id}", use_container_width=True,
+                             disabled=job.cancel_requested):
+                    jobs.cancel(job.id)
+                    st.rerun(scope="fragment")
+            elif job.status == DONE and st.button("📄 Open", key=f"open_job_{job.id}", use_container_width=True):
+                st.session_state.spanish_input = job.source
+                st.session_state.translated_text = job.result
+                st.rerun()
+        with col_c:
+            if job.finished and st.button("🧹 Dismiss", key=f"dismiss_job_{job.id}", use_container_width=True):
+                jobs.dismiss(job.id)
+                st.rerun(scope="fragment")
+
+def render_drill_jobs():
+    """The job list, refreshed on its own every JOB_POLL_SECONDS while any job is unfinished"""
+    jobs = get_job_queue()
+    if not jobs.jobs(owner=st.session_state.session_id):
+        return
+    st.markdown("### ⏳ Queued Translations")
+    poll = JOB_POLL_SECONDS if jobs.pending(owner=st.session_state.session_id) else None
+    st.fragment(render_job_list, run_every=poll)()
+
+def translate_batch(client, drills, prompt_template: str, model: str, max_workers: int = 4):
+    """Translate a batch through the core, using this session's cache and history"""
+    return core.translate_batch(
+        client, [prepare_input(drill) for drill in drills], prompt_template, model,
+        cache=get_session_cache(),
+        history=st.session_state.translation_history,
+        max_workers=max_workers,
+        originals=drills
+    )
+
+def get_token_estimator() -> TokenEstimator:
+    """This session's token estimator, calibrated against its translation history"""
+    estimator = st.session_state.token_estimator
+    estimator.calibrate(st.session_state.translation_history)
+    return estimator
+
+def get_history_view(team: bool = False):
+    """This session's (or the whole team's) history with its search index and running totals
+    
+    Only entries appended since the last rerun are read, indexed and added to the totals.
+    """
+    if team:
+        history = st.session_state.team_history.sync()
+        index, stats = st.session_state.team_history_index, st.session_state.team_history_stats
+    else:
+        history = st.session_state.translation_history
+        index, stats = st.session_state.history_index, st.session_state.history_stats
+    index.sync(history)
+    stats.sync(history)
+    return history, index, stats
+
+def discard_history_export():
+    """Delete this session's prepared export file, if any"""
+    export = st.session_state.history_export
+    st.session_state.history_export = None
+    if export:
+        try:
+            os.remove(export['path'])
+        except OSError:
+            pass
+
+def render_stream_preview(placeholder):
+    """Return an on_progress callback that renders partial output into a Streamlit placeholder"""
+    placeholder.info("⏳ Waiting for the first words of the translation...")
     
-    # Check cache
-    if cache_key in st.session_state.translation_cache:
-        cached = st.session_state.translation_cache[cache_key]
-        return cached['translation'], None
+    def on_progress(partial: str):
+        placeholder.markdown(partial or "⏳ ...")
     
-    # Perform translation
-    try:
-        full_prompt = prompt_template.format(spanish_text=text)
-        
-        message = client.messages.create(
-            model=model,
-            max_tokens=4000,
-            temperature=0.1,
-            messages=[{"role": "user", "content": full_prompt}]
-        )
-        
-        translation = message.content[0].text
-        
-        # Clean up the translation output
-        translation = clean_translation_output(translation)
-        
-        # Cache result
-        st.session_state.translation_cache[cache_key] = {
-            'translation': translation,
-            'input_tokens': message.usage.input_tokens,
-            'output_tokens': message.usage.output_tokens,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        # Add to history
-        st.session_state.translation_history.append({
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'type': 'drill' if 'drill' in prompt_template[:100].lower() else 'general',
-            'spanish_input': text,
-            'english_output': translation,
-            'input_tokens': message.usage.input_tokens,
-            'output_tokens': message.usage.output_tokens,
-            'model': model
-        })
-        
-        return translation, None
-        
-    except Exception as e:
-        return None, str(e)
+    return on_progress
 
 # Initialize
 initialize_session_state()
+start_metrics_endpoint()
+start_translation_endpoint()
 client = setup_api_client()
 
 # Clean header
@@ -481,7 +641,7 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Main tabs
-tab1, tab2, tab3, tab4 = st.tabs(["🎯 Drill Translation", "📝 General Translation", "⚙️ Settings", "📚 History"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["🎯 Drill Translation", "📝 General Translation", "📦 Batch Translation", "⚙️ Settings", "📚 History"])
 
 # DRILL TRANSLATION TAB
 with tab1:
@@ -522,33 +682,72 @@ with tab1:
                     <div class="label">Words</div>
                 </div>
                 """, unsafe_allow_html=True)
+            estimate = get_token_estimator().estimate(
+                spanish_text, st.session_state.drill_prompt, st.session_state.selected_model
+            )
+            input_tokens = estimate['input_tokens']
+            if st.session_state.exact_token_count and client:
+                try:
+                    input_tokens = count_tokens_api(
+                        client, spanish_text, st.session_state.drill_prompt, st.session_state.selected_model
+                    )
+                except Exception:
+                    pass  # Keep the local estimate if the counting endpoint is unavailable
+            
             with cols[2]:
-                est_tokens = estimate_tokens(spanish_text, st.session_state.selected_model)
                 st.markdown(f"""
                 <div class="metric-card">
-                    <div class="value">{est_tokens:,}</div>
+                    <div class="value">{estimate['text_tokens']:,}</div>
                     <div class="label">Est. Tokens</div>
                 </div>
                 """, unsafe_allow_html=True)
             
             # Cost estimate
             if spanish_text.strip():
-                input_tokens = estimate_tokens(
-                    st.session_state.drill_prompt.format(spanish_text=spanish_text),
-                    st.session_state.selected_model
-                )
-                output_tokens = max(len(spanish_text) // 2, 500)
-                est_cost = calculate_estimated_cost(input_tokens, output_tokens, st.session_state.selected_model)
+                est_cost = calculate_estimated_cost(input_tokens, estimate['output_tokens'], st.session_state.selected_model)
+                basis = "calibrated on your history" if estimate['calibrated'] else "rough estimate"
                 
                 st.markdown(f"""
                 <div class="cost-box">
                     💰 <strong>Estimated cost:</strong> ${est_cost:.4f}
+                    <span style="opacity: 0.7;">({input_tokens:,} in / {estimate['output_tokens']:,} out • {basis})</span>
                 </div>
                 """, unsafe_allow_html=True)
+        
+        # Close matches from the team history, offered before spending an API call
+        diff_neighbour = None
+        similar_drills = find_similar_drills(spanish_text) if spanish_text.strip() else []
+        if similar_drills:
+            st.markdown("""
+            <div class="info-box">
+                🔁 <strong>Similar drills were already translated.</strong> Reuse one, or translate only the sections that differ.
+            </div>
+            """, unsafe_allow_html=True)
+            for entry, similarity in similar_drills:
+                col_a, col_b, col_c = st.columns([3, 1, 1])
+                with col_a:
+                    preview = " ".join(entry['spanish_input'].split())[:80]
+                    st.caption(f"**{similarity:.0%} similar** • {entry['user'] or 'anonymous'} • {entry['timestamp']} • {preview}…")
+                with col_b:
+                    # A drill with other numbers (players, sizes, times) needs its own translation
+                    reusable = same_numbers(spanish_text, entry['spanish_input'])
+                    if st.button("📋 Use", key=f"use_similar_{entry['id']}", use_container_width=True,
+                                 disabled=not reusable,
+                                 help=None if reusable else "The numbers differ; use Diff to translate what changed"):
+                        st.session_state.spanish_input = spanish_text
+                        st.session_state.translated_text = entry['english_output']
+                        st.rerun()
+                with col_c:
+                    if st.button("✂️ Diff", key=f"diff_similar_{entry['id']}", use_container_width=True,
+                                 help="Reuse this drill's translation for unchanged sections"):
+                        diff_neighbour = entry
     
     with col2:
         st.subheader("🇺🇸 English Translation")
         
+        # Live preview while a streamed translation is arriving
+        drill_stream_placeholder = st.empty()
+        
         # Display translation in matching text area (read-only by user clicking)
         translated_display = st.text_area(
             "English translation:",
@@ -575,7 +774,7 @@ with tab1:
     
     # Action buttons
     st.markdown("---")
-    col1, col2, col3 = st.columns([1, 2, 1])
+    col1, col2, col3, col4 = st.columns([1, 2, 1, 1])
     
     with col1:
         if st.button("🗑️ Clear Both", use_container_width=True, key="clear_drill"):
@@ -584,33 +783,61 @@ with tab1:
             st.rerun()
     
     with col2:
-        if st.button("🚀 TRANSLATE DRILL", type="primary", use_container_width=True, key="translate_drill"):
+        if st.button("🚀 TRANSLATE DRILL", type="primary", use_container_width=True, key="translate_drill") or diff_neighbour:
             if client and spanish_text:
-                with st.spinner("Translating..."):
-                    translation, error = translate_text(
-                        client, 
-                        spanish_text, 
+                translation_started = time.perf_counter()
+                if st.session_state.stream_output:
+                    translation, error = translate_drill(
+                        client,
+                        spanish_text,
                         st.session_state.drill_prompt,
-                        st.session_state.selected_model
+                        st.session_state.selected_model,
+                        on_progress=render_stream_preview(drill_stream_placeholder),
+                        neighbour=diff_neighbour
                     )
-                    if translation:
-                        st.session_state.translated_text = translation
-                        st.session_state.spanish_input = spanish_text
-                        st.success("✅ Translation complete!")
-                        time.sleep(0.5)
-                        st.rerun()
-                    else:
-                        st.error(f"❌ Translation failed: {error}")
+                else:
+                    with st.spinner("Translating..."):
+                        translation, error = translate_drill(
+                            client, 
+                            spanish_text, 
+                            st.session_state.drill_prompt,
+                            st.session_state.selected_model,
+                            neighbour=diff_neighbour
+                        )
+                if translation:
+                    st.session_state.last_translation_time = time.perf_counter() - translation_started
+                    st.session_state.translated_text = translation
+                    st.session_state.spanish_input = spanish_text
+                    st.success(f"✅ Translation complete! ({st.session_state.last_translation_time:.1f}s)")
+                    time.sleep(0.5)
+                    st.rerun()
+                else:
+                    st.error(f"❌ Translation failed: {error}")
             elif not spanish_text:
                 st.warning("⚠️ Please enter Spanish text first")
     
     with col3:
+        if st.button("➕ Queue", use_container_width=True, key="queue_drill",
+                     help="Translate in the background and clear the input, so you can paste the next drill"):
+            if client and spanish_text:
+                job_id = queue_drill_translation(
+                    client, spanish_text, st.session_state.drill_prompt, st.session_state.selected_model
+                )
+                st.session_state.spanish_input = ""
+                st.toast(f"⏳ Queued as job #{job_id}")
+                st.rerun()
+            elif not spanish_text:
+                st.warning("⚠️ Please enter Spanish text first")
+    
+    with col4:
         if st.session_state.translated_text and st.button("📋 Clear & New", use_container_width=True, key="copy_new_drill"):
             st.session_state.spanish_input = ""
             st.session_state.translated_text = ""
             st.success("✅ Ready for next drill")
             time.sleep(0.5)
             st.rerun()
+    
+    render_drill_jobs()
 
 # GENERAL TRANSLATION TAB
 with tab2:
@@ -645,19 +872,28 @@ with tab2:
                 </div>
                 """, unsafe_allow_html=True)
             with cols[1]:
-                est_tokens = estimate_tokens(general_spanish, st.session_state.selected_model)
-                est_cost = calculate_estimated_cost(est_tokens, est_tokens//2, st.session_state.selected_model)
+                estimate = get_token_estimator().estimate(
+                    general_spanish, st.session_state.general_prompt, st.session_state.selected_model
+                )
+                chunk_count = len(documents.split_document(general_spanish))
+                parts_label = f" • {chunk_count} parts" if chunk_count > 1 else ""
+                est_cost = calculate_estimated_cost(
+                    estimate['input_tokens'], estimate['output_tokens'], st.session_state.selected_model
+                )
                 st.markdown(f"""
                 <div class="metric-card">
                     <div class="value">${est_cost:.4f}</div>
-                    <div class="label">Est. Cost</div>
+                    <div class="label">Est. Cost{parts_label}</div>
                 </div>
                 """, unsafe_allow_html=True)
     
     with col2:
         st.subheader("🇺🇸 English Translation")
         
-       # Display translation in matching text area (read-only by user clicking)
+        # Live preview while a streamed translation is arriving
+        general_stream_placeholder = st.empty()
+        
+        # Display translation in matching text area (read-only by user clicking)
         general_display = st.text_area(
             "English translation:",
             height=400,
@@ -694,29 +930,237 @@ with tab2:
     with col2:
         if st.button("🚀 TRANSLATE", type="primary", use_container_width=True, key="translate_general"):
             if client and general_spanish:
-                with st.spinner("Translating..."):
+                translation_started = time.perf_counter()
+                chunk_count = len(documents.split_document(general_spanish))
+                if chunk_count > 1:
+                    progress = st.progress(0.0, text=f"Translating {chunk_count} parts in parallel...")
+                    translation, error = translate_document(
+                        general_spanish,
+                        st.session_state.general_prompt,
+                        st.session_state.selected_model,
+                        on_chunk=lambda done, total: progress.progress(done / total, text=f"{done}/{total} parts translated")
+                    )
+                elif st.session_state.stream_output:
                     translation, error = translate_text(
                         client,
                         general_spanish,
                         st.session_state.general_prompt,
-                        st.session_state.selected_model
+                        st.session_state.selected_model,
+                        on_progress=render_stream_preview(general_stream_placeholder)
                     )
-                    if translation:
-                        st.session_state.general_translated_text = translation
-                        st.session_state.general_spanish_input = general_spanish
-                        st.success("✅ Translation complete!")
-                        time.sleep(0.5)
-                        st.rerun()
-                    else:
-                        st.error(f"❌ Translation failed: {error}")
+                else:
+                    with st.spinner("Translating..."):
+                        translation, error = translate_text(
+                            client,
+                            general_spanish,
+                            st.session_state.general_prompt,
+                            st.session_state.selected_model
+                        )
+                if translation:
+                    st.session_state.last_translation_time = time.perf_counter() - translation_started
+                    st.session_state.general_translated_text = translation
+                    st.session_state.general_spanish_input = general_spanish
+                    st.success(f"✅ Translation complete! ({st.session_state.last_translation_time:.1f}s)")
+                    time.sleep(0.5)
+                    st.rerun()
+                else:
+                    st.error(f"❌ Translation failed: {error}")
             elif not general_spanish:
                 st.warning("⚠️ Please enter Spanish text first")
     
     with col3:
         pass  # Empty column for spacing
 
-# SETTINGS TAB
+# BATCH TRANSLATION TAB
 with tab3:
+    st.markdown("""
+    <div class="info-box">
+        📦 <strong>Batch Mode:</strong> Paste several drills separated by a line containing only <code>---</code>,
+        or upload one or more text files. Drills are translated in parallel and results keep the original order.
+    </div>
+    """, unsafe_allow_html=True)
+    
+    col1, col2 = st.columns([2, 1], gap="medium")
+    
+    with col1:
+        batch_text = st.text_area(
+            "Paste drills (separate with ---):",
+            height=250,
+            placeholder="CONTENIDO: Control y pase\n...\n---\nCONTENIDO: Centro\n...",
+            key="batch_spanish_input"
+        )
+    
+    with col2:
+        uploaded_files = st.file_uploader(
+            "Or upload drill files:",
+            type=["txt", "md"],
+            accept_multiple_files=True,
+            key="batch_files"
+        )
+        st.session_state.batch_concurrency = st.slider(
+            "Concurrent requests",
+            min_value=1,
+            max_value=10,
+            value=st.session_state.batch_concurrency,
+            help="How many drills are sent to the API at the same time"
+        )
+    
+    batch_drills = split_batch_input(batch_text or "")
+    for uploaded in uploaded_files or []:
+        batch_drills.extend(split_batch_input(uploaded.getvalue().decode("utf-8", errors="replace")))
+    
+    if batch_drills:
+        estimator = get_token_estimator()
+        forecast = estimator.forecast_cost(batch_drills, st.session_state.drill_prompt, st.session_state.selected_model)
+        bulk_forecast = estimator.forecast_cost(
+            batch_drills, st.session_state.drill_prompt, st.session_state.selected_model, batch=True
+        )
+        st.markdown(f"""
+        <div class="cost-box">
+            📦 <strong>{len(batch_drills)} drills</strong> • 💰 Estimated cost: ${forecast['cost']:.4f}
+            (overnight bulk: ${bulk_forecast['cost']:.4f}) • {forecast['input_tokens']:,} in / {forecast['output_tokens']:,} out
+        </div>
+        """, unsafe_allow_html=True)
+    
+    st.markdown("---")
+    
+    if st.button("🚀 TRANSLATE BATCH", type="primary", use_container_width=True, key="translate_batch"):
+        if client and batch_drills:
+            results = [
+                {'index': i, 'spanish_input': d, 'english_output': None, 'error': None}
+                for i, d in enumerate(batch_drills)
+            ]
+            progress = st.progress(0.0, text=f"Translating 0 of {len(batch_drills)} drills...")
+            live_results = st.container()
+            done = 0
+            
+            for index, translation, error in translate_batch(
+                client,
+                batch_drills,
+                st.session_state.drill_prompt,
+                st.session_state.selected_model,
+                max_workers=st.session_state.batch_concurrency
+            ):
+                done += 1
+                results[index]['english_output'] = translation
+                results[index]['error'] = error
+                progress.progress(done / len(batch_drills), text=f"Translated {done} of {len(batch_drills)} drills...")
+                with live_results:
+                    if error:
+                        st.error(f"❌ Drill {index + 1} failed: {error}")
+                    else:
+                        st.success(f"✅ Drill {index + 1} done")
+            
+            st.session_state.current_batch_results = results
+            st.rerun()
+        elif not batch_drills:
+            st.warning("⚠️ Please paste or upload Spanish drills first")
+    
+    # Results in original input order
+    if st.session_state.current_batch_results:
+        batch_results = st.session_state.current_batch_results
+        failed = [r for r in batch_results if r['error']]
+        st.markdown("### 📋 Batch Results")
+        st.info(f"{len(batch_results) - len(failed)} of {len(batch_results)} drills translated")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            combined = "\n\n---\n\n".join(r['english_output'] or "" for r in batch_results)
+            st.download_button(
+                "💾 Download All Translations",
+                data=combined,
+                file_name=f"batch_translation_{datetime.now().strftime('%Y%m%d_%H%M')}.txt",
+                mime="text/plain",
+                use_container_width=True
+            )
+        with col2:
+            if st.button("🗑️ Clear Results", use_container_width=True, key="clear_batch"):
+                st.session_state.current_batch_results = []
+                st.rerun()
+        
+        for result in batch_results:
+            label = result['spanish_input'].splitlines()[0][:80]
+            status = "❌" if result['error'] else "✅"
+            with st.expander(f"{status} **Drill {result['index'] + 1}** • {label}"):
+                if result['error']:
+                    st.error(result['error'])
+                else:
+                    st.text_area(
+                        "English",
+                        value=result['english_output'],
+                        height=250,
+                        key=f"batch_english_{result['index']}"
+                    )
+
+    # Overnight bulk mode
+    st.markdown("---")
+    with st.expander("🌙 Overnight Bulk Mode (Message Batches API • 50% cheaper)"):
+        st.markdown(
+            "Submits the drills above as a background batch job. Results usually arrive within a few hours; "
+            "come back later and collect them into the cache and history. Jobs are saved to disk and can be "
+            "collected from any session."
+        )
+        if USE_FAKE_BATCHES:
+            st.caption("🧪 Using the offline fake batch endpoint (CV_TRANSLATOR_FAKE_BATCHES=1)")
+        
+        batches_api = get_batches_api(client)
+        
+        if st.button("🌙 Submit Bulk Job", use_container_width=True, key="submit_bulk"):
+            if batches_api and batch_drills:
+                try:
+                    manifest = submit_bulk_job(
+                        batches_api,
+                        [prepare_input(drill) for drill in batch_drills],
+                        st.session_state.drill_prompt,
+                        st.session_state.selected_model,
+                        cache=get_session_cache(),
+                        originals=batch_drills
+                    )
+                    if manifest:
+                        st.success(f"✅ Submitted {len(manifest['drills'])} drills as job {manifest['job_id']}")
+                    else:
+                        st.info("All of these drills are already cached — nothing to submit")
+                except Exception as e:
+                    st.error(f"❌ Bulk submission failed: {str(e)}")
+            elif not batch_drills:
+                st.warning("⚠️ Please paste or upload Spanish drills first")
+        
+        for manifest in load_bulk_manifests():
+            total = len(manifest['drills'])
+            done = len(manifest['collected'])
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.markdown(
+                    f"**{manifest['job_id']}** • {manifest['status']} • {done}/{total} collected"
+                    + (f" • {len(manifest['failed'])} failed" if manifest['failed'] else "")
+                )
+            with col2:
+                if manifest['status'] != 'complete' and st.button(
+                    "🔄 Check & Collect", use_container_width=True, key=f"collect_{manifest['job_id']}"
+                ):
+                    try:
+                        manifest = collect_bulk_job(
+                            batches_api,
+                            manifest,
+                            cache=get_session_cache(),
+                            history=st.session_state.translation_history
+                        )
+                        st.success(f"✅ {len(manifest['collected'])}/{total} collected")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"❌ Collection failed: {str(e)}")
+            if manifest['status'] == 'pending':
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    st.caption("⚠️ This submission did not finish, so a batch may exist that the job has no record of. "
+                               "Its drills are held back until you release them; check the Console first.")
+                with col2:
+                    if st.button("🔓 Release drills", use_container_width=True, key=f"release_{manifest['job_id']}"):
+                        release_bulk_job(manifest)
+                        st.rerun()
+
+# SETTINGS TAB
+with tab4:
     st.subheader("⚙️ Translation Settings")
     
     # Model selection
@@ -739,10 +1183,120 @@ with tab3:
         <div class="info-box">
             <strong>Pricing:</strong><br>
             Input: ${costs['input']:.2f}/1M<br>
-            Output: ${costs['output']:.2f}/1M
+            Output: ${costs['output']:.2f}/1M<br>
+            Cache write/read: ${costs['input'] * CACHE_WRITE_MULTIPLIER:.2f} / ${costs['input'] * CACHE_READ_MULTIPLIER:.2f}/1M
         </div>
         """, unsafe_allow_html=True)
     
+    st.session_state.stream_output = st.toggle(
+        "⚡ Stream translations as they are generated",
+        value=st.session_state.stream_output,
+        help="Show the English text word by word instead of waiting for the full response"
+    )
+    
+    st.session_state.exact_token_count = st.toggle(
+        "🔢 Exact input token counts (token counting API)",
+        value=st.session_state.exact_token_count,
+        help="Ask the API for exact input token counts instead of the local estimate. Counts are cached per text."
+    )
+    
+    st.session_state.normalize_input = st.toggle(
+        "📏 Convert meters, zone labels and glossary terms before translating",
+        value=st.session_state.normalize_input,
+        help="40x30m → 44x33 yards, Z1 → Zone 1, GRADIENTE (+) → More advanced: — done locally, so results are consistent"
+    )
+    
+    st.session_state.incremental_sections = st.toggle(
+        "♻️ Re-translate only edited sections of a drill",
+        value=st.session_state.incremental_sections,
+        help="After you edit a drill, only the changed sections (CONTENIDO, TIEMPO, ...) are sent to the model"
+    )
+    
+    st.session_state.structured_output = st.toggle(
+        "🧱 Structured drill output",
+        value=st.session_state.structured_output,
+        help="The model returns each field (Topic, Principle, ..., Coaching points) separately; they are checked "
+             "and laid out locally, and kept with the history entry. Replies are not streamed. "
+             "Takes precedence over section re-translation."
+    )
+    
+    scheduler = get_request_scheduler()
+    breaker_states = ", ".join(
+        f"{CLAUDE_MODELS.get(model, model).split('(')[0].strip()}: {scheduler.breaker(model).state}"
+        for model in CLAUDE_MODELS
+    )
+    st.caption(
+        f"API scheduler: {scheduler.request_bucket.capacity:.0f} requests/min, "
+        f"{scheduler.token_bucket.capacity:,.0f} tokens/min • {scheduler.retries} retries, "
+        f"{scheduler.fallbacks} fallbacks so far • {breaker_states}"
+    )
+    
+    samples = get_token_estimator().samples(st.session_state.selected_model, 'drill')
+    st.caption(
+        f"Cost forecasts are calibrated from {samples} drill translations with this model"
+        if samples >= 3 else
+        "Cost forecasts use a rough estimate until at least 3 drills have been translated with this model"
+    )
+    
+    st.markdown("---")
+    
+    # Performance metrics (process-wide, all sessions)
+    st.subheader("📈 Performance")
+    
+    lookups = METRICS.counter_value("cache_lookups_total")
+    hits = METRICS.counter_value("cache_lookups_total", result="hit")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        last_time = st.session_state.last_translation_time
+        st.metric("Last Translation", f"{last_time:.1f}s" if last_time is not None else "—")
+    with col2:
+        st.metric("Cache Hit Rate", f"{hits / lookups:.0%}" if lookups else "—", help=f"{hits:.0f} of {lookups:.0f} lookups")
+    with col3:
+        st.metric("Retries", f"{METRICS.counter_value('api_retries_total'):.0f}")
+    with col4:
+        st.metric("Fallbacks", f"{METRICS.counter_value('api_fallbacks_total'):.0f}")
+    
+    performance_rows = []
+    for name, label, unit in PERFORMANCE_METRICS:
+        stats = METRICS.summary_stats(name)
+        if stats:
+            performance_rows.append({
+                "Metric": label,
+                "Count": stats['count'],
+                "Mean": f"{stats['mean']:.2f}{unit}",
+                "P50": f"{stats['p50']:.2f}{unit}",
+                "P90": f"{stats['p90']:.2f}{unit}",
+                "P95": f"{stats['p95']:.2f}{unit}",
+                "P99": f"{stats['p99']:.2f}{unit}"
+            })
+    if performance_rows:
+        st.table(performance_rows)
+        st.caption(
+            "Rate limiter wait is time spent in the app; time to first token is network plus model queueing; "
+            "output tokens/s is the model's generation speed."
+        )
+    else:
+        st.info("No translations measured yet in this server process.")
+    
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        st.download_button(
+            "📊 Prometheus metrics",
+            data=METRICS.render_prometheus(),
+            file_name="cv_translator_metrics.prom",
+            mime="text/plain",
+            use_container_width=True
+        )
+    with col2:
+        st.caption(
+            f"Scrape endpoint: http://<host>:{METRICS_PORT}/metrics" if METRICS_PORT
+            else "Set CV_TRANSLATOR_METRICS_PORT to serve /metrics for Prometheus scrapers."
+        )
+        st.caption(
+            f"Translation service: http://127.0.0.1:{SERVICE_PORT}/v1/translate" if SERVICE_PORT
+            else "Set CV_TRANSLATOR_SERVICE_PORT to serve translations to other tools over HTTP."
+        )
+    
     st.markdown("---")
     
     # Prompt Management
@@ -831,52 +1385,106 @@ with tab3:
     # Cache Management
     st.subheader("💾 Cache Management")
     
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
-        cache_size = len(st.session_state.translation_cache)
-        st.metric("Cached Translations", cache_size)
+        session_cache = st.session_state.translation_cache
+        st.metric(
+            "Cached Translations",
+            f"{len(session_cache):,}",
+            help=f"{format_bytes(session_cache.__sizeof__())} of cache records in this session (texts counted below)"
+        )
     
     with col2:
+        st.metric(
+            "Shared Cache (all sessions)",
+            f"{len(get_persistent_cache()):,}",
+            help=f"Stored in {CACHE_DB_PATH} • expires after {CACHE_TTL_DAYS} days • max {CACHE_MAX_ENTRIES:,} entries"
+        )
+    
+    with col3:
         if st.button("🗑️ Clear Cache", use_container_width=True):
-            st.session_state.translation_cache = {}
+            st.session_state.translation_cache.clear()
             st.success("✅ Cache cleared!")
             st.rerun()
+        if st.button("🗑️ Clear Shared Cache", use_container_width=True, help="Removes cached translations for every user"):
+            get_persistent_cache().clear()
+            st.session_state.translation_cache.clear()
+            st.success("✅ Shared cache cleared!")
+            st.rerun()
+    
+    # Memory held by this process for history and cache texts, and by this session's records
+    text_stats = get_text_store().stats()
+    session_bytes = (
+        st.session_state.translation_cache.__sizeof__()
+        + get_records_size(st.session_state.translation_history)
+        + get_records_size(st.session_state.team_history)
+    )
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric(
+            "Texts in Memory",
+            format_bytes(text_stats['memory_bytes']),
+            help=f"{text_stats['memory_bodies']:,} Spanish/English bodies, shared by every session and stored "
+                 f"once however many entries use them • budget {MEMORY_BUDGET_MB:g} MB "
+                 "(CV_TRANSLATOR_MEMORY_BUDGET_MB)"
+        )
+    with col2:
+        st.metric(
+            "Spilled to Disk",
+            format_bytes(text_stats['spilled_bytes']),
+            help=f"{text_stats['spilled_bodies']:,} least recently used bodies, read back when needed"
+        )
+    with col3:
+        st.metric("Session Records", format_bytes(session_bytes),
+                  help="History entries and cache records of this session, texts excluded")
+    st.progress(min(1.0, text_stats['memory_bytes'] / max(1, text_stats['budget_bytes'])),
+                text=f"{format_bytes(text_stats['memory_bytes'])} of {MEMORY_BUDGET_MB:g} MB text budget")
 
 # HISTORY TAB
-with tab4:
+with tab5:
     st.subheader("📚 Translation History")
     
-    if st.session_state.translation_history:
-        # Stats
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        history_scope = st.radio("Show", ["My session", "Team"], horizontal=True, key="history_scope",
+                                 help="Team history is shared by everyone on this deployment and kept across refreshes")
+    with col2:
+        st.text_input("Your name", key="curator_name", placeholder="Shown next to your translations in team history")
+    team_scope = history_scope == "Team"
+    history, history_index, stats = get_history_view(team=team_scope)
+    
+    if history:
+        # Stats (running totals, only entries added since the last rerun are folded in)
         col1, col2, col3, col4 = st.columns(4)
         
-        total_translations = len(st.session_state.translation_history)
-        total_tokens = sum(
-            safe_get(t, 'input_tokens', 0) + safe_get(t, 'output_tokens', 0) 
-            for t in st.session_state.translation_history
-        )
-        total_cost = sum(
-            calculate_estimated_cost(
-                safe_get(t, 'input_tokens', 0),
-                safe_get(t, 'output_tokens', 0),
-                safe_get(t, 'model', 'claude-sonnet-4-5-20250929')
-            ) for t in st.session_state.translation_history
-        )
-        drill_count = len([t for t in st.session_state.translation_history if safe_get(t, 'type') == 'drill'])
+        total_translations = stats.count
+        total_tokens = stats.total_tokens
+        total_cache_read = stats.total_cache_read
+        total_cost = stats.total_cost
+        drill_count = stats.by_type.get('drill', 0)
         
         with col1:
             st.metric("Total Translations", total_translations)
         with col2:
             st.metric("Drill Translations", drill_count)
         with col3:
-            st.metric("Total Tokens", f"{total_tokens:,}")
+            st.metric("Total Tokens", f"{total_tokens:,}", help=f"{total_cache_read:,} read from the prompt cache")
         with col4:
             st.metric("Total Cost", f"${total_cost:.3f}")
         
+        if team_scope:
+            team_stats = get_history_store().team_stats()
+            contributors = ", ".join(f"{user or 'anonymous'} ({count})" for user, count in team_stats['by_user'].items())
+            st.caption(
+                f"👥 {team_stats['contributors']} contributors: {contributors} • "
+                f"{team_stats['unique_sources']:,} distinct source texts, {stats.duplicates:,} repeat translations "
+                f"(${stats.duplicate_cost:.3f})"
+            )
+        
         st.markdown("---")
         
         # Search and filter
-        col1, col2, col3 = st.columns([2, 1, 1])
+        col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
         
         with col1:
             search_query = st.text_input("🔍 Search history", placeholder="Search translations...")
@@ -887,79 +1495,97 @@ with tab4:
         with col3:
             filter_date = st.date_input("Date", value=None)
         
-        # Filter history
-        filtered_history = st.session_state.translation_history.copy()
-        
-        if search_query:
-            search_lower = search_query.lower()
-            filtered_history = [
-                h for h in filtered_history 
-                if search_lower in safe_get(h, 'spanish_input', '').lower() 
-                or search_lower in safe_get(h, 'english_output', '').lower()
-            ]
-        
-        if filter_type != "All":
-            type_filter = filter_type.lower()
-            filtered_history = [
-                h for h in filtered_history 
-                if safe_get(h, 'type', 'drill') == type_filter
-            ]
+        with col4:
+            latest_only = st.checkbox("Hide repeats", help="Show only the newest translation of each source text")
         
-        if filter_date:
-            date_str = str(filter_date)
-            filtered_history = [
-                h for h in filtered_history 
-                if safe_get(h, 'timestamp', '').startswith(date_str)
-            ]
+        # Filter history through the search index: best matches first, or newest first without a query
+        matching_ids = history_index.search(
+            search_query,
+            doc_type=filter_type.lower() if filter_type != "All" else None,
+            date=str(filter_date) if filter_date else None
+        )
+        if latest_only:
+            matching_ids = [i for i in matching_ids if stats.is_latest(i)]
         
-        # Export buttons
+        # Export buttons (files are streamed to disk only when asked for)
         st.markdown("### 📥 Export Options")
         col1, col2, col3 = st.columns(3)
         
+        export_signature = (history_scope, search_query, filter_type, str(filter_date), latest_only, len(history))
+        export = st.session_state.history_export
+        if export and export['signature'] != export_signature:
+            discard_history_export()
+            export = None
+        
         with col1:
-            json_data = json.dumps(filtered_history, indent=2, ensure_ascii=False)
-            st.download_button(
-                "📄 Export as JSON",
-                data=json_data,
-                file_name=f"translations_{datetime.now().strftime('%Y%m%d')}.json",
-                mime="application/json",
-                use_container_width=True
+            export_formats = ["JSONL", "CSV", "JSON"] + (["Parquet", "Arrow"] if pyarrow_available() else [])
+            export_format = st.selectbox(
+                "Export format", export_formats, label_visibility="collapsed",
+                help="CSV includes the Spanish input and English output. Install pyarrow for Parquet/Arrow."
             )
         
         with col2:
-            if filtered_history:
-                output = io.StringIO()
-                fieldnames = ['timestamp', 'type', 'model', 'input_tokens', 'output_tokens']
-                writer = csv.DictWriter(output, fieldnames=fieldnames, extrasaction='ignore')
-                writer.writeheader()
-                writer.writerows(filtered_history)
-                csv_data = output.getvalue()
-                
-                st.download_button(
-                    "📊 Export as CSV",
-                    data=csv_data,
-                    file_name=f"translations_{datetime.now().strftime('%Y%m%d')}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
+            if export and export['format'] == export_format:
+                with open(export['path'], "rb") as f:
+                    st.download_button(
+                        f"⬇️ Download {export_format} ({export['rows']:,} rows)",
+                        data=f,
+                        file_name=f"translations_{datetime.now().strftime('%Y%m%d')}.{export_format.lower()}",
+                        mime=EXPORT_FORMATS[export_format.lower()],
+                        use_container_width=True
+                    )
+            elif st.button(f"📦 Prepare {export_format} export", use_container_width=True, disabled=not matching_ids):
+                discard_history_export()
+                fd, path = tempfile.mkstemp(prefix="cv_translations_", suffix=f".{export_format.lower()}")
+                os.close(fd)
+                rows = write_export((history[i] for i in matching_ids), path, export_format.lower())
+                st.session_state.history_export = {
+                    'signature': export_signature,
+                    'format': export_format,
+                    'path': path,
+                    'rows': rows
+                }
+                st.rerun()
         
         with col3:
-            if st.button("🗑️ Clear History", use_container_width=True):
-                st.session_state.translation_history = []
+            if not team_scope and st.button("🗑️ Clear History", use_container_width=True,
+                                             help="Clears this session's view; team history is kept"):
+                st.session_state.translation_history.clear()
+                discard_history_export()
                 st.success("✅ History cleared!")
                 st.rerun()
         
         # Display history items
         st.markdown("### 📋 Recent Translations")
-        st.info(f"Showing {len(filtered_history)} of {total_translations} translations")
         
-        for i, item in enumerate(reversed(filtered_history[-10:])):
+        # Only the current page is rendered, so page cost does not grow with history
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            page_size = st.selectbox("Per page", HISTORY_PAGE_SIZES, key="history_page_size")
+        page_count = max(1, -(-len(matching_ids) // page_size))
+        if st.session_state.history_page > page_count:
+            st.session_state.history_page = page_count
+        with col2:
+            page = st.number_input("Page", min_value=1, max_value=page_count, step=1, key="history_page")
+        page_start = (page - 1) * page_size
+        page_ids = matching_ids[page_start:page_start + page_size]
+        
+        if page_ids:
+            st.info(
+                f"Showing {page_start + 1}–{page_start + len(page_ids)} of {len(matching_ids)} matches "
+                f"({total_translations} translations) • page {page} of {page_count}"
+            )
+        else:
+            st.info(f"Showing 0 of {total_translations} translations")
+        
+        for i in page_ids:
+            item = history[i]
             timestamp = safe_get(item, 'timestamp', 'Unknown')
             trans_type = safe_get(item, 'type', 'drill').capitalize()
-            spanish_preview = safe_get(item, 'spanish_input', '')[:100]
-            tokens = safe_get(item, 'input_tokens', 0) + safe_get(item, 'output_tokens', 0)
+            tokens = get_entry_tokens(item)
+            author = f" • 👤 {safe_get(item, 'user') or 'anonymous'}" if team_scope else ""
             
-            with st.expander(f"**{trans_type}** • {timestamp} • {tokens:,} tokens"):
+            with st.expander(f"**{trans_type}** • {timestamp} • {tokens:,} tokens{author}"):
                 col1, col2 = st.columns(2)
                 
                 with col1:
@@ -1007,3 +1633,5 @@ st.markdown("""
 </div>
 """.format(model=CLAUDE_MODELS[st.session_state.selected_model].split('(')[0].strip()), 
 unsafe_allow_html=True)
+
+METRICS.observe("streamlit_rerun_seconds", time.perf_counter() - RERUN_STARTED)
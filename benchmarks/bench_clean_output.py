@@ -0,0 +1,93 @@
+"""Cost of clean_translation_output on replies from 4 KB to 1 MB, whole and streamed
+
+Three shapes of reply per size: a normal drill-layout translation behind an
+analysis block, the same with many stray angle brackets ("<5 players"), and
+an analysis block that is never closed. "legacy" is the previous five-pass
+regex cleaner, kept here for comparison; it is skipped above --legacy-limit
+on the stray-bracket shape, where its cost grows quadratically.
+
+    python benchmarks/bench_clean_output.py [--sizes 4,16,64,256,1024] [--chunk 20]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cv_translator.cleanup import TranslationOutputCleaner, clean_translation_output  # noqa: E402
+
+FIELDS_BLOCK = """**Topic**
+Pressing after losing possession
+
+**Principle**
+Win the ball back within five seconds
+
+
+
+**Description**
+Two teams of seven play to goal. After a turnover, the nearest three players press the ball carrier.
+**Coaching points**
+- Reaction: Press immediately after the turnover
+"""
+STRAY_LINE = "- Rule: <5 players in the box, keep distances < 10 yards and > 5 yards\n"
+
+def legacy_clean(text: str) -> str:
+    text = re.sub(r'<[^>]+>.*?</[^>]+>', '', text, flags=re.DOTALL)
+    text = re.sub(r'<[^>]+>', '', text)
+    match = re.search(r'\*\*Topic\*\*', text, re.IGNORECASE)
+    if match:
+        text = text[match.start():]
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    text = re.sub(r'(\*\*[^*]+\*\*)\n([^\n])', r'\1\n\n\2', text)
+    return text.strip()
+
+def build_reply(kind: str, size: int) -> str:
+    if kind == "stray":
+        body = STRAY_LINE * (size // len(STRAY_LINE) + 1)
+        return ("<analysis>Checked units.</analysis>\n" + FIELDS_BLOCK + body)[:size]
+    body = FIELDS_BLOCK * (size // len(FIELDS_BLOCK) + 1)
+    if kind == "unclosed":
+        return ("<thinking>\nThe drill uses metres.\n" + body)[:size]
+    return ("<translation_breakdown>\nTerms checked.\n</translation_breakdown>\n" + body)[:size]
+
+def best_time(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def stream_clean(text: str, chunk: int) -> str:
+    cleaner = TranslationOutputCleaner()
+    for offset in range(0, len(text), chunk):
+        cleaner.feed(text[offset:offset + chunk])
+    return cleaner.finish()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="4,16,64,256,1024", help="Reply sizes in KB")
+    parser.add_argument("--chunk", type=int, default=20, help="Characters per streamed delta")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--legacy-limit", type=int, default=64, help="Largest stray-bracket size (KB) run with legacy")
+    args = parser.parse_args()
+
+    print(f"{'reply':<10} {'KB':>6} {'legacy ms':>10} {'clean ms':>10} {'stream ms':>10} {'MB/s':>8}")
+    for kind in ("normal", "stray", "unclosed"):
+        for size_kb in (int(size) for size in args.sizes.split(",")):
+            text = build_reply(kind, size_kb * 1024)
+            result = clean_translation_output(text)
+            if stream_clean(text, args.chunk) != result:
+                sys.exit(f"streamed output differs from one-shot output ({kind}, {size_kb} KB)")
+            legacy = "skipped"
+            if kind != "stray" or size_kb <= args.legacy_limit:
+                legacy = f"{best_time(lambda: legacy_clean(text), args.repeat) * 1000:.2f}"
+            whole = best_time(lambda: clean_translation_output(text), args.repeat)
+            streamed = best_time(lambda: stream_clean(text, args.chunk), args.repeat)
+            print(f"{kind:<10} {size_kb:>6} {legacy:>10} {whole * 1000:>10.2f} {streamed * 1000:>10.2f} "
+                  f"{len(text) / whole / 1e6:>8.1f}")
+
+if __name__ == "__main__":
+    main()
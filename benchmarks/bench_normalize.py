@@ -0,0 +1,52 @@
+"""Throughput of the deterministic drill normalization pass on a large synthetic corpus
+
+    python benchmarks/bench_normalize.py [--drills 20000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cv_translator.normalize import normalize_drill_text  # noqa: E402
+
+SAMPLE_DRILL = """Rondo de activación {i}
+CONTENIDO: Centro y remate
+CONSIGNA: Atacar el espacio entre Z2 y Z3 antes del centro
+TIEMPO: 4 x 4' (rec. 1')
+ESPACIO: {w}x{h}m, porterías a 5 m del área, pasillos de 1,5 metros
+Nº JUGADORES: 14 + 2 porteros
+DESCRIPCIÓN: Dos equipos de 7. El balón sale desde el centro del campo, se juega a Z1 y se finaliza con un centro lateral.
+NORMATIVAS: Máximo 2 toques en Z1; libre en Z4. Gol tras centro vale doble.
+GRADIENTE (+): Reducir el espacio a {h}x{h} m
+GRADIENTE (-): Añadir un comodín en el centro
+"""
+
+def build_corpus(drills: int) -> list:
+    return [SAMPLE_DRILL.format(i=i, w=30 + i % 30, h=20 + i % 15) for i in range(drills)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drills", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    
+    corpus = build_corpus(args.drills)
+    size_mb = sum(len(d.encode("utf-8")) for d in corpus) / 1_000_000
+    
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for drill in corpus:
+            normalize_drill_text(drill)
+        timings.append(time.perf_counter() - start)
+    
+    best = min(timings)
+    print(f"corpus: {args.drills} drills, {size_mb:.1f} MB")
+    print(f"best of {args.repeat}: {best:.3f} s  ({size_mb / best:.1f} MB/s, {best / args.drills * 1e6:.1f} us/drill)")
+    print("sample:")
+    print(normalize_drill_text(corpus[0]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Per-rerun setup cost and connection reuse, before and after caching the client
+
+"before" rebuilds what the Streamlit script used to build on every rerun (a
+scheduled Anthropic client with a fresh connection pool, the default prompts
+and the per-session helper objects); "after" is the cached path. The second
+part times sequential translations against benchmarks/mock_anthropic.py with
+a simulated handshake delay per new connection: a new client per translation
+(a new pool each rerun) against one long-lived pooled client.
+
+    python benchmarks/bench_rerun.py [--reruns 200] [--translations 10] [--connect-delay 0.15]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cv_translator.core import (  # noqa: E402
+    DEFAULT_MODEL,
+    get_default_drill_prompt,
+    get_default_general_prompt,
+    make_http_client,
+    make_scheduled_client,
+    translate_text,
+)
+from cv_translator.history import HistoryStats  # noqa: E402
+from cv_translator.scheduler import RequestScheduler  # noqa: E402
+from cv_translator.search import HistorySearchIndex  # noqa: E402
+from cv_translator.tokens import TokenEstimator  # noqa: E402
+
+from bench_translate import load_corpus  # noqa: E402
+from mock_anthropic import start_mock_server  # noqa: E402
+
+def rerun_before(scheduler: RequestScheduler):
+    make_scheduled_client("benchmark", scheduler=scheduler)
+    for _ in range(2):
+        get_default_drill_prompt.__wrapped__()
+        get_default_general_prompt.__wrapped__()
+    TokenEstimator(), HistorySearchIndex(), HistorySearchIndex(), HistoryStats(), HistoryStats()
+
+def rerun_after(clients: dict):
+    clients.get("benchmark")
+    for _ in range(2):
+        get_default_drill_prompt()
+        get_default_general_prompt()
+
+def mean_ms(function, runs: int) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        function()
+    return (time.perf_counter() - start) / runs * 1000
+
+def translate_all(drills: list, prompt: str, get_client) -> float:
+    """Mean ms per translation, asking get_client for the client before each one"""
+    start = time.perf_counter()
+    for drill in drills:
+        _, error = translate_text(get_client(), drill, prompt, DEFAULT_MODEL)
+        if error:
+            raise RuntimeError(error)
+    return (time.perf_counter() - start) / len(drills) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=200)
+    parser.add_argument("--translations", type=int, default=10)
+    parser.add_argument("--connect-delay", type=float, default=0.15,
+                        help="Simulated TCP + TLS handshake time per new connection (s)")
+    args = parser.parse_args()
+
+    scheduler = RequestScheduler()
+    clients = {"benchmark": make_scheduled_client("benchmark", scheduler=scheduler, http_client=make_http_client())}
+    rerun_before(scheduler)
+    print(f"rerun setup, before: {mean_ms(lambda: rerun_before(scheduler), args.reruns):8.2f} ms")
+    print(f"rerun setup, after:  {mean_ms(lambda: rerun_after(clients), args.reruns):8.2f} ms")
+
+    server = start_mock_server(ttft=0.05, tokens_per_second=4000, connect_delay=args.connect_delay)
+    drills = (load_corpus() * args.translations)[:args.translations]
+    prompt = get_default_drill_prompt()
+
+    def fresh_client():
+        return make_scheduled_client("benchmark", scheduler=scheduler, base_url=server.base_url)
+
+    pooled = make_scheduled_client("benchmark", scheduler=scheduler, base_url=server.base_url,
+                                   http_client=make_http_client())
+    before_connections = server.connections
+    fresh = translate_all(drills, prompt, fresh_client)
+    fresh_connections = server.connections - before_connections
+    reused = translate_all(drills, prompt, lambda: pooled)
+    pooled_connections = server.connections - before_connections - fresh_connections
+    print(f"translation, new client each time: {fresh:8.1f} ms  ({fresh_connections} connections)")
+    print(f"translation, pooled client:        {reused:8.1f} ms  ({pooled_connections} connections)")
+    print(f"saved per translation:             {fresh - reused:8.1f} ms")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
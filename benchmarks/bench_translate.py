@@ -0,0 +1,203 @@
+"""End-to-end translation benchmark against a local mock Messages endpoint
+
+Replays the drills in benchmarks/corpus/ through translate_text() (plain and
+streamed) and translate_batch() against benchmarks/mock_anthropic.py, so it
+runs offline and is not affected by real API variance. Reports throughput,
+latency percentiles, time to first token, memory, and the per-call cost of
+the local stages (output cleanup, cache-key hashing, request and output
+formatting). Results can be saved as JSON and compared with an earlier run;
+every metric is printed with its change, and --fail-above turns regressions
+into a non-zero exit status.
+
+    python benchmarks/bench_translate.py [--rounds 3] [--ttft 0.05] [--tokens-per-second 2000]
+    python benchmarks/bench_translate.py --output baseline.json
+    python benchmarks/bench_translate.py --baseline baseline.json --fail-above 10
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cv_translator.core import (  # noqa: E402
+    DEFAULT_MODEL,
+    build_translation_request,
+    clean_translation_output,
+    get_cache_key,
+    get_default_drill_prompt,
+    get_legacy_cache_key,
+    make_client,
+    split_batch_input,
+    translate_batch,
+    translate_text,
+)
+from cv_translator.metrics import METRICS, percentile  # noqa: E402
+from cv_translator.normalize import normalize_drill_text  # noqa: E402
+from cv_translator.sections import parse_english_fields, render_drill_fields  # noqa: E402
+
+from mock_anthropic import build_reply, start_mock_server  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+# Metrics where a larger value is an improvement; everything else is a cost
+HIGHER_IS_BETTER = ("drills_per_second",)
+
+def load_corpus(directory: str = CORPUS_DIR) -> list:
+    """Every drill in the corpus files, in file then position order"""
+    drills = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".txt"):
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                drills.extend(split_batch_input(f.read()))
+    return drills
+
+def latency_stats(latencies: list) -> dict:
+    ordered = sorted(latencies)
+    return {
+        'p50_ms': percentile(ordered, 0.5) * 1000,
+        'p95_ms': percentile(ordered, 0.95) * 1000,
+        'p99_ms': percentile(ordered, 0.99) * 1000,
+    }
+
+def run_sequential(client, drills: list, prompt: str, model: str, stream: bool) -> dict:
+    """translate_text on each drill in turn, without a cache so every call reaches the endpoint"""
+    latencies = []
+    started = time.perf_counter()
+    for drill in drills:
+        call_started = time.perf_counter()
+        _, error = translate_text(client, drill, prompt, model, on_progress=(lambda _: None) if stream else None)
+        if error:
+            raise RuntimeError(error)
+        latencies.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    return {'drills_per_second': len(drills) / elapsed, **latency_stats(latencies)}
+
+def run_batch(client, drills: list, prompt: str, model: str, concurrency: int) -> dict:
+    started = time.perf_counter()
+    for _, _, error in translate_batch(client, drills, prompt, model, max_workers=concurrency):
+        if error:
+            raise RuntimeError(error)
+    return {'drills_per_second': len(drills) / (time.perf_counter() - started)}
+
+def time_stage(function, inputs: list, min_seconds: float = 0.2) -> float:
+    """Mean microseconds per call of function over inputs, repeated for at least min_seconds"""
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        for value in inputs:
+            function(value)
+        calls += len(inputs)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return elapsed / calls * 1e6
+
+def run_stages(drills: list, prompt: str, model: str) -> dict:
+    """Per-call cost of the local work done around each API call"""
+    replies = [build_reply(drill, 4000) for drill in drills]
+    noisy_replies = [f"<translation_breakdown>\n{drill}\n</translation_breakdown>\n\n**Topic**\n{reply}"
+                     for drill, reply in zip(drills, replies)]
+    return {
+        'clean_output_us': time_stage(clean_translation_output, noisy_replies),
+        'cache_key_us': time_stage(lambda drill: get_cache_key(drill, prompt, model), drills),
+        'legacy_cache_key_us': time_stage(lambda drill: get_legacy_cache_key(drill, prompt, model), drills),
+        'build_request_us': time_stage(lambda drill: build_translation_request(prompt, drill), drills),
+        'normalize_us': time_stage(normalize_drill_text, drills),
+        'format_fields_us': time_stage(lambda reply: render_drill_fields(parse_english_fields(reply)), replies),
+    }
+
+def run_benchmark(args) -> dict:
+    drills = load_corpus(args.corpus) * args.rounds
+    prompt = get_default_drill_prompt()
+    server = start_mock_server(args.ttft, args.tokens_per_second)
+    client = make_client(api_key="benchmark", base_url=server.base_url, max_retries=0)
+
+    # Untimed calls so connection setup and lazy SDK imports are not counted
+    translate_text(client, drills[0], prompt, args.model)
+    translate_text(client, drills[0], prompt, args.model, on_progress=lambda _: None)
+    METRICS.clear()
+
+    tracemalloc.start()
+    results = {
+        'sequential': run_sequential(client, drills, prompt, args.model, stream=False),
+        'stream': run_sequential(client, drills, prompt, args.model, stream=True),
+        'batch': run_batch(client, drills, prompt, args.model, args.concurrency),
+    }
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ttft = METRICS.summary_stats("translation_ttft_seconds")
+    if ttft:
+        results['stream'].update(ttft_p50_ms=ttft['p50'] * 1000, ttft_p95_ms=ttft['p95'] * 1000)
+    results['stages'] = run_stages(drills[:len(drills) // args.rounds], prompt, args.model)
+    results['memory'] = {
+        'python_peak_mb': peak / 1e6,
+        # ru_maxrss is in kilobytes on Linux
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3,
+    }
+    server.shutdown()
+    return {
+        'config': {'drills': len(drills), 'ttft': args.ttft, 'tokens_per_second': args.tokens_per_second,
+                   'concurrency': args.concurrency, 'model': args.model},
+        'results': results,
+    }
+
+def compare(results: dict, baseline: dict) -> list:
+    """(group, metric, baseline, current, % change, regression) for every metric in both runs"""
+    rows = []
+    for group, metrics in results.items():
+        for name, value in metrics.items():
+            old = baseline.get(group, {}).get(name)
+            if not old:
+                continue
+            change = (value - old) / old * 100
+            rows.append((group, name, old, value, change, -change if name in HIGHER_IS_BETTER else change))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="Directory of .txt files of drills separated by ---")
+    parser.add_argument("--rounds", type=int, default=3, help="Times the corpus is replayed")
+    parser.add_argument("--ttft", type=float, default=0.05, help="Simulated seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0, help="Simulated output token rate")
+    parser.add_argument("--concurrency", type=int, default=4, help="Workers for the translate_batch run")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file from an earlier --output run to compare against")
+    parser.add_argument("--fail-above", type=float, metavar="PERCENT",
+                        help="Exit with status 1 when any metric is this much worse than the baseline")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    config = report['config']
+    print(f"corpus: {config['drills']} drills, ttft {config['ttft']} s, "
+          f"{config['tokens_per_second']:g} tokens/s, batch concurrency {config['concurrency']}")
+
+    rows = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            rows = compare(report['results'], json.load(f)['results'])
+        print(f"{'metric':<32} {'baseline':>12} {'current':>12} {'change':>9}")
+        for group, name, old, value, change, _ in rows:
+            print(f"{group + '.' + name:<32} {old:>12.2f} {value:>12.2f} {change:>+8.1f}%")
+    else:
+        for group, metrics in report['results'].items():
+            for name, value in metrics.items():
+                print(f"{group + '.' + name:<32} {value:>12.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.fail_above is not None:
+        regressions = [row for row in rows if row[5] > args.fail_above]
+        for group, name, _, _, change, _ in regressions:
+            print(f"REGRESSION: {group}.{name} {change:+.1f}%")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
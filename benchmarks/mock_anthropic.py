@@ -0,0 +1,194 @@
+"""Local stand-in for the Anthropic Messages endpoint, for offline benchmarks
+
+Serves POST /v1/messages (plain JSON and server-sent-event streaming) with a
+configurable time to first token and output token rate, and optionally a
+per-connection setup delay standing in for TCP and TLS handshakes. Replies are canned
+drill translations in the standard layout, sized from the request, with
+realistic usage blocks. The system block is reported as a prompt cache write
+the first time it is seen and as a cache read afterwards.
+
+    python benchmarks/mock_anthropic.py --port 8765 --ttft 0.4 --tokens-per-second 80
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ...
+
+Characters / 4 stands in for the tokenizer throughout.
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Output tokens sent per streamed text delta
+STREAM_CHUNK_TOKENS = 5
+
+CANNED_FIELDS = [
+    ("Topic", "Pressing after losing possession"),
+    ("Principle", "Win the ball back within five seconds of losing it"),
+    ("Microcycle day", "MD-3"),
+    ("Time", "4 x 4 minutes (1 minute rest)"),
+    ("Players", "14 + 2 goalkeepers"),
+    ("Physical focus", "Speed endurance"),
+    ("Space/equipment", "44x33 yards, two full-size goals, cones and bibs"),
+    ("Description", "Two teams of seven play to goal. The ball starts in the middle third and must reach Zone 1 "
+                    "before a team can finish. After a turnover, the nearest three players press the ball carrier."),
+    ("Progressions", "- More advanced: Reduce the space to 33x33 yards\n- Simplified: Add a neutral player in the middle"),
+    ("Coaching points", "- Reaction: Press immediately after the turnover\n- Cover: Close the inside passing lane\n"
+                        "- Communication: The nearest player calls the press"),
+]
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def request_text(body: dict):
+    """(system text, user text) of a Messages request"""
+    system = body.get("system") or ""
+    if isinstance(system, list):
+        system = "".join(block.get("text", "") for block in system)
+    user = ""
+    for message in body.get("messages", []):
+        content = message.get("content", "")
+        if isinstance(content, list):
+            content = "".join(block.get("text", "") for block in content if isinstance(block, dict))
+        user += content
+    return system, user
+
+def build_reply(user_text: str, max_tokens: int) -> str:
+    """A drill-layout reply about as long as an English rendering of the input"""
+    target_chars = min(max_tokens, int(count_tokens(user_text) * 1.1) + 120) * 4
+    reply = "\n\n".join(f"{field}\n{content}" for field, content in CANNED_FIELDS)
+    while len(reply) < target_chars:
+        reply += "\n- Detail: " + CANNED_FIELDS[7][1]
+    return reply[:target_chars]
+
+class MockMessagesServer(ThreadingHTTPServer):
+    """HTTP server holding the simulated latency settings and prompt cache"""
+
+    daemon_threads = True
+
+    def __init__(self, address, ttft: float = 0.3, tokens_per_second: float = 100.0, connect_delay: float = 0.0):
+        super().__init__(address, MockMessagesHandler)
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.connect_delay = connect_delay
+        self.connections = 0
+        self.requests = 0
+        self._cached_prompts = set()
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def finish_request(self, request, client_address):
+        """Serve one connection, after the simulated handshake delay"""
+        with self._lock:
+            self.connections += 1
+        time.sleep(self.connect_delay)
+        super().finish_request(request, client_address)
+
+    def usage(self, system: str, user: str, output_tokens: int) -> dict:
+        system_tokens = count_tokens(system) if system else 0
+        key = hashlib.blake2b(system.encode(), digest_size=16).digest()
+        with self._lock:
+            self.requests += 1
+            cached = key in self._cached_prompts
+            self._cached_prompts.add(key)
+        return {
+            "input_tokens": count_tokens(user),
+            "output_tokens": output_tokens,
+            "cache_creation_input_tokens": 0 if cached else system_tokens,
+            "cache_read_input_tokens": system_tokens if cached else 0,
+        }
+
+    def start(self) -> "MockMessagesServer":
+        threading.Thread(target=self.serve_forever, name="mock-anthropic", daemon=True).start()
+        return self
+
+class MockMessagesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if self.path.split("?")[0] != "/v1/messages":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        system, user = request_text(body)
+        reply = build_reply(user, body.get("max_tokens", 4000))
+        usage = self.server.usage(system, user, count_tokens(reply))
+        message = {
+            "id": "msg_" + uuid.uuid4().hex[:24],
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "mock"),
+            "content": [{"type": "text", "text": reply}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": usage,
+        }
+        if body.get("stream"):
+            self.stream(message, reply)
+        else:
+            time.sleep(self.server.ttft + usage["output_tokens"] / self.server.tokens_per_second)
+            self.send_json(message)
+
+    def send_json(self, payload: dict):
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_event(self, event: str, payload: dict):
+        data = f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def stream(self, message: dict, reply: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(self.server.ttft)
+        start = dict(message, content=[], stop_reason=None, usage=dict(message["usage"], output_tokens=1))
+        self.send_event("message_start", {"type": "message_start", "message": start})
+        self.send_event("content_block_start", {"type": "content_block_start", "index": 0,
+                                                "content_block": {"type": "text", "text": ""}})
+        chunk_chars = STREAM_CHUNK_TOKENS * 4
+        for offset in range(0, len(reply), chunk_chars):
+            time.sleep(STREAM_CHUNK_TOKENS / self.server.tokens_per_second)
+            self.send_event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                    "delta": {"type": "text_delta",
+                                                              "text": reply[offset:offset + chunk_chars]}})
+        self.send_event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        self.send_event("message_delta", {"type": "message_delta",
+                                          "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                          "usage": {"output_tokens": message["usage"]["output_tokens"]}})
+        self.send_event("message_stop", {"type": "message_stop"})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+def start_mock_server(ttft: float = 0.3, tokens_per_second: float = 100.0, port: int = 0,
+                      connect_delay: float = 0.0) -> MockMessagesServer:
+    """Start a mock endpoint on 127.0.0.1 (a free port by default) in a daemon thread"""
+    return MockMessagesServer(("127.0.0.1", port), ttft, tokens_per_second, connect_delay).start()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.3, help="Seconds before the first output token")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--connect-delay", type=float, default=0.0, help="Seconds added to each new connection")
+    args = parser.parse_args()
+    server = MockMessagesServer(("127.0.0.1", args.port), args.ttft, args.tokens_per_second, args.connect_delay)
+    print(f"Mock Messages endpoint on {server.base_url}/v1/messages")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""CV Spanish Translator core, usable without Streamlit
+
+The web UI lives in CV-IPPM-Translator.py; scripts and workers can import from
+here or run the command line tool with `python -m cv_translator`.
+"""
+from .core import (
+    CLAUDE_MODELS,
+    DEFAULT_MODEL,
+    calculate_estimated_cost,
+    canonicalize_text,
+    clean_translation_output,
+    estimate_tokens,
+    get_cache_key,
+    get_default_drill_prompt,
+    get_default_general_prompt,
+    get_model_cost_per_token,
+    get_text_hash,
+    make_client,
+    split_batch_input,
+    translate_batch,
+    translate_text,
+)
+
+__all__ = [
+    "CLAUDE_MODELS",
+    "DEFAULT_MODEL",
+    "calculate_estimated_cost",
+    "canonicalize_text",
+    "clean_translation_output",
+    "estimate_tokens",
+    "get_cache_key",
+    "get_default_drill_prompt",
+    "get_default_general_prompt",
+    "get_model_cost_per_token",
+    "get_text_hash",
+    "make_client",
+    "split_batch_input",
+    "translate_batch",
+    "translate_text",
+]
@@ -0,0 +1,241 @@
+"""Overnight bulk translation through the Message Batches API"""
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, List, Optional
+
+from .core import (
+    GENERATION_PARAMS,
+    build_translation_request,
+    clean_translation_output,
+    estimate_tokens,
+    get_cache_key,
+    get_legacy_cache_key,
+    get_usage_tokens,
+    lookup_translation,
+    record_translation,
+)
+
+BULK_JOBS_DIR = os.environ.get("CV_TRANSLATOR_BULK_DIR", "bulk_jobs")
+USE_FAKE_BATCHES = os.environ.get("CV_TRANSLATOR_FAKE_BATCHES", "") == "1"
+
+class FakeMessageBatches:
+    """Offline stand-in for client.messages.batches with the same create/retrieve/results calls
+    
+    Batches report "in_progress" until complete_after seconds have passed, then every
+    request succeeds with the text produced by respond (a canned drill by default).
+    With state_path set, submitted batches are kept in a JSON file so separate CLI
+    runs can submit and later collect. Enable it with CV_TRANSLATOR_FAKE_BATCHES=1.
+    """
+    
+    def __init__(self, complete_after: float = 0.0, respond: Optional[Callable[[dict], str]] = None,
+                 state_path: Optional[str] = None):
+        self.complete_after = complete_after
+        self.respond = respond or (lambda params: "Topic\n- [offline batch translation]\n\n" + params['messages'][0]['content'])
+        self.state_path = state_path
+        self._batches = {}
+        if state_path and os.path.exists(state_path):
+            with open(state_path, encoding="utf-8") as f:
+                self._batches = json.load(f)
+    
+    def create(self, requests: List[dict]):
+        batch_id = f"msgbatch_fake_{uuid.uuid4().hex[:16]}"
+        self._batches[batch_id] = {'created': time.time(), 'requests': list(requests)}
+        if self.state_path:
+            os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+            with open(self.state_path, "w", encoding="utf-8") as f:
+                json.dump(self._batches, f)
+        return self.retrieve(batch_id)
+    
+    def retrieve(self, batch_id: str):
+        batch = self._batches[batch_id]
+        ended = time.time() - batch['created'] >= self.complete_after
+        count = len(batch['requests'])
+        return SimpleNamespace(
+            id=batch_id,
+            processing_status="ended" if ended else "in_progress",
+            request_counts=SimpleNamespace(
+                processing=0 if ended else count,
+                succeeded=count if ended else 0,
+                errored=0, canceled=0, expired=0
+            )
+        )
+    
+    def results(self, batch_id: str):
+        for request in self._batches[batch_id]['requests']:
+            params = request['params']
+            text = self.respond(params)
+            yield SimpleNamespace(
+                custom_id=request['custom_id'],
+                result=SimpleNamespace(
+                    type="succeeded",
+                    message=SimpleNamespace(
+                        content=[SimpleNamespace(type="text", text=text)],
+                        usage=SimpleNamespace(
+                            input_tokens=estimate_tokens(params['system'][0]['text'] + params['messages'][0]['content']),
+                            output_tokens=estimate_tokens(text),
+                            cache_creation_input_tokens=0,
+                            cache_read_input_tokens=0
+                        )
+                    )
+                )
+            )
+
+def get_batches_api(client, use_fake: bool = USE_FAKE_BATCHES, jobs_dir: str = BULK_JOBS_DIR):
+    """Return the Message Batches endpoint, or an offline fake when configured"""
+    if use_fake:
+        return FakeMessageBatches(state_path=os.path.join(jobs_dir, "fake_batches.state"))
+    return client.messages.batches if client else None
+
+def save_bulk_manifest(manifest: dict, jobs_dir: str = BULK_JOBS_DIR):
+    """Atomically write a bulk job manifest so an interrupted run can resume"""
+    os.makedirs(jobs_dir, exist_ok=True)
+    path = os.path.join(jobs_dir, f"{manifest['job_id']}.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def load_bulk_manifests(jobs_dir: str = BULK_JOBS_DIR) -> List[dict]:
+    """Load every bulk job manifest, newest first"""
+    if not os.path.isdir(jobs_dir):
+        return []
+    manifests = []
+    for name in os.listdir(jobs_dir):
+        if name.endswith(".json"):
+            with open(os.path.join(jobs_dir, name), encoding="utf-8") as f:
+                manifests.append(json.load(f))
+    return sorted(manifests, key=lambda m: m['created_at'], reverse=True)
+
+def submit_bulk_job(batches_api, drills: List[str], prompt_template: str, model: str, cache=None,
+                    jobs_dir: str = BULK_JOBS_DIR, max_requests_per_batch: int = 10_000,
+                    originals: Optional[List[str]] = None) -> Optional[dict]:
+    """Submit uncached drills to the Message Batches API and save a resumable manifest
+    
+    Cache keys double as batch custom_ids, so duplicates within the archive are sent once
+    and results can be matched back to their drills however long collection is delayed.
+    Drills already waiting in an unfinished job are not submitted again. originals, if
+    given, are the drills as typed (before normalization); history records those.
+    The manifest is saved as 'pending' before the first batch is created and becomes
+    'submitted' once every batch id is recorded, so an interrupted submission is never
+    lost and its drills are not sent a second time.
+    """
+    in_flight = set()
+    for manifest in load_bulk_manifests(jobs_dir):
+        if manifest['status'] != 'complete':
+            in_flight.update(manifest['drills'])
+    
+    requests = {}
+    sources = {}
+    for position, drill in enumerate(drills):
+        cache_key = get_cache_key(drill, prompt_template, model)
+        legacy_key = get_legacy_cache_key(drill, prompt_template, model)
+        # Jobs submitted before the key change still list their drills under legacy keys
+        if cache_key in requests or cache_key in in_flight or legacy_key in in_flight:
+            continue
+        if lookup_translation(cache, cache_key, legacy_key) is None:
+            requests[cache_key] = drill
+            if originals and originals[position] != drill:
+                sources[cache_key] = originals[position]
+    
+    if not requests:
+        return None
+    
+    manifest = {
+        'job_id': datetime.now().strftime('%Y%m%d_%H%M%S_') + uuid.uuid4().hex[:6],
+        'created_at': datetime.now().isoformat(),
+        'model': model,
+        'prompt_template': prompt_template,
+        'batch_ids': [],
+        'finished_batches': [],
+        'drills': requests,
+        'originals': sources,
+        'collected': [],
+        'failed': {},
+        'status': 'pending'
+    }
+    # Written before any batch exists: a crash inside create() leaves this record, not an unknown paid batch
+    save_bulk_manifest(manifest, jobs_dir)
+    
+    keys = list(requests)
+    for start in range(0, len(keys), max_requests_per_batch):
+        batch = batches_api.create(requests=[
+            {
+                'custom_id': cache_key,
+                'params': {
+                    'model': model,
+                    **GENERATION_PARAMS,
+                    **build_translation_request(prompt_template, requests[cache_key])
+                }
+            }
+            for cache_key in keys[start:start + max_requests_per_batch]
+        ])
+        manifest['batch_ids'].append(batch.id)
+        # Save after every batch so a crash mid-submission never orphans a paid batch
+        save_bulk_manifest(manifest, jobs_dir)
+    
+    manifest['status'] = 'submitted'
+    save_bulk_manifest(manifest, jobs_dir)
+    return manifest
+
+def collect_bulk_job(batches_api, manifest: dict, cache=None, history: Optional[list] = None,
+                     jobs_dir: str = BULK_JOBS_DIR) -> dict:
+    """Poll a bulk job and record finished results into the cache and history
+    
+    Safe to call repeatedly: results already collected are skipped, and the manifest
+    is saved after each batch so collection resumes where it stopped. A job whose
+    submission never finished stays 'pending', even once its recorded batches are
+    collected: a batch may exist that it has no id for (see release_bulk_job).
+    """
+    collected = set(manifest['collected'])
+    pending_batches = 0
+    
+    for batch_id in manifest['batch_ids']:
+        if batch_id in manifest['finished_batches']:
+            continue
+        batch = batches_api.retrieve(batch_id)
+        if batch.processing_status != "ended":
+            pending_batches += 1
+            continue
+        
+        for entry in batches_api.results(batch_id):
+            cache_key = entry.custom_id
+            if cache_key in collected or cache_key not in manifest['drills']:
+                continue
+            if entry.result.type == "succeeded":
+                message = entry.result.message
+                result = {
+                    'translation': clean_translation_output(message.content[0].text),
+                    **get_usage_tokens(message.usage),
+                    'batch': True
+                }
+                record_translation(cache, history, cache_key, manifest['drills'][cache_key],
+                                   manifest['prompt_template'], manifest['model'], result,
+                                   manifest.get('originals', {}).get(cache_key))
+                collected.add(cache_key)
+            else:
+                manifest['failed'][cache_key] = entry.result.type
+        
+        manifest['collected'] = sorted(collected)
+        manifest['finished_batches'].append(batch_id)
+        save_bulk_manifest(manifest, jobs_dir)
+    
+    if manifest['status'] != 'pending':
+        manifest['status'] = 'in_progress' if pending_batches else 'complete'
+    save_bulk_manifest(manifest, jobs_dir)
+    return manifest
+
+def release_bulk_job(manifest: dict, jobs_dir: str = BULK_JOBS_DIR) -> dict:
+    """Mark an interrupted ('pending') job complete, so its uncollected drills can be submitted again
+    
+    Only for a submission known to have died: check the Console first for a batch
+    holding these drills, or they may be paid for twice.
+    """
+    manifest['released'] = sorted(set(manifest['drills']) - set(manifest['collected']))
+    manifest['status'] = 'complete'
+    save_bulk_manifest(manifest, jobs_dir)
+    return manifest
+
@@ -0,0 +1,136 @@
+"""Persistent translation cache shared by every session, worker and CLI run"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+CACHE_DB_PATH = os.environ.get("CV_TRANSLATOR_CACHE_DB", "translation_cache.db")
+CACHE_TTL_DAYS = int(os.environ.get("CV_TRANSLATOR_CACHE_TTL_DAYS", "365"))
+CACHE_MAX_ENTRIES = int(os.environ.get("CV_TRANSLATOR_CACHE_MAX_ENTRIES", "20000"))
+
+class PersistentTranslationCache:
+    """SQLite-backed translation cache with TTL expiry and size-bounded LRU eviction
+    
+    One instance is shared by all Streamlit sessions (see get_persistent_cache), so
+    access is serialized with a lock and the connection is allowed across threads.
+    """
+    
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS translations (
+                    cache_key TEXT PRIMARY KEY,
+                    translation TEXT NOT NULL,
+                    input_tokens INTEGER NOT NULL DEFAULT 0,
+                    output_tokens INTEGER NOT NULL DEFAULT 0,
+                    model TEXT,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_translations_last_access ON translations (last_access)"
+            )
+    
+    def get(self, cache_key: str) -> Optional[dict]:
+        """Return a cached entry, or None if it is missing or expired"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT translation, input_tokens, output_tokens, model, created_at "
+                "FROM translations WHERE cache_key = ?",
+                (cache_key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[4] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM translations WHERE cache_key = ?", (cache_key,))
+                return None
+            self._conn.execute("UPDATE translations SET last_access = ? WHERE cache_key = ?", (now, cache_key))
+        return {
+            'translation': row[0],
+            'input_tokens': row[1],
+            'output_tokens': row[2],
+            'model': row[3],
+            'timestamp': datetime.fromtimestamp(row[4]).isoformat()
+        }
+    
+    def put(self, cache_key: str, entry: dict):
+        """Insert or replace an entry, then evict the least recently used rows over the limit"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations "
+                "(cache_key, translation, input_tokens, output_tokens, model, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    cache_key,
+                    entry['translation'],
+                    entry.get('input_tokens', 0),
+                    entry.get('output_tokens', 0),
+                    entry.get('model'),
+                    now,
+                    now
+                )
+            )
+            self._conn.execute(
+                "DELETE FROM translations WHERE cache_key IN ("
+                "SELECT cache_key FROM translations ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+    
+    def purge_expired(self) -> int:
+        """Delete every expired entry and return how many were removed"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM translations WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,)
+            )
+            return cursor.rowcount
+    
+    def clear(self):
+        """Remove every entry"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM translations")
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+class TieredTranslationCache:
+    """A per-session dict in front of the shared persistent cache
+    
+    Hits in the shared cache are copied into the local dict so later lookups in the
+    same session skip SQLite entirely.
+    """
+    
+    def __init__(self, local: dict, shared: Optional[PersistentTranslationCache]):
+        self.local = local
+        self.shared = shared
+    
+    def get(self, cache_key: str) -> Optional[dict]:
+        if cache_key in self.local:
+            return self.local[cache_key]
+        cached = self.shared.get(cache_key) if self.shared is not None else None
+        if cached:
+            self.local[cache_key] = cached
+        return cached
+    
+    def put(self, cache_key: str, entry: dict):
+        self.local[cache_key] = entry
+        if self.shared is not None:
+            self.shared.put(cache_key, entry)
+
+def open_default_cache() -> PersistentTranslationCache:
+    """Open the persistent cache configured through the CV_TRANSLATOR_CACHE_* variables"""
+    cache = PersistentTranslationCache(CACHE_DB_PATH, CACHE_TTL_DAYS * 86400, CACHE_MAX_ENTRIES)
+    cache.purge_expired()
+    return cache
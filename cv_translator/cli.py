@@ -0,0 +1,332 @@
+"""Command line entry point: translate drill files or directories without the web UI
+
+    python -m cv_translator translate drills/ -o translated/
+    python -m cv_translator estimate archive/ --calibrate-from history.jsonl
+    python -m cv_translator bulk submit archive/
+    python -m cv_translator bulk collect
+    python -m cv_translator export history.jsonl -o weekly.parquet
+    python -m cv_translator serve --port 8710
+
+Reads ANTHROPIC_API_KEY from the environment and shares the persistent
+translation cache with the Streamlit app.
+"""
+import argparse
+import json
+import os
+import sys
+from typing import List, Optional, Tuple
+
+from .core import (
+    CLAUDE_MODELS,
+    DEFAULT_MODEL,
+    calculate_estimated_cost,
+    get_default_drill_prompt,
+    get_default_general_prompt,
+    split_batch_input,
+    translate_batch,
+)
+
+DRILL_FILE_EXTENSIONS = (".txt", ".md")
+OUTPUT_SEPARATOR = "\n\n---\n\n"
+
+def collect_input_files(paths: List[str]) -> List[str]:
+    """Expand files and directories (recursively) into a sorted list of drill files"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(
+                    os.path.join(root, name) for name in names
+                    if name.endswith(DRILL_FILE_EXTENSIONS) and not name.endswith(".en.txt")
+                )
+        else:
+            files.append(path)
+    return sorted(files)
+
+def read_drills(files: List[str], normalize: bool = True) -> List[Tuple[str, str, str]]:
+    """Read every drill as (source file, text to send, text as written)
+    
+    Files may hold several drills separated by ---. History records the text as written.
+    """
+    if normalize:
+        from .normalize import normalize_drill_text
+    drills = []
+    for path in files:
+        with open(path, encoding="utf-8") as f:
+            drills.extend(
+                (path, normalize_drill_text(drill) if normalize else drill, drill)
+                for drill in split_batch_input(f.read())
+            )
+    return drills
+
+def load_prompt(args) -> str:
+    if args.prompt_file:
+        with open(args.prompt_file, encoding="utf-8") as f:
+            return f.read()
+    return get_default_drill_prompt() if args.mode == "drill" else get_default_general_prompt()
+
+def open_cache(args):
+    if args.no_cache:
+        return None
+    from .cache import TieredTranslationCache, open_default_cache
+    return TieredTranslationCache({}, open_default_cache())
+
+def open_history(args) -> list:
+    """A plain list, or one that also records into the shared team history store"""
+    if not args.shared_history:
+        return []
+    import getpass
+    from .history import RecordedHistory, open_default_history_store
+    return RecordedHistory(open_default_history_store(), user=getpass.getuser())
+
+def close_history(history: list):
+    """Wait for the shared store's background writer to finish"""
+    store = getattr(history, 'store', None)
+    if store is not None:
+        store.close()
+
+def write_history(path: Optional[str], history: list):
+    """Append history entries to a JSON Lines file"""
+    if not path or not history:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        for entry in history:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+def cmd_translate(args) -> int:
+    from .core import make_scheduled_client
+    
+    drills = read_drills(collect_input_files(args.paths), normalize=not args.no_normalize)
+    if not drills:
+        print("No drills found", file=sys.stderr)
+        return 1
+    
+    client = make_scheduled_client(os.environ.get("ANTHROPIC_API_KEY"))
+    prompt_template = load_prompt(args)
+    history = open_history(args)
+    translations = [None] * len(drills)
+    failures = 0
+    
+    for index, translation, error in translate_batch(
+        client, [drill for _, drill, _ in drills], prompt_template, args.model,
+        cache=open_cache(args), history=history, max_workers=args.concurrency,
+        originals=[original for _, _, original in drills]
+    ):
+        translations[index] = translation or ""
+        if error:
+            failures += 1
+            print(f"[{index + 1}/{len(drills)}] {drills[index][0]}: failed: {error}", file=sys.stderr)
+        elif not args.quiet:
+            print(f"[{index + 1}/{len(drills)}] {drills[index][0]}: done", file=sys.stderr)
+    
+    # Group translations back by source file, keeping the original drill order
+    by_file = {}
+    for (path, _, _), translation in zip(drills, translations):
+        by_file.setdefault(path, []).append(translation)
+    
+    for path, file_translations in by_file.items():
+        output = OUTPUT_SEPARATOR.join(file_translations) + "\n"
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            stem = os.path.splitext(os.path.basename(path))[0]
+            with open(os.path.join(args.output_dir, f"{stem}.en.txt"), "w", encoding="utf-8") as f:
+                f.write(output)
+        else:
+            sys.stdout.write(output)
+    
+    write_history(args.history, history)
+    close_history(history)
+    cost = sum(
+        calculate_estimated_cost(h['input_tokens'], h['output_tokens'], h['model'],
+                                 h['cache_write_tokens'], h['cache_read_tokens'])
+        for h in history
+    )
+    if not args.quiet:
+        print(f"{len(drills) - failures}/{len(drills)} drills translated, "
+              f"{len(history)} API calls, ${cost:.4f}", file=sys.stderr)
+    return 1 if failures else 0
+
+def cmd_estimate(args) -> int:
+    from .export import read_history_files
+    from .tokens import TokenEstimator
+    
+    drills = [drill for _, drill, _ in read_drills(collect_input_files(args.paths), normalize=not args.no_normalize)]
+    estimator = TokenEstimator()
+    # One calibrate() call: it treats its argument as a single append-only history
+    estimator.calibrate(list(read_history_files(args.calibrate_from or [])))
+    
+    prompt_template = load_prompt(args)
+    interactive = estimator.forecast_cost(drills, prompt_template, args.model)
+    bulk = estimator.forecast_cost(drills, prompt_template, args.model, batch=True)
+    kind = "drill" if args.mode == "drill" else "general"
+    samples = estimator.samples(args.model, kind)
+    print(f"{len(drills)} drills: {interactive['input_tokens']:,} input / {interactive['output_tokens']:,} output tokens")
+    print(f"Interactive: ${interactive['cost']:.4f}   Bulk (Message Batches): ${bulk['cost']:.4f}")
+    print(f"Calibrated from {samples} {kind} translations" if samples else "Uncalibrated rough estimate "
+          "(pass --calibrate-from with a --history file to calibrate)")
+    return 0
+
+def cmd_bulk_submit(args) -> int:
+    from .bulk import get_batches_api, submit_bulk_job
+    from .core import make_client
+    
+    drills = read_drills(collect_input_files(args.paths), normalize=not args.no_normalize)
+    client = None if args.fake else make_client(os.environ.get("ANTHROPIC_API_KEY"))
+    manifest = submit_bulk_job(
+        get_batches_api(client, use_fake=args.fake, jobs_dir=args.jobs_dir),
+        [drill for _, drill, _ in drills], load_prompt(args), args.model,
+        cache=open_cache(args), jobs_dir=args.jobs_dir,
+        originals=[original for _, _, original in drills]
+    )
+    if manifest is None:
+        print("All drills are already cached or waiting in another job; nothing submitted", file=sys.stderr)
+    else:
+        print(f"Submitted {len(manifest['drills'])} drills as job {manifest['job_id']}", file=sys.stderr)
+    return 0
+
+def cmd_bulk_collect(args) -> int:
+    from .bulk import collect_bulk_job, get_batches_api, load_bulk_manifests
+    from .core import make_client
+    
+    client = None if args.fake else make_client(os.environ.get("ANTHROPIC_API_KEY"))
+    batches_api = get_batches_api(client, use_fake=args.fake, jobs_dir=args.jobs_dir)
+    history = open_history(args)
+    pending = 0
+    for manifest in load_bulk_manifests(args.jobs_dir):
+        if manifest['status'] == 'complete' or (args.job and manifest['job_id'] != args.job):
+            continue
+        manifest = collect_bulk_job(batches_api, manifest, cache=open_cache(args), history=history,
+                                    jobs_dir=args.jobs_dir)
+        pending += manifest['status'] != 'complete'
+        print(f"{manifest['job_id']}: {manifest['status']}, "
+              f"{len(manifest['collected'])}/{len(manifest['drills'])} collected", file=sys.stderr)
+        if manifest['status'] == 'pending':
+            print(f"  submission did not finish; once no batch holds its drills, run "
+                  f"'bulk release {manifest['job_id']}' to submit them again", file=sys.stderr)
+    write_history(args.history, history)
+    close_history(history)
+    return 2 if pending else 0
+
+def cmd_bulk_release(args) -> int:
+    from .bulk import load_bulk_manifests, release_bulk_job
+    
+    for manifest in load_bulk_manifests(args.jobs_dir):
+        if manifest['job_id'] != args.job:
+            continue
+        if manifest['status'] != 'pending':
+            print(f"{args.job} is {manifest['status']}; only an interrupted (pending) job can be released",
+                  file=sys.stderr)
+            return 1
+        manifest = release_bulk_job(manifest, args.jobs_dir)
+        print(f"Released {len(manifest['released'])} drills of {args.job}", file=sys.stderr)
+        return 0
+    print(f"No bulk job {args.job}", file=sys.stderr)
+    return 1
+
+def cmd_export(args) -> int:
+    from .export import get_export_format, read_history_files, write_export
+    
+    try:
+        export_format = get_export_format(args.output, args.format)
+        rows = write_export(read_history_files(args.history_files), args.output, export_format)
+    except (ImportError, ValueError) as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    print(f"Exported {rows} entries to {args.output} ({export_format})", file=sys.stderr)
+    return 0
+
+def cmd_serve(args) -> int:
+    from .service import StubMessagesClient, TranslationService, make_translation_server
+    
+    if args.stub:
+        client = StubMessagesClient(delay=args.stub_delay)
+    else:
+        from .core import make_http_client, make_scheduled_client
+        client = make_scheduled_client(os.environ.get("ANTHROPIC_API_KEY"), http_client=make_http_client())
+    service = TranslationService(client, cache=open_cache(args), client_concurrency=args.client_concurrency,
+                                 normalize=not args.no_normalize)
+    server = make_translation_server(service, args.port, args.host)
+    print(f"Serving translations on http://{args.host}:{server.server_address[1]}/v1/translate"
+          f"{' (stub model)' if args.stub else ''}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cv_translator", description="Translate Spanish soccer drills to English")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--model", default=DEFAULT_MODEL, choices=list(CLAUDE_MODELS))
+    common.add_argument("--mode", default="drill", choices=["drill", "general"])
+    common.add_argument("--prompt-file", help="Use a custom prompt template containing {spanish_text}")
+    common.add_argument("--no-cache", action="store_true", help="Skip the persistent translation cache")
+    common.add_argument("--no-normalize", action="store_true",
+                        help="Send drills as-is instead of converting meters, zone labels and glossary terms first")
+    common.add_argument("--history", help="Append history entries to this JSON Lines file")
+    common.add_argument("--shared-history", action="store_true",
+                        help="Also record translations in the team history shown in the web app")
+    
+    translate = subparsers.add_parser("translate", parents=[common], help="Translate drill files or directories")
+    translate.add_argument("paths", nargs="+")
+    translate.add_argument("-o", "--output-dir", help="Write <name>.en.txt files here instead of stdout")
+    translate.add_argument("-j", "--concurrency", type=int, default=4)
+    translate.add_argument("-q", "--quiet", action="store_true")
+    translate.set_defaults(func=cmd_translate)
+    
+    estimate = subparsers.add_parser("estimate", parents=[common], help="Forecast tokens and cost without calling the API")
+    estimate.add_argument("paths", nargs="+")
+    estimate.add_argument("--calibrate-from", action="append", metavar="HISTORY_JSONL",
+                          help="Fit the forecast to real usage recorded with --history (repeatable)")
+    estimate.set_defaults(func=cmd_estimate)
+    
+    bulk = subparsers.add_parser("bulk", help="Overnight bulk jobs through the Message Batches API")
+    bulk_commands = bulk.add_subparsers(dest="bulk_command", required=True)
+    
+    jobs = argparse.ArgumentParser(add_help=False)
+    jobs.add_argument("--jobs-dir", default=os.environ.get("CV_TRANSLATOR_BULK_DIR", "bulk_jobs"))
+    jobs.add_argument("--fake", action="store_true", default=os.environ.get("CV_TRANSLATOR_FAKE_BATCHES", "") == "1",
+                      help="Use the offline fake batch endpoint")
+    
+    submit = bulk_commands.add_parser("submit", parents=[common, jobs], help="Submit drills as a batch job")
+    submit.add_argument("paths", nargs="+")
+    submit.set_defaults(func=cmd_bulk_submit)
+    
+    collect = bulk_commands.add_parser("collect", parents=[common, jobs], help="Poll jobs and collect finished results")
+    collect.add_argument("job", nargs="?", help="Only collect this job id")
+    collect.set_defaults(func=cmd_bulk_collect)
+    
+    release = bulk_commands.add_parser("release", parents=[jobs],
+                                       help="Let the drills of an interrupted submission be submitted again")
+    release.add_argument("job")
+    release.set_defaults(func=cmd_bulk_release)
+    
+    export = subparsers.add_parser("export", help="Convert --history files to JSONL, CSV, Parquet or Arrow for BI tools")
+    export.add_argument("history_files", nargs="+", metavar="HISTORY_JSONL")
+    export.add_argument("-o", "--output", required=True, help="Output file; the format follows its extension")
+    export.add_argument("--format", choices=["json", "jsonl", "csv", "parquet", "arrow"],
+                        help="Override the format implied by the output extension")
+    export.set_defaults(func=cmd_export)
+    
+    serve = subparsers.add_parser("serve", help="Serve translations over local HTTP/JSON for other tools")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=int(os.environ.get("CV_TRANSLATOR_SERVICE_PORT") or 8710))
+    serve.add_argument("--client-concurrency", type=int,
+                       default=int(os.environ.get("CV_TRANSLATOR_SERVICE_CLIENT_CONCURRENCY", "4")),
+                       help="Requests each client (X-Client-Id header or address) may have in flight")
+    serve.add_argument("--no-cache", action="store_true", help="Skip the persistent translation cache")
+    serve.add_argument("--no-normalize", action="store_true",
+                       help="Translate drills as sent instead of converting meters, zone labels and glossary terms first")
+    serve.add_argument("--stub", action="store_true", default=os.environ.get("CV_TRANSLATOR_STUB_MODEL", "") == "1",
+                       help="Answer with an offline stub model instead of the API (for testing tools)")
+    serve.add_argument("--stub-delay", type=float, default=0.5, help="Seconds each stub reply takes")
+    serve.set_defaults(func=cmd_serve)
+    
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
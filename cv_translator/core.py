@@ -0,0 +1,519 @@
+"""Translation core: prompts, request building, cost math and output cleanup
+
+Importable without Streamlit so the same logic serves the web UI, the CLI and
+background workers. The anthropic SDK is only imported when a client is built.
+"""
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from .cleanup import TranslationOutputCleaner, clean_translation_output
+from .metrics import METRICS
+
+# Available Claude models (updated with new models and pricing)
+CLAUDE_MODELS = {
+    "claude-sonnet-4-5-20250929": "Claude Sonnet 4.5 (Recommended)",
+    "claude-sonnet-4-20250514": "Claude Sonnet 4",
+    "claude-3-5-haiku-20241022": "Claude Haiku 3.5"
+}
+DEFAULT_MODEL = "claude-sonnet-4-5-20250929"
+
+# Model to fall back to when a model keeps failing (rate limited, overloaded, down)
+FALLBACK_MODELS = {
+    "claude-sonnet-4-5-20250929": "claude-3-5-haiku-20241022",
+    "claude-sonnet-4-20250514": "claude-3-5-haiku-20241022"
+}
+
+@lru_cache(maxsize=None)
+def get_default_drill_prompt():
+    """Return the default drill translation prompt"""
+    return """You are a specialized translator for soccer coaching content. Your task is to translate Spanish football drill descriptions into clear, actionable English coaching formats that American coaches can immediately understand and implement.
+
+Here is the Spanish drill description to translate:
+
+<spanish_drill_description>
+{spanish_text}
+</spanish_drill_description>
+
+## Translation Requirements
+
+Key Principles:
+- Prioritize clarity and natural English over literal translation
+- Convert all measurements from meters to yards (practical rounding is acceptable)
+- Use terminology familiar to American coaches while preserving technical accuracy  
+- Write descriptions that flow naturally and avoid clunky, overly formal language
+- Ensure every instruction is concrete and immediately actionable
+- When you see "Z1", "Z2", "Z3", etc., translate these to "Zone 1", "Zone 2", "Zone 3" with a capital Z
+
+Terminology Guidelines:
+- Keep "rondo" as-is (widely understood in coaching)
+- "centro" → "crossing" or "cross"
+- "activación/calentamiento" → indicates warm-up content
+- Convert measurements: multiply meters by 1.09, round to practical coaching measurements
+- "GRADIENTE (+)" → "More advanced:"
+- "GRADIENTE (-)" → "Simplified:"
+- "Z1", "Z2", "Z3", etc. → "Zone 1", "Zone 2", "Zone 3" with capital Z
+
+## Output Format
+
+Provide ONLY the translated content in this exact structure. Do NOT include any analysis, reasoning, or breakdown before the translation. Start directly with the formatted translation:
+
+Topic
+- [Main skill or technique focus]
+
+Principle 
+- [Key coaching instruction or technical teaching point]
+
+Microcycle day
+- [When this drill fits in training cycles]
+
+Time
+- [Duration and number of sets]
+
+Players
+- [Total number of players needed]
+
+Physical focus
+- [Specific conditioning aspect]
+
+Space/equipment
+- [Field dimensions in yards and required equipment]
+
+Description
+- [Clear, step-by-step explanation in natural, flowing English]
+
+Progressions
+- More advanced: [Ways to increase difficulty]
+- Simplified: [Ways to reduce complexity]
+
+Coaching points
+- [Brief title]: [Specific, actionable instruction]
+- [Brief title]: [Specific, actionable instruction]  
+- [Brief title]: [Specific, actionable instruction]"""
+
+@lru_cache(maxsize=None)
+def get_default_general_prompt():
+    """Return the default general translation prompt"""
+    return """You are a professional Spanish to English translator specializing in soccer/football content. Translate the following Spanish text into clear, natural English that American soccer coaches and players will easily understand.
+
+<spanish_text>
+{spanish_text}
+</spanish_text>
+
+Guidelines:
+- Use American soccer terminology where appropriate
+- Convert metric measurements to yards/feet
+- Keep technical soccer terms accurate
+- Ensure the translation sounds natural in English
+- Preserve the original meaning and tone
+- When you see "Z1", "Z2", "Z3", etc., translate these to "Zone 1", "Zone 2", "Zone 3" with a capital Z
+
+Provide only the English translation without any additional commentary."""
+
+def get_text_hash(text: str) -> str:
+    """Generate a hash for caching purposes"""
+    return hashlib.md5(text.encode()).hexdigest()
+
+# Sampling parameters sent with every translation request; they are part of the cache key
+GENERATION_PARAMS = {'max_tokens': 4000, 'temperature': 0.1}
+
+# Bump when the canonical form or key layout changes, so old and new keys never mix
+CACHE_KEY_VERSION = 2
+# Zero-width characters and BOMs that Word and web pages paste into text
+INVISIBLE_CHARACTERS_PATTERN = re.compile(r'[\u200b\u200c\u200d\u2060\ufeff\u00ad]')
+# Unicode spaces (NBSP, thin and em spaces, ...) plus tabs
+HORIZONTAL_SPACE_PATTERN = re.compile(r'[^\S\n]+')
+BLANK_LINES_PATTERN = re.compile(r'\n{3,}')
+
+def canonicalize_text(text: str) -> str:
+    """Reduce text to the form used for cache keys
+    
+    NFC-normalized, LF line endings, invisible characters removed, runs of any
+    kind of space collapsed to one, spaces at either end of a line and runs of
+    blank lines trimmed. None of these change a translation.
+    """
+    text = unicodedata.normalize('NFC', text.replace('\r\n', '\n').replace('\r', '\n'))
+    text = INVISIBLE_CHARACTERS_PATTERN.sub('', text)
+    text = HORIZONTAL_SPACE_PATTERN.sub(' ', text)
+    text = "\n".join(line.strip(' ') for line in text.split('\n'))
+    return BLANK_LINES_PATTERN.sub('\n\n', text).strip()
+
+@lru_cache(maxsize=32)
+def get_prompt_fingerprint(prompt_template: str) -> str:
+    """Stable fingerprint of a prompt template that ignores whitespace-only reformatting"""
+    return hashlib.blake2b(canonicalize_text(prompt_template).encode(), digest_size=16).hexdigest()
+
+def get_cache_key(text: str, prompt_template: str, model: str, kind: str = "translation",
+                  params: Optional[dict] = None) -> str:
+    """Versioned cache key over the canonical text, prompt fingerprint, model and generation parameters
+    
+    Fields are JSON-encoded as a list, so no two distinct field combinations can
+    produce the same key material. The result is also a valid batch custom_id.
+    """
+    key_material = json.dumps(
+        [CACHE_KEY_VERSION, kind, canonicalize_text(text), get_prompt_fingerprint(prompt_template), model,
+         sorted((params or GENERATION_PARAMS).items())],
+        ensure_ascii=False
+    )
+    return f"v{CACHE_KEY_VERSION}_" + hashlib.blake2b(key_material.encode(), digest_size=20).hexdigest()
+
+def get_legacy_cache_key(text: str, prompt_template: str, model: str) -> str:
+    """The version 1 key (MD5 over the plain concatenation), checked on a miss so older entries are migrated"""
+    return get_text_hash(text + prompt_template + model)
+
+def estimate_tokens(text: str, model: str = "claude-sonnet-4-5-20250929") -> int:
+    """Rough estimation of tokens based on model"""
+    if not text:
+        return 0
+    
+    base_estimate = len(text) // 4
+    
+    model_multipliers = {
+        "claude-sonnet-4-5-20250929": 1.0,
+        "claude-sonnet-4-20250514": 1.0,
+        "claude-3-5-haiku-20241022": 0.95
+    }
+    
+    multiplier = model_multipliers.get(model, 1.0)
+    return int(base_estimate * multiplier)
+
+def get_model_cost_per_token(model: str) -> dict:
+    """Get cost per token for input/output (USD per 1M tokens)"""
+    costs = {
+        "claude-sonnet-4-5-20250929": {"input": 3.0, "output": 15.0},
+        "claude-sonnet-4-20250514": {"input": 3.0, "output": 15.0},
+        "claude-3-5-haiku-20241022": {"input": 0.8, "output": 4.0}
+    }
+    return costs.get(model, {"input": 3.0, "output": 15.0})
+
+# Prompt caching price multipliers relative to the base input price
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+
+# Message Batches API requests are billed at half the interactive price
+BATCH_PRICE_MULTIPLIER = 0.5
+
+def calculate_estimated_cost(input_tokens: int, output_tokens: int, model: str,
+                             cache_write_tokens: int = 0, cache_read_tokens: int = 0,
+                             batch: bool = False) -> float:
+    """Calculate estimated cost for a translation, including prompt cache writes and reads"""
+    costs = get_model_cost_per_token(model)
+    input_cost = (input_tokens / 1_000_000) * costs["input"]
+    output_cost = (output_tokens / 1_000_000) * costs["output"]
+    cache_cost = (
+        (cache_write_tokens / 1_000_000) * costs["input"] * CACHE_WRITE_MULTIPLIER
+        + (cache_read_tokens / 1_000_000) * costs["input"] * CACHE_READ_MULTIPLIER
+    )
+    total = input_cost + output_cost + cache_cost
+    return total * BATCH_PRICE_MULTIPLIER if batch else total
+
+def safe_get(item: dict, key: str, default=0):
+    """Safely get a value from a dictionary"""
+    try:
+        return item.get(key, default)
+    except (AttributeError, TypeError):
+        return default
+
+def make_client(api_key: Optional[str] = None, **kwargs):
+    """Build an Anthropic client (imports the SDK lazily to keep CLI startup fast)"""
+    import anthropic
+    return anthropic.Anthropic(api_key=api_key, **kwargs)
+
+# Connection pool of a long-lived client: idle connections (and their TLS sessions) are kept for
+# HTTP_KEEPALIVE_SECONDS, so a curator's next translation skips the TCP and TLS handshakes
+HTTP_MAX_CONNECTIONS = 20
+HTTP_KEEPALIVE_SECONDS = 120.0
+
+def make_http_client():
+    """Build a pooled keep-alive HTTP client for an SDK client that lives as long as the process"""
+    import anthropic
+    import httpx
+    return anthropic.DefaultHttpxClient(limits=httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_SECONDS
+    ))
+
+def make_scheduled_client(api_key: Optional[str] = None, scheduler=None, **kwargs):
+    """Build a client whose messages calls go through a RequestScheduler
+    
+    The SDK's own retries are switched off so the scheduler alone decides when
+    and how often to retry.
+    """
+    from .scheduler import RequestScheduler, ScheduledClient
+    return ScheduledClient(make_client(api_key, max_retries=0, **kwargs), scheduler or RequestScheduler())
+
+# Stand-in for the drill text while the template is rendered into the cacheable system block
+PROMPT_TEXT_SENTINEL = "\x00SPANISH_TEXT\x00"
+PROMPT_TEXT_TAG_PATTERN = re.compile(r'<([\w-]+)>\s*' + re.escape(PROMPT_TEXT_SENTINEL) + r'\s*</\1>')
+
+def build_translation_request(prompt_template: str, text: str) -> dict:
+    """Split a prompt template into a cacheable system block and a small user message
+    
+    Everything in the template except the text to translate is static, so it goes in
+    a system block marked for prompt caching. The text (still wrapped in its XML tag
+    when the template has one) is the only part that changes between calls.
+    Note that the API only caches blocks above a minimum size (1024 tokens for
+    Sonnet, 2048 for Haiku); shorter prompts are sent uncached at normal price.
+    """
+    rendered = prompt_template.format(spanish_text=PROMPT_TEXT_SENTINEL)
+    match = PROMPT_TEXT_TAG_PATTERN.search(rendered)
+    
+    if match:
+        tag = match.group(1)
+        instructions = (
+            rendered[:match.start()]
+            + f"<{tag}>\n(provided in the user message)\n</{tag}>"
+            + rendered[match.end():]
+        )
+        user_content = f"<{tag}>\n{text}\n</{tag}>"
+    else:
+        instructions = rendered.replace(PROMPT_TEXT_SENTINEL, "(provided in the user message)")
+        user_content = text
+    
+    return {
+        'system': [{"type": "text", "text": instructions, "cache_control": {"type": "ephemeral"}}],
+        'messages': [{"role": "user", "content": user_content}]
+    }
+
+def get_usage_tokens(usage) -> dict:
+    """Extract token counts, including prompt cache writes and reads, from a message usage block"""
+    return {
+        'input_tokens': usage.input_tokens,
+        'output_tokens': usage.output_tokens,
+        'cache_write_tokens': getattr(usage, 'cache_creation_input_tokens', None) or 0,
+        'cache_read_tokens': getattr(usage, 'cache_read_input_tokens', None) or 0
+    }
+
+def record_call_metrics(result: dict, mode: str, latency: float, ttft: Optional[float] = None):
+    """Record latency, time to first token and generation throughput of one finished call
+    
+    Throughput is measured after the first token when it is known, so it reflects the
+    model's generation speed rather than network and queueing delay.
+    """
+    labels = {'model': result['model'], 'mode': mode}
+    METRICS.observe("translation_latency_seconds", latency, **labels)
+    generation_time = latency - (ttft or 0.0)
+    if ttft is not None:
+        METRICS.observe("translation_ttft_seconds", ttft, **labels)
+    if result['output_tokens'] and generation_time > 0:
+        METRICS.observe("translation_output_tokens_per_second", result['output_tokens'] / generation_time, **labels)
+
+def request_translation(client, text: str, prompt_template: str, model: str) -> dict:
+    """Call the API for a single translation without touching session state (safe in worker threads)"""
+    started = time.perf_counter()
+    message = client.messages.create(
+        model=model,
+        **GENERATION_PARAMS,
+        **build_translation_request(prompt_template, text)
+    )
+    
+    result = {
+        # Clean up the translation output
+        'translation': clean_translation_output(message.content[0].text),
+        **get_usage_tokens(message.usage),
+        # May differ from the requested model when the scheduler fell back
+        'model': getattr(message, 'model', None) or model
+    }
+    record_call_metrics(result, 'request', time.perf_counter() - started)
+    return result
+
+def stream_translation(client, text: str, prompt_template: str, model: str, on_progress: Callable[[str], None]) -> dict:
+    """Stream a translation, reporting the cleaned partial output as tokens arrive"""
+    cleaner = TranslationOutputCleaner()
+    last_render = 0.0
+    started = time.perf_counter()
+    ttft = None
+    
+    with client.messages.stream(
+        model=model,
+        **GENERATION_PARAMS,
+        **build_translation_request(prompt_template, text)
+    ) as stream:
+        for delta in stream.text_stream:
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            cleaner.feed(delta)
+            # Throttle re-renders; cleanup is incremental but the UI update is not
+            if time.monotonic() - last_render > 0.1:
+                on_progress(cleaner.text)
+                last_render = time.monotonic()
+        message = stream.get_final_message()
+    
+    translation = cleaner.finish()
+    on_progress(translation)
+    
+    result = {
+        'translation': translation,
+        **get_usage_tokens(message.usage),
+        # May differ from the requested model when the scheduler fell back
+        'model': getattr(message, 'model', None) or model
+    }
+    record_call_metrics(result, 'stream', time.perf_counter() - started, ttft)
+    return result
+
+def make_cache_entry(model: str, result: dict) -> dict:
+    """Build the cache entry stored for a finished translation"""
+    return {
+        'translation': result['translation'],
+        'input_tokens': result['input_tokens'],
+        'output_tokens': result['output_tokens'],
+        'cache_write_tokens': result.get('cache_write_tokens', 0),
+        'cache_read_tokens': result.get('cache_read_tokens', 0),
+        'model': model,
+        'timestamp': datetime.now().isoformat()
+    }
+
+def get_translation_type(prompt_template: str) -> str:
+    """Classify a prompt template as 'drill' or 'general'"""
+    # The stock drill prompt first says "drill" around character 110
+    return 'drill' if 'drill' in prompt_template[:200].lower() else 'general'
+
+def make_history_entry(text: str, prompt_template: str, model: str, result: dict,
+                       original_text: Optional[str] = None) -> dict:
+    """Build the history entry stored for a finished translation
+    
+    original_text is the input as the user typed it, when text is its normalized
+    form; history keeps what the user typed.
+    """
+    return {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'type': get_translation_type(prompt_template),
+        'spanish_input': original_text or text,
+        'english_output': result['translation'],
+        'input_tokens': result['input_tokens'],
+        'output_tokens': result['output_tokens'],
+        'cache_write_tokens': result.get('cache_write_tokens', 0),
+        'cache_read_tokens': result.get('cache_read_tokens', 0),
+        'model': result.get('model', model),
+        'batch': result.get('batch', False)
+    }
+
+def record_translation(cache, history: Optional[list], cache_key: str, text: str,
+                       prompt_template: str, model: str, result: dict, original_text: Optional[str] = None):
+    """Store a finished translation in the cache and history (either may be None)
+    
+    Fallback-model results are kept in history but not cached, so the preferred
+    model is tried again next time.
+    """
+    if cache is not None and result.get('model', model) == model:
+        cache.put(cache_key, make_cache_entry(model, result))
+    if history is not None:
+        history.append(make_history_entry(text, prompt_template, model, result, original_text))
+
+def lookup_translation(cache, cache_key: str, legacy_key: Optional[str] = None) -> Optional[str]:
+    """Return a cached translation or None
+    
+    On a miss, an entry stored under legacy_key is copied to cache_key, so entries
+    cached before the key scheme changed are migrated the first time they are used.
+    """
+    if cache is None:
+        return None
+    cached = cache.get(cache_key)
+    if cached is None and legacy_key is not None:
+        cached = cache.get(legacy_key)
+        if cached:
+            cache.put(cache_key, cached)
+    METRICS.increment("cache_lookups_total", result="hit" if cached else "miss")
+    return cached['translation'] if cached else None
+
+def translate_text(client, text: str, prompt_template: str, model: str, cache=None,
+                   history: Optional[list] = None, on_progress: Optional[Callable[[str], None]] = None,
+                   original_text: Optional[str] = None, stats: Optional[dict] = None):
+    """Generic translation function
+    
+    cache is any object with get(key) -> dict/None and put(key, entry); history is a
+    list that finished translations are appended to. When on_progress is given the
+    response is streamed and on_progress receives the cleaned partial translation.
+    When text was normalized, original_text (the input as typed) is what history records.
+    stats, if given, receives the model that served the translation and whether it was cached.
+    """
+    if stats is None:
+        stats = {}
+    stats.update(model=model, cached=False)
+    if not text.strip():
+        return None, "Please enter text to translate"
+    
+    cache_key = get_cache_key(text, prompt_template, model)
+    
+    # Check cache
+    cached = lookup_translation(cache, cache_key, get_legacy_cache_key(text, prompt_template, model))
+    if cached is not None:
+        METRICS.increment("translations_total", outcome="cached")
+        stats.update(cached=True)
+        return cached, None
+    
+    return translate_uncached(client, text, prompt_template, model, cache_key, cache=cache, history=history,
+                              on_progress=on_progress, original_text=original_text, stats=stats)
+
+def translate_uncached(client, text: str, prompt_template: str, model: str, cache_key: str, cache=None,
+                       history: Optional[list] = None, on_progress: Optional[Callable[[str], None]] = None,
+                       original_text: Optional[str] = None, stats: Optional[dict] = None):
+    """The rest of translate_text once cache_key is known to miss: call the API and record the result"""
+    if stats is None:
+        stats = {}
+    stats.update(model=model, cached=False)
+    try:
+        if on_progress:
+            result = stream_translation(client, text, prompt_template, model, on_progress)
+        else:
+            result = request_translation(client, text, prompt_template, model)
+        record_translation(cache, history, cache_key, text, prompt_template, model, result, original_text)
+        METRICS.increment("translations_total", outcome="translated")
+        stats.update(model=result.get('model', model))
+        return result['translation'], None
+        
+    except Exception as e:
+        METRICS.increment("translations_total", outcome="error")
+        return None, str(e)
+
+# Lines made only of ---, === or ### separate drills in pasted or uploaded batches
+BATCH_SEPARATOR_PATTERN = re.compile(r'^[ \t]*(?:-{3,}|={3,}|#{3,})[ \t]*$', re.MULTILINE)
+
+def split_batch_input(raw_text: str) -> List[str]:
+    """Split a block of pasted drills into individual drills"""
+    return [drill.strip() for drill in BATCH_SEPARATOR_PATTERN.split(raw_text) if drill.strip()]
+
+def translate_batch(client, drills: List[str], prompt_template: str, model: str, cache=None,
+                    history: Optional[list] = None, max_workers: int = 4, originals: Optional[List[str]] = None):
+    """Translate many drills concurrently, yielding (index, translation, error) as each one finishes
+    
+    API calls run in a bounded thread pool; cache lookups and history writes stay on the
+    calling thread, so a Streamlit session state can be passed in safely. originals, if
+    given, are the drills as typed (before normalization), recorded in history.
+    """
+    # Imported here: concurrent.futures pulls in logging and roughly doubles CLI startup
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    
+    pending = []
+    for index, drill in enumerate(drills):
+        cache_key = get_cache_key(drill, prompt_template, model)
+        cached = lookup_translation(cache, cache_key, get_legacy_cache_key(drill, prompt_template, model))
+        if cached is not None:
+            yield index, cached, None
+        else:
+            pending.append((index, drill, cache_key))
+    
+    if not pending:
+        return
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as executor:
+        futures = {
+            executor.submit(request_translation, client, drill, prompt_template, model): (index, drill, cache_key)
+            for index, drill, cache_key in pending
+        }
+        for future in as_completed(futures):
+            index, drill, cache_key = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                yield index, None, str(e)
+                continue
+            record_translation(cache, history, cache_key, drill, prompt_template, model, result,
+                               originals[index] if originals else None)
+            yield index, result['translation'], None
@@ -0,0 +1,291 @@
+"""Chunked, concurrent translation of long general documents
+
+A multi-page article sent as one request is slow (one long generation) and is
+cut off at max_tokens. Here the document is split on paragraph, then sentence,
+boundaries into chunks that comfortably fit the output limit, the chunks are
+translated concurrently with anthropic.AsyncAnthropic, and the translations are
+stitched back together in document order.
+
+Chunks are translated in parallel, so they cannot see each other's output.
+Continuity comes from the source side instead. Each request carries the tail
+of the preceding chunk as read-only context, plus a glossary of the terms that
+appear anywhere in the document, so every chunk renders them the same way.
+
+Every chunk shares the prompt's cached system block, and each chunk is cached
+on its own. Re-translating an edited document only sends the chunks that changed.
+
+translate_document() runs on one long-lived event loop per process (see
+DocumentLoop), so the AsyncAnthropic client and its connection pool are built
+once and reused by every document, like the cached synchronous client.
+"""
+import asyncio
+import concurrent.futures
+import queue
+import re
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from .core import (
+    GENERATION_PARAMS,
+    build_translation_request,
+    clean_translation_output,
+    get_cache_key,
+    get_legacy_cache_key,
+    get_usage_tokens,
+    lookup_translation,
+    make_cache_entry,
+    make_history_entry,
+)
+from .search import fold_text
+
+# About 1,500 input tokens: the English comes out well under GENERATION_PARAMS['max_tokens']
+CHUNK_CHARS = 6000
+# Source text from the end of the previous chunk given as context (not translated)
+OVERLAP_CHARS = 400
+DOCUMENT_CONCURRENCY = 4
+
+PARAGRAPH_BREAK_PATTERN = re.compile(r'\n[ \t]*\n')
+SENTENCE_BREAK_PATTERN = re.compile(r'(?<=[.!?…:;])\s+(?=[¿¡"«(\[\w])')
+
+# Spanish coaching terms whose English rendering should not drift between chunks
+DOCUMENT_GLOSSARY = {
+    "presión tras pérdida": "counter-pressing",
+    "transición defensiva": "defensive transition",
+    "transición ofensiva": "attacking transition",
+    "bloque bajo": "low block",
+    "bloque medio": "mid block",
+    "bloque alto": "high block",
+    "salida de balón": "build-up play",
+    "juego de posición": "positional play",
+    "tercer hombre": "third man",
+    "línea de pase": "passing lane",
+    "balón parado": "set piece",
+    "extremo": "winger",
+    "lateral": "full-back",
+    "carrilero": "wing-back",
+    "mediocentro": "defensive midfielder",
+    "mediapunta": "attacking midfielder",
+    "portero": "goalkeeper",
+    "comodín": "neutral player",
+}
+_FOLDED_GLOSSARY = [(fold_text(spanish), spanish, english) for spanish, english in DOCUMENT_GLOSSARY.items()]
+
+def _split_oversized(text: str, max_chars: int, pattern: re.Pattern) -> List[str]:
+    """Split text at pattern matches into pieces of at most max_chars where possible"""
+    pieces = [piece for piece in pattern.split(text) if piece.strip()]
+    separator = "\n\n" if pattern is PARAGRAPH_BREAK_PATTERN else " "
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        if len(piece) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            if pattern is PARAGRAPH_BREAK_PATTERN:
+                chunks.extend(_split_oversized(piece, max_chars, SENTENCE_BREAK_PATTERN))
+            else:
+                # A single "sentence" longer than a chunk: fall back to word boundaries
+                words = piece.split(" ")
+                for word in words:
+                    if current and len(current) + 1 + len(word) > max_chars:
+                        chunks.append(current)
+                        current = ""
+                    current = f"{current} {word}" if current else word
+            continue
+        if current and len(current) + len(separator) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}{separator}{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+def split_document(text: str, max_chars: int = CHUNK_CHARS) -> List[str]:
+    """Split a document into chunks of whole paragraphs (or sentences, for very long paragraphs)"""
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+    return _split_oversized(text, max_chars, PARAGRAPH_BREAK_PATTERN)
+
+def get_document_glossary(text: str) -> Dict[str, str]:
+    """The glossary entries whose Spanish term appears in the document"""
+    folded = fold_text(text)
+    return {spanish: english for folded_term, spanish, english in _FOLDED_GLOSSARY if folded_term in folded}
+
+def get_overlap(previous_chunk: str, overlap_chars: int = OVERLAP_CHARS) -> str:
+    """The tail of the previous chunk, starting at a sentence boundary when there is one"""
+    if len(previous_chunk) <= overlap_chars:
+        return previous_chunk
+    tail = previous_chunk[-overlap_chars:]
+    boundary = SENTENCE_BREAK_PATTERN.search(tail)
+    return tail[boundary.end():] if boundary else tail
+
+def build_chunk_request(prompt_template: str, chunk: str, position: int, total: int,
+                        overlap: str, glossary: Dict[str, str]) -> dict:
+    """The regular cached system block, with continuity context ahead of the chunk in the user turn"""
+    request = build_translation_request(prompt_template, chunk)
+    context = [f"This is part {position + 1} of {total} of a longer document. Translate only the text to "
+               "translate, completely; the other parts are translated separately."]
+    if overlap:
+        context.append(f"<previous_context>\n{overlap}\n</previous_context>\n"
+                       "The previous context is the end of the preceding part. It is for continuity only: "
+                       "do not translate or repeat it.")
+    if glossary:
+        terms = "\n".join(f"- {spanish}: {english}" for spanish, english in glossary.items())
+        context.append(f"<glossary>\n{terms}\n</glossary>\nUse these renderings consistently.")
+    request['messages'][0]['content'] = "\n\n".join(context) + "\n\n" + request['messages'][0]['content']
+    return request
+
+def make_async_client(api_key: Optional[str] = None, **kwargs):
+    """Build an AsyncAnthropic client (SDK imported lazily; retries are left to the scheduler)"""
+    import anthropic
+    return anthropic.AsyncAnthropic(api_key=api_key, max_retries=0, **kwargs)
+
+class DocumentLoop:
+    """An event loop running in a daemon thread, with one AsyncAnthropic client per API key
+
+    An AsyncAnthropic client is bound to the event loop it was first used on, so
+    reusing one across calls means running every call on the same loop.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._clients: Dict[Optional[str], object] = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self.loop.run_forever, name="document-loop", daemon=True).start()
+
+    def client(self, api_key: Optional[str] = None):
+        """The shared async client for api_key, built on first use"""
+        with self._lock:
+            if api_key not in self._clients:
+                self._clients[api_key] = make_async_client(api_key)
+            return self._clients[api_key]
+
+    def submit(self, coroutine: Awaitable) -> concurrent.futures.Future:
+        """Schedule a coroutine on the loop from any thread"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+_document_loop: Optional[DocumentLoop] = None
+_document_loop_lock = threading.Lock()
+
+def get_document_loop() -> DocumentLoop:
+    """The process-wide DocumentLoop, started on first use"""
+    global _document_loop
+    with _document_loop_lock:
+        if _document_loop is None:
+            _document_loop = DocumentLoop()
+        return _document_loop
+
+async def translate_document_async(client, text: str, prompt_template: str, model: str, cache=None,
+                                   history: Optional[list] = None, scheduler=None,
+                                   max_concurrency: int = DOCUMENT_CONCURRENCY,
+                                   on_chunk: Optional[Callable[[int, int], None]] = None,
+                                   original_text: Optional[str] = None):
+    """Translate a document chunk by chunk with up to max_concurrency requests in flight
+
+    client is an AsyncAnthropic client. With a scheduler, its rate limits, retries
+    and fallbacks apply to every chunk request. on_chunk(done, total) is called as
+    chunks finish. Returns (translation, error); the translation is only returned
+    when every chunk succeeded, so a partial document is never mistaken for a whole one.
+    original_text is recorded in history in place of a normalized text.
+    """
+    chunks = split_document(text)
+    if not chunks:
+        return None, "Please enter text to translate"
+
+    document_key = get_cache_key(text, prompt_template, model, kind="document")
+    cached = lookup_translation(cache, document_key, get_legacy_cache_key(text, prompt_template, model))
+    if cached is not None:
+        return cached, None
+
+    glossary = get_document_glossary(text)
+    translations: List[Optional[str]] = [None] * len(chunks)
+    usage = {'input_tokens': 0, 'output_tokens': 0, 'cache_write_tokens': 0, 'cache_read_tokens': 0}
+    fallback_models = set()
+    done = 0
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def translate_chunk(position: int):
+        nonlocal done
+        chunk = chunks[position]
+        chunk_key = get_cache_key(chunk, prompt_template, model, kind="document-chunk")
+        cached_chunk = lookup_translation(cache, chunk_key)
+        if cached_chunk is None:
+            request = build_chunk_request(prompt_template, chunk, position, len(chunks),
+                                          get_overlap(chunks[position - 1]) if position else "", glossary)
+
+            async def send(candidate: str):
+                return await client.messages.create(model=candidate, **GENERATION_PARAMS, **request)
+
+            async with semaphore:
+                if scheduler is not None:
+                    from .scheduler import estimate_request_tokens
+                    message = await scheduler.call_async(send, model, estimate_request_tokens(request))
+                else:
+                    message = await send(model)
+            if getattr(message, 'stop_reason', None) == 'max_tokens':
+                raise RuntimeError(f"Part {position + 1} of {len(chunks)} was cut off at the output limit")
+            result = {'translation': clean_translation_output(message.content[0].text),
+                      **get_usage_tokens(message.usage)}
+            for key, value in result.items():
+                if key in usage:
+                    usage[key] += value
+            served_by = getattr(message, 'model', None) or model
+            # Like record_translation: fallback-model output is used but not cached
+            if served_by != model:
+                fallback_models.add(served_by)
+            elif cache is not None:
+                cache.put(chunk_key, make_cache_entry(model, result))
+            cached_chunk = result['translation']
+        translations[position] = cached_chunk
+        done += 1
+        if on_chunk:
+            on_chunk(done, len(chunks))
+
+    outcomes = await asyncio.gather(*(translate_chunk(i) for i in range(len(chunks))), return_exceptions=True)
+    errors = [str(outcome) for outcome in outcomes if isinstance(outcome, BaseException)]
+    if errors:
+        return None, errors[0]
+
+    translation = "\n\n".join(translations)
+    result = {'translation': translation, **usage, 'model': min(fallback_models) if fallback_models else model}
+    if cache is not None and not fallback_models:
+        cache.put(document_key, make_cache_entry(model, result))
+    if history is not None:
+        entry = make_history_entry(text, prompt_template, model, result, original_text)
+        entry.update(chunks=len(chunks))
+        history.append(entry)
+    return translation, None
+
+def translate_document(text: str, prompt_template: str, model: str, api_key: Optional[str] = None,
+                       client=None, cache=None, history: Optional[list] = None, scheduler=None,
+                       max_concurrency: int = DOCUMENT_CONCURRENCY,
+                       on_chunk: Optional[Callable[[int, int], None]] = None,
+                       original_text: Optional[str] = None):
+    """Blocking wrapper around translate_document_async for scripts and Streamlit
+
+    Runs on the process-wide DocumentLoop with its shared client for api_key; a
+    client passed in must belong to that loop. on_chunk is called in the calling
+    thread, so it may update Streamlit elements. Returns (translation, error).
+    """
+    document_loop = get_document_loop()
+    progress: queue.SimpleQueue = queue.SimpleQueue()
+    future = document_loop.submit(translate_document_async(
+        client or document_loop.client(api_key), text, prompt_template, model, cache=cache,
+        history=history, scheduler=scheduler, max_concurrency=max_concurrency,
+        on_chunk=lambda done, total: progress.put((done, total)), original_text=original_text
+    ))
+    try:
+        while not future.done() or not progress.empty():
+            try:
+                done, total = progress.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if on_chunk:
+                on_chunk(done, total)
+        return future.result()
+    except Exception as e:
+        return None, str(e)
+    finally:
+        # on_chunk may raise (a cancelled job); stop the chunks still in flight
+        future.cancel()
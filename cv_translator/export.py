@@ -0,0 +1,188 @@
+"""Streaming exporters for translation history
+
+Entries are written row by row (or in fixed-size record batches for the
+columnar formats) so an export never holds more than one chunk of serialized
+output in memory, however long the history is. Formats:
+
+    json     one JSON array, for the web UI's original download
+    jsonl    one entry per line
+    csv      token usage plus the Spanish input and English output
+    parquet  columnar, for BI tools (needs pyarrow)
+    arrow    Arrow IPC file, readable with pyarrow/pandas/polars (needs pyarrow)
+"""
+import csv
+import io
+import json
+import os
+from typing import IO, Iterable, Iterator, List, Mapping, Optional, Union
+
+from .core import safe_get
+
+EXPORT_FIELDS = ['timestamp', 'type', 'model', 'input_tokens', 'output_tokens',
+                 'cache_write_tokens', 'cache_read_tokens', 'batch', 'spanish_input', 'english_output']
+
+TEXT_EXPORT_FORMATS = {
+    'json': 'application/json',
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+COLUMNAR_EXPORT_FORMATS = {
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file',
+}
+EXPORT_FORMATS = {**TEXT_EXPORT_FORMATS, **COLUMNAR_EXPORT_FORMATS}
+
+# Rows per CSV write / columnar record batch
+EXPORT_CHUNK_ROWS = 1000
+
+def pyarrow_available() -> bool:
+    """Whether the optional pyarrow dependency for Parquet/Arrow export is installed"""
+    from importlib.util import find_spec
+    return find_spec("pyarrow") is not None
+
+def get_export_format(path: str, export_format: Optional[str] = None) -> str:
+    """Explicit format, or the one implied by the file extension"""
+    export_format = (export_format or os.path.splitext(path)[1].lstrip('.') or 'jsonl').lower()
+    if export_format == 'ndjson':
+        export_format = 'jsonl'
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{export_format}' (choose from {', '.join(EXPORT_FORMATS)})")
+    return export_format
+
+def export_row(entry: dict) -> dict:
+    """One history entry restricted to the exported fields, with defaults for older entries"""
+    return {
+        'timestamp': str(safe_get(entry, 'timestamp', '')),
+        'type': safe_get(entry, 'type', 'drill'),
+        'model': safe_get(entry, 'model', ''),
+        'input_tokens': safe_get(entry, 'input_tokens', 0),
+        'output_tokens': safe_get(entry, 'output_tokens', 0),
+        'cache_write_tokens': safe_get(entry, 'cache_write_tokens', 0),
+        'cache_read_tokens': safe_get(entry, 'cache_read_tokens', 0),
+        'batch': bool(safe_get(entry, 'batch', False)),
+        'spanish_input': safe_get(entry, 'spanish_input', ''),
+        'english_output': safe_get(entry, 'english_output', ''),
+    }
+
+def dump_entry(entry: Mapping) -> str:
+    """One full entry as JSON; history records and other mappings are written like the dicts they read as"""
+    return json.dumps(entry if isinstance(entry, dict) else dict(entry), ensure_ascii=False)
+
+def iter_json(entries: Iterable[Mapping]) -> Iterator[str]:
+    """A JSON array of full entries, one entry per chunk"""
+    yield "["
+    separator = "\n"
+    for entry in entries:
+        yield separator + dump_entry(entry)
+        separator = ",\n"
+    yield "\n]\n"
+
+def iter_jsonl(entries: Iterable[Mapping]) -> Iterator[str]:
+    for entry in entries:
+        yield dump_entry(entry) + "\n"
+
+def iter_csv(entries: Iterable[dict], chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[str]:
+    """CSV in chunks of chunk_rows rows, header first"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    rows = 0
+    for entry in entries:
+        writer.writerow(export_row(entry))
+        rows += 1
+        if rows % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def iter_text_export(entries: Iterable[dict], export_format: str) -> Iterator[str]:
+    if export_format == 'json':
+        return iter_json(entries)
+    if export_format == 'jsonl':
+        return iter_jsonl(entries)
+    return iter_csv(entries)
+
+def get_arrow_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('timestamp', pa.string()),
+        ('type', pa.string()),
+        ('model', pa.string()),
+        ('input_tokens', pa.int64()),
+        ('output_tokens', pa.int64()),
+        ('cache_write_tokens', pa.int64()),
+        ('cache_read_tokens', pa.int64()),
+        ('batch', pa.bool_()),
+        ('spanish_input', pa.large_string()),
+        ('english_output', pa.large_string()),
+    ])
+
+def iter_record_batches(entries: Iterable[dict], chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """Arrow record batches of up to chunk_rows entries each"""
+    import pyarrow as pa
+    schema = get_arrow_schema()
+    columns: dict = {name: [] for name in schema.names}
+    for entry in entries:
+        for name, value in export_row(entry).items():
+            columns[name].append(value)
+        if len(columns['timestamp']) >= chunk_rows:
+            yield pa.RecordBatch.from_pydict(columns, schema=schema)
+            columns = {name: [] for name in schema.names}
+    if columns['timestamp']:
+        yield pa.RecordBatch.from_pydict(columns, schema=schema)
+
+def write_columnar_export(entries: Iterable[dict], target: Union[str, IO[bytes]], export_format: str) -> int:
+    """Write a Parquet or Arrow IPC file one record batch at a time; returns the row count"""
+    try:
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError(f"{export_format} export needs pyarrow: pip install pyarrow") from None
+
+    schema = get_arrow_schema()
+    if export_format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(target, schema, compression='zstd')
+    else:
+        writer = pyarrow.ipc.new_file(target, schema)
+    rows = 0
+    try:
+        for batch in iter_record_batches(entries):
+            if export_format == 'parquet':
+                writer.write_batch(batch)
+            else:
+                writer.write(batch)
+            rows += batch.num_rows
+    finally:
+        writer.close()
+    return rows
+
+def write_export(entries: Iterable[dict], path: str, export_format: Optional[str] = None) -> int:
+    """Stream entries to path in the given format (or the one implied by its extension); returns the row count"""
+    export_format = get_export_format(path, export_format)
+    if export_format in COLUMNAR_EXPORT_FORMATS:
+        return write_columnar_export(entries, path, export_format)
+
+    rows = 0
+    def counted(entries):
+        nonlocal rows
+        for entry in entries:
+            rows += 1
+            yield entry
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for chunk in iter_text_export(counted(entries), export_format):
+            f.write(chunk)
+    return rows
+
+def iter_history_file(path: str) -> Iterator[dict]:
+    """Read a JSON Lines history file (as written by --history) one entry at a time"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def read_history_files(paths: List[str]) -> Iterator[dict]:
+    for path in paths:
+        yield from iter_history_file(path)
@@ -0,0 +1,340 @@
+"""Translation history: running aggregates and the shared team history store
+
+The History tab shows totals over every translation in the session. Keeping
+them as running sums means a rerun only folds in entries appended since the
+last one, so rendering the tab costs the same with 10 entries or 10,000.
+
+SharedHistoryStore keeps every curator's translations in one SQLite database
+(WAL mode) so the team sees each other's work and it survives a refresh.
+Writes go through a queue to a background thread, so recording a translation
+never waits on disk; reads use one connection per thread and run alongside it.
+"""
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from .core import DEFAULT_MODEL, calculate_estimated_cost, safe_get
+from .memory import HistoryRecord, TextStore
+from .metrics import METRICS
+
+HISTORY_DB_PATH = os.environ.get("CV_TRANSLATOR_HISTORY_DB", "translation_history.db")
+
+HISTORY_PAGE_SIZES = [10, 25, 50, 100]
+
+def get_entry_tokens(entry: dict) -> int:
+    """All tokens billed for one history entry, including prompt cache writes and reads"""
+    return (
+        safe_get(entry, 'input_tokens', 0) + safe_get(entry, 'output_tokens', 0)
+        + safe_get(entry, 'cache_write_tokens', 0) + safe_get(entry, 'cache_read_tokens', 0)
+    )
+
+def get_source_key(entry: dict) -> str:
+    """Identify the source text of an entry, so repeat translations of one drill can be found"""
+    stored = safe_get(entry, 'source_key', None)
+    if stored:
+        return stored
+    text = safe_get(entry, 'type', 'drill') + "\n" + " ".join(safe_get(entry, 'spanish_input', '').split())
+    return hashlib.md5(text.encode()).hexdigest()
+
+def get_entry_cost(entry: dict) -> float:
+    """Estimated cost of one history entry at the rates of the model that served it"""
+    return calculate_estimated_cost(
+        safe_get(entry, 'input_tokens', 0),
+        safe_get(entry, 'output_tokens', 0),
+        safe_get(entry, 'model', DEFAULT_MODEL),
+        safe_get(entry, 'cache_write_tokens', 0),
+        safe_get(entry, 'cache_read_tokens', 0),
+        safe_get(entry, 'batch', False)
+    )
+
+class HistoryStats:
+    """Running totals over a translation history list
+
+    Like the search index, history is treated as append-only: sync() folds in
+    entries added since the last call and starts over if the list shrank.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_tokens = 0
+        self.total_cache_read = 0
+        self.total_cost = 0.0
+        self.by_type: Dict[str, int] = {}
+        self.duplicates = 0
+        self.duplicate_cost = 0.0
+        # Position of the newest entry for each source text, and the set of those positions
+        self.latest_by_source: Dict[str, int] = {}
+        self.latest_positions: Set[int] = set()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def clear(self):
+        self.__init__()
+
+    def add(self, entry: dict):
+        """Fold one appended entry into the totals"""
+        self.count += 1
+        self.total_tokens += get_entry_tokens(entry)
+        self.total_cache_read += safe_get(entry, 'cache_read_tokens', 0)
+        cost = get_entry_cost(entry)
+        self.total_cost += cost
+        source_key = get_source_key(entry)
+        if source_key in self.latest_by_source:
+            self.duplicates += 1
+            self.duplicate_cost += cost
+            self.latest_positions.discard(self.latest_by_source[source_key])
+        self.latest_by_source[source_key] = self.count - 1
+        self.latest_positions.add(self.count - 1)
+        entry_type = safe_get(entry, 'type', 'drill')
+        self.by_type[entry_type] = self.by_type.get(entry_type, 0) + 1
+
+    def sync(self, history: List[dict]):
+        """Add entries appended since the last sync"""
+        if len(history) < self.count:
+            self.clear()
+        for entry in history[self.count:]:
+            self.add(entry)
+
+    def is_latest(self, position: int) -> bool:
+        """Whether the entry at this position is the newest translation of its source text
+
+        Answered from the positions alone, so filtering never reads entry bodies back.
+        """
+        return position in self.latest_positions
+
+HISTORY_COLUMNS = ['timestamp', 'user', 'type', 'model', 'spanish_input', 'english_output', 'input_tokens',
+                   'output_tokens', 'cache_write_tokens', 'cache_read_tokens', 'batch', 'source_key']
+
+class SharedHistoryStore:
+    """Process-wide persistent history shared by every session (see get_history_store)
+
+    append() only enqueues; a daemon thread drains the queue and commits in batches.
+    Each reading thread gets its own connection, so History tab reads never wait
+    on the writer or on each other.
+    """
+
+    WRITE_BATCH_SIZE = 100
+    # Attempts after the first while the database is locked
+    WRITE_RETRIES = 3
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue()
+        self._local = threading.local()
+        # Entries the writer gave up on; the sessions that recorded them still have them
+        self.failed: List[dict] = []
+        with sqlite3.connect(path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT NOT NULL,
+                    user TEXT NOT NULL DEFAULT '',
+                    type TEXT NOT NULL,
+                    model TEXT,
+                    spanish_input TEXT NOT NULL,
+                    english_output TEXT NOT NULL,
+                    input_tokens INTEGER NOT NULL DEFAULT 0,
+                    output_tokens INTEGER NOT NULL DEFAULT 0,
+                    cache_write_tokens INTEGER NOT NULL DEFAULT 0,
+                    cache_read_tokens INTEGER NOT NULL DEFAULT 0,
+                    batch INTEGER NOT NULL DEFAULT 0,
+                    source_key TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_source_key ON history (source_key)")
+        self._writer = threading.Thread(target=self._run_writer, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def append(self, entry: dict, user: str = ""):
+        """Queue an entry for writing and return immediately"""
+        self._queue.put({**entry, 'user': safe_get(entry, 'user', user)})
+
+    def flush(self):
+        """Block until every queued entry has been written (or added to failed)"""
+        self._queue.join()
+
+    def close(self):
+        """Write what is queued, then stop the writer thread"""
+        self._queue.put(None)
+        self._writer.join()
+
+    def _run_writer(self):
+        conn = None
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            entries = [entry for entry in batch if entry is not None]
+            stopping = len(entries) < len(batch)
+            # Whatever goes wrong, the writer keeps running and every item is marked done,
+            # so flush() and close() cannot hang on a lost batch
+            try:
+                if entries:
+                    if conn is None:
+                        conn = sqlite3.connect(self.path)
+                        conn.execute("PRAGMA synchronous=NORMAL")
+                    self._write(conn, entries)
+            except Exception as e:
+                if conn is None or len(entries) == 1:
+                    self._write_failed(entries, e)
+                else:
+                    # Write the batch entry by entry, so one bad entry does not lose the others
+                    for entry in entries:
+                        try:
+                            self._write(conn, [entry])
+                        except Exception as entry_error:
+                            self._write_failed([entry], entry_error)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        if conn is not None:
+            conn.close()
+
+    def _write(self, conn: sqlite3.Connection, entries: List[dict]):
+        """Insert entries in one transaction, retrying while another process holds the database lock"""
+        rows = [self._to_row(entry) for entry in entries]
+        for attempt in range(self.WRITE_RETRIES + 1):
+            try:
+                with conn:
+                    conn.executemany(
+                        f"INSERT INTO history ({', '.join(HISTORY_COLUMNS)}, created_at) "
+                        f"VALUES ({', '.join('?' * len(HISTORY_COLUMNS))}, ?)",
+                        rows
+                    )
+                return
+            except sqlite3.OperationalError:
+                if attempt == self.WRITE_RETRIES:
+                    raise
+                time.sleep(0.1 * 2 ** attempt)
+
+    def _write_failed(self, entries: List[dict], error: Exception):
+        """Keep entries that could not be written in failed, and log them"""
+        import logging
+        self.failed.extend(entries)
+        METRICS.increment("history_write_failures_total", len(entries))
+        logging.getLogger(__name__).error("Could not write %d history entries to %s: %s",
+                                          len(entries), self.path, error)
+
+    @staticmethod
+    def _to_row(entry: dict) -> tuple:
+        return (
+            str(safe_get(entry, 'timestamp', '')),
+            safe_get(entry, 'user', ''),
+            safe_get(entry, 'type', 'drill'),
+            safe_get(entry, 'model', None),
+            safe_get(entry, 'spanish_input', ''),
+            safe_get(entry, 'english_output', ''),
+            safe_get(entry, 'input_tokens', 0),
+            safe_get(entry, 'output_tokens', 0),
+            safe_get(entry, 'cache_write_tokens', 0),
+            safe_get(entry, 'cache_read_tokens', 0),
+            int(bool(safe_get(entry, 'batch', False))),
+            get_source_key(entry),
+            time.time()
+        )
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path)
+        return conn
+
+    def read_since(self, last_id: int = 0, limit: Optional[int] = None) -> List[dict]:
+        """Entries with an id above last_id, oldest first (each includes its 'id')"""
+        rows = self._reader().execute(
+            f"SELECT id, {', '.join(HISTORY_COLUMNS)} FROM history WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, -1 if limit is None else limit)
+        ).fetchall()
+        return [self._to_entry(row) for row in rows]
+
+    def get(self, entry_id: int) -> Optional[dict]:
+        row = self._reader().execute(
+            f"SELECT id, {', '.join(HISTORY_COLUMNS)} FROM history WHERE id = ?", (entry_id,)
+        ).fetchone()
+        return self._to_entry(row) if row else None
+
+    @staticmethod
+    def _to_entry(row: tuple) -> dict:
+        entry = dict(zip(['id'] + HISTORY_COLUMNS, row))
+        entry['batch'] = bool(entry['batch'])
+        return entry
+
+    def team_stats(self) -> dict:
+        """Totals across every user, computed in SQLite"""
+        conn = self._reader()
+        total_cost = 0.0
+        for model, batch, input_tokens, output_tokens, cache_write, cache_read in conn.execute(
+            "SELECT model, batch, SUM(input_tokens), SUM(output_tokens), SUM(cache_write_tokens), "
+            "SUM(cache_read_tokens) FROM history GROUP BY model, batch"
+        ):
+            total_cost += calculate_estimated_cost(
+                input_tokens, output_tokens, model or DEFAULT_MODEL, cache_write, cache_read, bool(batch)
+            )
+        count, unique_sources, contributors = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT source_key), COUNT(DISTINCT user) FROM history"
+        ).fetchone()
+        by_user = dict(conn.execute(
+            "SELECT user, COUNT(*) FROM history GROUP BY user ORDER BY COUNT(*) DESC"
+        ).fetchall())
+        return {
+            'count': count,
+            'unique_sources': unique_sources,
+            'duplicates': count - unique_sources,
+            'contributors': contributors,
+            'by_user': by_user,
+            'total_cost': total_cost
+        }
+
+    def __len__(self) -> int:
+        return self._reader().execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+class RecordedHistory(list):
+    """A session history list that also records every appended entry in the shared store
+
+    With a TextStore, entries are kept as compact HistoryRecords whose bodies
+    live in the store; the shared store still receives the plain entry.
+    """
+
+    def __init__(self, store: Optional[SharedHistoryStore], user: str = "", bodies: Optional[TextStore] = None):
+        super().__init__()
+        self.store = store
+        self.user = user
+        self.bodies = bodies
+
+    def append(self, entry: dict):
+        super().append(HistoryRecord(entry, self.bodies) if self.bodies is not None else entry)
+        if self.store is not None:
+            self.store.append(entry, user=self.user)
+
+class TeamHistoryMirror(list):
+    """A session's copy of the shared store, extended with new rows on each sync"""
+
+    def __init__(self, store: SharedHistoryStore, bodies: Optional[TextStore] = None):
+        super().__init__()
+        self.store = store
+        self.bodies = bodies
+        self.last_id = 0
+
+    def sync(self) -> "TeamHistoryMirror":
+        new_entries = self.store.read_since(self.last_id)
+        if new_entries:
+            self.last_id = new_entries[-1]['id']
+            if self.bodies is not None:
+                new_entries = [HistoryRecord(entry, self.bodies) for entry in new_entries]
+            self.extend(new_entries)
+        return self
+
+def open_default_history_store() -> SharedHistoryStore:
+    """Open the shared history store configured through CV_TRANSLATOR_HISTORY_DB"""
+    return SharedHistoryStore(HISTORY_DB_PATH)
@@ -0,0 +1,188 @@
+"""Process-local background job queue for translations
+
+A translation run inside a Streamlit button handler is lost when the script
+reruns or the curator switches tabs, and it blocks the page while it runs.
+Jobs submitted here run on a small pool of worker threads instead. The page
+polls them by id for status and streamed progress, and can cancel them, while
+the curator keeps working.
+
+A job function takes the Job and returns (translation, error), like the core
+translate functions. It reports progress through job.report, which also
+raises JobCancelled once cancellation is requested, so a streamed request is
+closed at the next delta. Queued jobs are cancelled before they start. A
+non-streamed request that is already in flight is allowed to finish, and its
+result is still cached. Job functions record their own results in the cache
+and history they were given, so finished work is kept even if the page that
+queued it is gone.
+
+    jobs = JobQueue()
+    job_id = jobs.submit(lambda job: translate_text(client, text, prompt, model,
+                                                    cache=cache, history=history,
+                                                    on_progress=job.report), "Rondo 4v2")
+    jobs.get(job_id).status   # queued -> running -> done / failed / cancelled
+"""
+import itertools
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .metrics import METRICS
+
+JOB_WORKERS = int(os.environ.get("CV_TRANSLATOR_JOB_WORKERS", "2"))
+# Finished jobs stay available for polling this long
+JOB_RETENTION_SECONDS = 3600
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (DONE, FAILED, CANCELLED)
+
+class JobCancelled(BaseException):
+    """Raised from Job.report once the job has been cancelled
+
+    A BaseException, so the translate functions' `except Exception` error handling
+    lets it through instead of reporting the cancel as a failed API call.
+    """
+
+class Job:
+    """One queued unit of work with its status, latest progress and outcome"""
+
+    def __init__(self, job_id: int, function: Callable[["Job"], Tuple[Optional[str], Optional[str]]],
+                 label: str, owner: str, kind: str, source: str = ""):
+        self.id = job_id
+        self.function = function
+        self.label = label
+        # The input text, so a finished job can be shown next to its source
+        self.source = source
+        self.owner = owner
+        self.kind = kind
+        self.status = QUEUED
+        self.progress = ""
+        self.result: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cancel = threading.Event()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds spent running so far (or in total, once finished)"""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def report(self, progress: str):
+        """Record progress (a partial translation or a status line); raises JobCancelled after cancel()"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.progress = progress
+
+class JobQueue:
+    """FIFO job queue served by daemon worker threads, shared by every session (see get_job_queue)
+
+    Worker threads start with the first submitted job. Jobs are kept by id and
+    listed per owner, so each session sees only the jobs it queued.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = max(1, workers)
+        self._jobs: Dict[int, Job] = {}
+        self._ids = itertools.count(1)
+        self._queue: "queue.Queue[Job]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def submit(self, function: Callable[[Job], Tuple[Optional[str], Optional[str]]], label: str,
+               owner: str = "", kind: str = "translation", source: str = "") -> int:
+        """Queue function(job) and return the new job's id"""
+        with self._lock:
+            self._prune()
+            job = Job(next(self._ids), function, label, owner, kind, source)
+            self._jobs[job.id] = job
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run_worker, name=f"job-worker-{len(self._threads) + 1}",
+                                          daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        self._queue.put(job)
+        METRICS.increment("jobs_total", kind=kind, status=QUEUED)
+        return job.id
+
+    def get(self, job_id: int) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def jobs(self, owner: Optional[str] = None) -> List[Job]:
+        """Jobs of one owner (or all), newest first"""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if owner is None or job.owner == owner]
+        return sorted(jobs, key=lambda job: job.id, reverse=True)
+
+    def pending(self, owner: Optional[str] = None) -> int:
+        """Number of queued or running jobs"""
+        return sum(1 for job in self.jobs(owner) if not job.finished)
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a queued job now, or ask a running one to stop; False if it already finished"""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        job._cancel.set()
+        with self._lock:
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED, "cancelled")
+        return True
+
+    def dismiss(self, job_id: int):
+        """Forget a finished job"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.finished:
+                del self._jobs[job_id]
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [job.id for job in self._jobs.values() if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        METRICS.increment("jobs_total", kind=job.kind, status=status)
+
+    def _run_worker(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job.status != QUEUED:
+                    continue
+                job.status = RUNNING
+                job.started_at = time.time()
+            METRICS.observe("job_queue_wait_seconds", job.started_at - job.created_at, kind=job.kind)
+            try:
+                translation, error = job.function(job)
+            except JobCancelled:
+                translation, error = None, "cancelled"
+            except Exception as e:
+                translation, error = None, str(e)
+            with self._lock:
+                job.result = translation
+                if job.cancel_requested and not translation:
+                    self._finish(job, CANCELLED, "cancelled")
+                elif error or not translation:
+                    self._finish(job, FAILED, error or "No translation returned")
+                else:
+                    self._finish(job, DONE)
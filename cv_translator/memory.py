@@ -0,0 +1,232 @@
+"""Compact session records over a shared, memory-bounded text store
+
+Session history and the session cache tier used to keep every Spanish and
+English body as a plain dict value, often twice: a translation sits in the
+cache and again as the english_output of its history entry, and every session
+holds its own copy of the team history. Over a long curation day that grows
+a Streamlit worker without bound.
+
+Here bodies live once per process in a TextStore, keyed by a content hash, so
+equal texts are stored once whichever record refers to them. The store keeps
+the most recently used bodies in memory up to MEMORY_BUDGET_MB and spills the
+rest to a SQLite file, reading them back on demand. History entries become
+HistoryRecord objects (fixed __slots__ plus two body hashes) and cache tier
+entries become tuples. Both still read like the dicts they replace.
+
+Set CV_TRANSLATOR_MEMORY_BUDGET_MB to size the in-memory part and
+CV_TRANSLATOR_SPILL_DIR to choose where spilled bodies go (default: temp dir).
+"""
+import atexit
+import hashlib
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
+from typing import Dict, Iterator, Optional
+
+MEMORY_BUDGET_MB = float(os.environ.get("CV_TRANSLATOR_MEMORY_BUDGET_MB", "64"))
+SPILL_DIR = os.environ.get("CV_TRANSLATOR_SPILL_DIR") or None
+
+def format_bytes(size: float) -> str:
+    """Human-readable byte count (1024-based)"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+class TextStore:
+    """Deduplicated text bodies keyed by content hash: an in-memory LRU over a spill file
+
+    One instance is shared by every session (see get_text_store), so access holds
+    a lock. A body evicted from memory is written to disk once and stays there;
+    reading it moves it back to the most recently used end of the memory tier.
+    """
+
+    def __init__(self, budget_bytes: int, spill_dir: Optional[str] = None):
+        self.budget_bytes = budget_bytes
+        self.memory_bytes = 0
+        self.spilled_bytes = 0
+        self._bodies: "OrderedDict[bytes, str]" = OrderedDict()
+        self._on_disk = set()
+        self._lock = threading.Lock()
+        fd, self.spill_path = tempfile.mkstemp(prefix="cv_translator_bodies_", suffix=".db", dir=spill_dir)
+        os.close(fd)
+        self._conn = sqlite3.connect(self.spill_path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS bodies (digest BLOB PRIMARY KEY, body TEXT NOT NULL)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._on_disk | self._bodies.keys())
+
+    def put(self, text: str) -> bytes:
+        """Store text (once, however often it is put) and return its key"""
+        digest = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        with self._lock:
+            if digest in self._bodies:
+                self._bodies.move_to_end(digest)
+            else:
+                self._remember(digest, text)
+        return digest
+
+    def get(self, digest: bytes) -> str:
+        with self._lock:
+            text = self._bodies.get(digest)
+            if text is not None:
+                self._bodies.move_to_end(digest)
+                return text
+            text = self._conn.execute("SELECT body FROM bodies WHERE digest = ?", (digest,)).fetchone()[0]
+            self._remember(digest, text)
+            return text
+
+    def _remember(self, digest: bytes, text: str):
+        """Add a body to the memory tier, spilling least recently used bodies over the budget"""
+        self._bodies[digest] = text
+        self.memory_bytes += sys.getsizeof(text)
+        while self.memory_bytes > self.budget_bytes and len(self._bodies) > 1:
+            old_digest, old_text = self._bodies.popitem(last=False)
+            size = sys.getsizeof(old_text)
+            self.memory_bytes -= size
+            if old_digest not in self._on_disk:
+                with self._conn:
+                    self._conn.execute("INSERT OR IGNORE INTO bodies VALUES (?, ?)", (old_digest, old_text))
+                self._on_disk.add(old_digest)
+                self.spilled_bytes += size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'bodies': len(self._on_disk | self._bodies.keys()),
+                'memory_bodies': len(self._bodies),
+                'memory_bytes': self.memory_bytes,
+                'budget_bytes': self.budget_bytes,
+                'spilled_bodies': len(self._on_disk),
+                'spilled_bytes': self.spilled_bytes,
+            }
+
+    def close(self):
+        """Close and delete the spill file"""
+        with self._lock:
+            self._conn.close()
+            try:
+                os.remove(self.spill_path)
+            except OSError:
+                pass
+
+_MISSING = object()
+
+class HistoryRecord(Mapping):
+    """A history entry with fixed slots and its two bodies held in a TextStore
+
+    Reads like the entry dict it was built from (record['english_output'],
+    record.get('user'), dict(record)); it is read-only once recorded. Keys the
+    slots do not cover (chunks, source_key, ...) are kept in a small dict.
+    """
+
+    __slots__ = ("_bodies", "_spanish", "_english", "id", "user", "timestamp", "type", "model",
+                 "input_tokens", "output_tokens", "cache_write_tokens", "cache_read_tokens", "batch", "extra")
+
+    FIELDS = ("id", "user", "timestamp", "type", "model", "input_tokens", "output_tokens",
+              "cache_write_tokens", "cache_read_tokens", "batch")
+    BODY_FIELDS = ("spanish_input", "english_output")
+
+    def __init__(self, entry: Mapping, bodies: TextStore):
+        self._bodies = bodies
+        self._spanish = bodies.put(entry.get('spanish_input', ''))
+        self._english = bodies.put(entry.get('english_output') or '')
+        for field in self.FIELDS:
+            setattr(self, field, entry.get(field, _MISSING))
+        extra = {key: value for key, value in entry.items()
+                 if key not in self.FIELDS and key not in self.BODY_FIELDS}
+        self.extra = extra or None
+
+    def __getitem__(self, key: str):
+        if key == 'spanish_input':
+            return self._bodies.get(self._spanish)
+        if key == 'english_output':
+            return self._bodies.get(self._english)
+        if key in self.FIELDS:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                return value
+        elif self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for field in self.FIELDS[:3]:
+            if getattr(self, field) is not _MISSING:
+                yield field
+        yield from self.BODY_FIELDS
+        for field in self.FIELDS[3:]:
+            if getattr(self, field) is not _MISSING:
+                yield field
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"HistoryRecord({self.timestamp!r}, {self.type!r})"
+
+    def __sizeof__(self) -> int:
+        """Record size without the shared bodies (bytes of the slots and their small values)"""
+        size = object.__sizeof__(self) + 2 * sys.getsizeof(self._spanish)
+        if self.extra:
+            size += sys.getsizeof(self.extra)
+        return size
+
+CACHE_FIELDS = ('input_tokens', 'output_tokens', 'cache_write_tokens', 'cache_read_tokens', 'model', 'timestamp')
+
+class CompactCache(MutableMapping):
+    """Session cache tier storing each entry as a tuple, with the translation in a TextStore
+
+    A drop-in for the plain dict TieredTranslationCache takes as its local tier.
+    Entries come back as fresh dicts, so callers cannot change the stored copy.
+    """
+
+    def __init__(self, bodies: TextStore):
+        self.bodies = bodies
+        self._entries: Dict[str, tuple] = {}
+
+    def __getitem__(self, cache_key: str) -> dict:
+        stored = self._entries[cache_key]
+        entry = {'translation': self.bodies.get(stored[0])}
+        entry.update((field, value) for field, value in zip(CACHE_FIELDS, stored[1:]) if value is not None)
+        return entry
+
+    def __setitem__(self, cache_key: str, entry: dict):
+        self._entries[cache_key] = (self.bodies.put(entry['translation']),) + tuple(
+            entry.get(field) for field in CACHE_FIELDS
+        )
+
+    def __delitem__(self, cache_key: str):
+        del self._entries[cache_key]
+
+    def __contains__(self, cache_key) -> bool:
+        return cache_key in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __sizeof__(self) -> int:
+        """Bytes of the key table and entry tuples, without the shared bodies"""
+        return object.__sizeof__(self) + sys.getsizeof(self._entries) + sum(
+            sys.getsizeof(key) + sys.getsizeof(stored) for key, stored in self._entries.items()
+        )
+
+def get_records_size(records) -> int:
+    """Bytes held by a list of history records (or dicts) and the list itself, bodies excluded"""
+    return sys.getsizeof(records) + sum(sys.getsizeof(record) for record in records)
+
+def open_default_text_store() -> TextStore:
+    """Open a text store sized by CV_TRANSLATOR_MEMORY_BUDGET_MB; its spill file is removed at exit"""
+    store = TextStore(int(MEMORY_BUDGET_MB * 1024 * 1024), SPILL_DIR)
+    atexit.register(store.close)
+    return store
@@ -0,0 +1,184 @@
+"""In-process performance metrics with Prometheus text exposition
+
+Counters and latency summaries for the parts of a translation that can be
+slow: rate-limit waits and retries (the app), time to first token (network
+plus model queueing), generation throughput (the model), cache hit rates,
+and Streamlit rerun time. Summaries keep a bounded window of recent samples,
+so percentiles reflect current behaviour and memory stays flat.
+
+    from cv_translator.metrics import METRICS
+    METRICS.observe("translation_latency_seconds", 2.4, model="...", mode="stream")
+    METRICS.increment("cache_lookups_total", result="hit")
+    print(METRICS.render_prometheus())
+
+Set CV_TRANSLATOR_METRICS_PORT to serve /metrics for Prometheus scrapers.
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+METRICS_PORT = int(os.environ.get("CV_TRANSLATOR_METRICS_PORT", "0"))
+METRIC_PREFIX = "cv_translator_"
+SUMMARY_WINDOW = 1000
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+METRIC_HELP = {
+    "translation_latency_seconds": "Wall-clock time of a translation API call",
+    "translation_ttft_seconds": "Time to the first streamed token of a translation",
+    "translation_output_tokens_per_second": "Output tokens per second of generation",
+    "api_call_seconds": "Duration of individual API attempts made by the scheduler",
+    "rate_limit_wait_seconds": "Time spent waiting for the local rate limiter",
+    "api_retries_total": "API attempts retried after a transient failure",
+    "api_fallbacks_total": "Requests served by a fallback model",
+    "cache_lookups_total": "Translation cache lookups by result",
+    "translations_total": "Finished translations by outcome",
+    "streamlit_rerun_seconds": "Time to run the Streamlit script once",
+    "jobs_total": "Background jobs reaching each status, by kind",
+    "job_queue_wait_seconds": "Time background jobs wait for a worker",
+    "service_requests_total": "Translation service requests by outcome",
+    "history_write_failures_total": "History entries the shared store could not write",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def percentile(sorted_values: List[float], quantile: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return math.nan
+    rank = max(1, math.ceil(quantile * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+class Summary:
+    """Count and sum of every observation, plus a window of recent samples for percentiles"""
+
+    __slots__ = ("count", "total", "samples")
+
+    def __init__(self, window: int = SUMMARY_WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+    def quantiles(self) -> Dict[float, float]:
+        ordered = sorted(self.samples)
+        return {quantile: percentile(ordered, quantile) for quantile in QUANTILES}
+
+class MetricsRegistry:
+    """Thread-safe counters and summaries keyed by metric name and labels"""
+
+    def __init__(self, window: int = SUMMARY_WINDOW):
+        self.window = window
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.summaries: Dict[str, Dict[LabelKey, Summary]] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.summaries.setdefault(name, {})
+            if key not in series:
+                series[key] = Summary(self.window)
+            series[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Observe the duration of a with-block (also when it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter_value(self, name: str, **labels) -> float:
+        """Sum of a counter over every series matching the given labels"""
+        wanted = set(labels.items())
+        with self._lock:
+            return sum(value for key, value in self.counters.get(name, {}).items() if wanted <= set(key))
+
+    def summary_stats(self, name: str) -> Optional[dict]:
+        """count, mean and percentiles of a summary, merged across its label sets"""
+        with self._lock:
+            series = list(self.summaries.get(name, {}).values())
+            count = sum(summary.count for summary in series)
+            total = sum(summary.total for summary in series)
+            samples = sorted(value for summary in series for value in summary.samples)
+        if not count:
+            return None
+        stats = {'count': count, 'mean': total / count}
+        stats.update({f"p{round(quantile * 100)}": percentile(samples, quantile) for quantile in QUANTILES})
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self.counters.clear()
+            self.summaries.clear()
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                full_name = METRIC_PREFIX + name
+                lines.append(f"# HELP {full_name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {full_name} counter")
+                for key, value in series.items():
+                    lines.append(f"{full_name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self.summaries.items()):
+                full_name = METRIC_PREFIX + name
+                lines.append(f"# HELP {full_name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {full_name} summary")
+                for key, summary in series.items():
+                    for quantile, value in summary.quantiles().items():
+                        lines.append(f"{full_name}{_format_labels(key + (('quantile', str(quantile)),))} {value:g}")
+                    lines.append(f"{full_name}_sum{_format_labels(key)} {summary.total:g}")
+                    lines.append(f"{full_name}_count{_format_labels(key)} {summary.count}")
+        return "\n".join(lines) + "\n"
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in key
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+# Process-wide registry: every session, worker thread and scheduler records here
+METRICS = MetricsRegistry()
+
+def start_metrics_server(port: int, registry: MetricsRegistry = METRICS, host: str = "0.0.0.0"):
+    """Serve the registry at http://host:port/metrics from a daemon thread; returns the server"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
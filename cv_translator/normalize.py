@@ -0,0 +1,88 @@
+"""Deterministic pre-processing of Spanish drills before they reach the model
+
+Unit conversion, zone labels and fixed glossary terms are mechanical, so they
+are done here with a compiled pattern table instead of spending output tokens
+(and consistency) on them. All rules are folded into one alternation so the
+text is scanned once, whatever the number of rules.
+"""
+import re
+from typing import Callable, Dict, List, Tuple
+
+METERS_TO_YARDS = 1.09
+
+_NUMBER = r'\d+(?:[.,]\d+)?'
+# An abbreviation period ("20 mts. de ancho") goes with the unit; one that ends the
+# sentence (before a capital, a line break or the end of the text) is kept
+_METERS = r'(?:m|mts?|metros?)\b(?:\.(?!\s*(?:\n|\Z)|\s+[A-ZÁÉÍÓÚÑ¿¡]))?'
+# Word boundary checked *after* a rule's first character: "(?<!\w.)" rejects a match whose
+# first character follows a letter or digit. Every rule starts with a literal character
+# from RULE_FIRST_CHARS, so the combined pattern can be guarded by a one-character
+# lookahead and the engine skips most positions without trying the alternation.
+_AFTER_BOUNDARY = r'(?<!\w.)'
+RULE_FIRST_CHARS = r'[\dZGCcRrAa]'
+_LEADING_NUMBER = r'\d' + _AFTER_BOUNDARY + r'\d*(?:[.,]\d+)?'
+
+def _to_yards(value: str) -> str:
+    """Convert a metric number to whole yards (practical coaching rounding)"""
+    return str(max(1, round(float(value.replace(',', '.')) * METERS_TO_YARDS)))
+
+def _dimensions(match: re.Match) -> str:
+    sides = re.split(r'\s*[xX×]\s*', match.group('dims'))
+    return 'x'.join(_to_yards(side) for side in sides) + ' yards'
+
+def _distance(match: re.Match) -> str:
+    yards = _to_yards(match.group('distance'))
+    return f"{yards} yard" if yards == "1" else f"{yards} yards"
+
+def _zone(match: re.Match) -> str:
+    return f"Zone {match.group('zone')}"
+
+def _fixed(replacement: str) -> Callable[[re.Match], str]:
+    return lambda match: replacement
+
+def _warm_up(match: re.Match) -> str:
+    return "Warm-up" if match.group(0)[0].isupper() else "warm-up"
+
+def _cross(match: re.Match) -> str:
+    word = "crosses" if match.group(0).endswith("s") else "cross"
+    return word.capitalize() if match.group(0)[0].isupper() else word
+
+# "centro" only means a cross after a verb of delivering it ("dar un centro", "tras el
+# centro") or before where it is played ("centro al área", "centros laterales"); on its
+# own it is just as often the middle ("zona centro", "medio centro", "centrocampista").
+# The verb is checked with fixed-width lookbehinds, only once the word is known to be "centro".
+_CROSS_VERBS = ("da", "dan", "dar", "hace", "hacen", "hacer", "pone", "ponen", "poner",
+                "realiza", "realizan", "realizar", "tras")
+_CROSS_AFTER_VERB = '|'.join(
+    rf'(?<=(?i:\b{verb} {article}))'
+    for verb in _CROSS_VERBS for article in ("", "un ", "el ", "los ", "unos ")
+)
+_CROSS_TARGET = r'\s+(?:al\s+[áa]rea|laterale?s?|rasos?|atr[áa]s|desde\s+(?:la\s+)?banda)\b'
+
+# (name, pattern, replacement) in priority order; earlier rules win where patterns overlap
+NORMALIZATION_RULES: List[Tuple[str, str, Callable[[re.Match], str]]] = [
+    # "40x30m", "40 x 30 m", "20x15x10 metros"
+    ('metric_dimensions', rf'(?P<dims>{_LEADING_NUMBER}(?:\s*[xX×]\s*{_NUMBER})+)\s*{_METERS}', _dimensions),
+    # "20m", "5 metros" (not "3 min")
+    ('metric_distance', rf'(?P<distance>{_LEADING_NUMBER})\s*{_METERS}', _distance),
+    # "Z1", "Z-2", "Z 3"
+    ('zone_label', rf'Z{_AFTER_BOUNDARY}[ -]?(?P<zone>\d{{1,2}})\b', _zone),
+    ('gradient_plus', rf'G{_AFTER_BOUNDARY}RADIENTES?\s*(?:\(\s*\+\s*\)|\+|\(\s*M[ÁA]S\s*\))\s*:?', _fixed("More advanced:")),
+    ('gradient_minus', rf'G{_AFTER_BOUNDARY}RADIENTES?\s*(?:\(\s*[-−–]\s*\)|[-−–]|\(\s*MENOS\s*\))\s*:?', _fixed("Simplified:")),
+    # "dar un centro", "tras el centro", "centro al área" as a cross (see _CROSS_VERBS)
+    ('cross', rf'(?=[Cc]entros?\b)(?:{_CROSS_AFTER_VERB}|(?=\w+{_CROSS_TARGET}))[Cc]{_AFTER_BOUNDARY}entros?\b',
+     _cross),
+    ('rondo', rf'(?P<rondo_initial>[Rr]){_AFTER_BOUNDARY}ond[óo]\b', lambda match: match.group('rondo_initial') + "ondo"),
+    ('warm_up', rf'(?:[Aa]{_AFTER_BOUNDARY}ctivaci[óo]n|[Cc]{_AFTER_BOUNDARY}alentamiento)\b', _warm_up),
+]
+
+NORMALIZATION_PATTERN = re.compile(
+    f'(?={RULE_FIRST_CHARS})(?:'
+    + '|'.join(f'(?P<{name}>{pattern})' for name, pattern, _ in NORMALIZATION_RULES)
+    + ')'
+)
+_REPLACEMENTS: Dict[str, Callable[[re.Match], str]] = {name: replace for name, _, replace in NORMALIZATION_RULES}
+
+def normalize_drill_text(text: str) -> str:
+    """Convert meters to yards, expand zone labels and canonicalize glossary terms in one pass"""
+    return NORMALIZATION_PATTERN.sub(lambda match: _REPLACEMENTS[match.lastgroup](match), text)
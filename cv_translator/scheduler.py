@@ -0,0 +1,326 @@
+"""Rate-limit-aware request scheduling for the Anthropic client
+
+Wraps a client so every messages.create()/messages.stream() call goes through
+token buckets (requests and tokens per minute), retries transient failures
+(429, 5xx, 529 overloaded, connection errors) with jittered exponential backoff
+that honors retry-after, trips a per-model circuit breaker on repeated
+failures, and falls back to a cheaper model when the preferred one is down.
+"""
+import os
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from .core import FALLBACK_MODELS, estimate_tokens
+from .metrics import METRICS
+
+T = TypeVar("T")
+
+REQUESTS_PER_MINUTE = int(os.environ.get("CV_TRANSLATOR_RPM", "50"))
+TOKENS_PER_MINUTE = int(os.environ.get("CV_TRANSLATOR_TPM", "40000"))
+
+# 408 timeout, 409 conflict, 429 rate limited, 5xx server errors, 529 overloaded
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError"}
+
+class CircuitOpenError(Exception):
+    """Raised when every candidate model's circuit breaker is open"""
+
+def is_retryable(error: Exception) -> bool:
+    """True for rate limits, overloads, server errors and network failures"""
+    if getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES:
+        return True
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, from retry-after-ms or retry-after headers"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's retry-after"""
+    delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, max_delay) + random.uniform(0, base_delay / 2))
+    return delay
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at capacity per minute"""
+    
+    def __init__(self, capacity: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.capacity = capacity
+        self.rate = capacity / 60.0
+        self.tokens = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def acquire(self, amount: float = 1.0) -> float:
+        """Block until amount tokens are available; returns the time spent waiting"""
+        # A single request larger than the bucket can never fit; let it through on a full bucket
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                wait = (amount - self.tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures; allows a trial call after reset_timeout"""
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._clock = clock
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self._clock() - self.opened_at >= self.reset_timeout else "open"
+    
+    def allow(self) -> bool:
+        return self.state != "open"
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                # A failed half-open trial re-opens the breaker for another timeout
+                self.opened_at = self._clock()
+
+class RequestScheduler:
+    """Applies rate limits, retries, circuit breaking and model fallback to API calls
+    
+    One scheduler should be shared by everything in a process that talks to the API,
+    so the limits describe the account rather than a single session.
+    """
+    
+    def __init__(self, requests_per_minute: int = REQUESTS_PER_MINUTE, tokens_per_minute: int = TOKENS_PER_MINUTE,
+                 max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 30.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 fallback_models: Optional[Dict[str, str]] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.request_bucket = TokenBucket(requests_per_minute, clock, sleep)
+        self.token_bucket = TokenBucket(tokens_per_minute, clock, sleep)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.fallback_models = FALLBACK_MODELS if fallback_models is None else fallback_models
+        self.retries = 0
+        self.fallbacks = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+    
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker(self.failure_threshold, self.reset_timeout, self._clock)
+            return self._breakers[model]
+    
+    def model_chain(self, model: str) -> List[str]:
+        """The requested model followed by its configured fallbacks"""
+        chain = [model]
+        while chain[-1] in self.fallback_models and self.fallback_models[chain[-1]] not in chain:
+            chain.append(self.fallback_models[chain[-1]])
+        return chain
+    
+    def candidates(self, model: str) -> Iterator[Tuple[str, CircuitBreaker]]:
+        """The models of model_chain() whose circuit allows a call, counting each fallback used"""
+        for position, candidate in enumerate(self.model_chain(model)):
+            breaker = self.breaker(candidate)
+            if not breaker.allow():
+                continue
+            if position > 0:
+                self.fallbacks += 1
+                METRICS.increment("api_fallbacks_total", model=candidate)
+            yield candidate, breaker
+    
+    def wait_for_capacity(self, estimated_tokens: int = 0):
+        """Block until the request and token buckets admit one more call"""
+        waited = self.request_bucket.acquire(1)
+        if estimated_tokens:
+            waited += self.token_bucket.acquire(estimated_tokens)
+        METRICS.observe("rate_limit_wait_seconds", waited)
+    
+    def record_failure(self, model: str, breaker: CircuitBreaker, attempt: int, started: float,
+                       error: Exception) -> Optional[float]:
+        """Account for a failed attempt; returns the backoff before retrying, or None to move on
+        
+        Errors that are not worth retrying are re-raised.
+        """
+        self._record_attempt(model, started, error)
+        if not is_retryable(error):
+            raise error
+        breaker.record_failure()
+        if attempt == self.max_retries or not breaker.allow():
+            return None
+        self.retries += 1
+        METRICS.increment("api_retries_total", model=model)
+        return backoff_delay(attempt, self.base_delay, self.max_delay, get_retry_after(error))
+    
+    def record_success(self, model: str, breaker: CircuitBreaker, started: float):
+        self._record_attempt(model, started)
+        breaker.record_success()
+    
+    def _exhausted(self, model: str, last_error: Optional[Exception]) -> Exception:
+        """The error to raise when no candidate model produced a result"""
+        if last_error is not None:
+            return last_error
+        return CircuitOpenError(f"Circuit open for {', '.join(self.model_chain(model))}; try again shortly")
+    
+    def call(self, request: Callable[[str], T], model: str, estimated_tokens: int = 0) -> T:
+        """Run request(model_name) under the limits, retrying and falling back as needed"""
+        last_error: Optional[Exception] = None
+        for candidate, breaker in self.candidates(model):
+            for attempt in range(self.max_retries + 1):
+                self.wait_for_capacity(estimated_tokens)
+                started = time.perf_counter()
+                try:
+                    result = request(candidate)
+                except Exception as e:
+                    last_error = e
+                    delay = self.record_failure(candidate, breaker, attempt, started, e)
+                    if delay is None:
+                        break
+                    self._sleep(delay)
+                    continue
+                self.record_success(candidate, breaker, started)
+                return result
+        raise self._exhausted(model, last_error)
+    
+    @staticmethod
+    def _record_attempt(model: str, started: float, error: Optional[Exception] = None):
+        """Time one API attempt, labelled with its HTTP status (or error type)"""
+        if error is None:
+            status = "ok"
+        else:
+            status = str(getattr(error, "status_code", None) or type(error).__name__)
+        METRICS.observe("api_call_seconds", time.perf_counter() - started, model=model, status=status)
+
+    async def call_async(self, request: Callable[[str], Awaitable[T]], model: str, estimated_tokens: int = 0) -> T:
+        """call() for coroutines: awaits request(model_name), sleeping without blocking the event loop
+        
+        The token buckets are shared with synchronous callers; waiting for them happens
+        in a worker thread so other coroutines keep running.
+        """
+        import asyncio
+        
+        last_error: Optional[Exception] = None
+        for candidate, breaker in self.candidates(model):
+            for attempt in range(self.max_retries + 1):
+                await asyncio.to_thread(self.wait_for_capacity, estimated_tokens)
+                started = time.perf_counter()
+                try:
+                    result = await request(candidate)
+                except Exception as e:
+                    last_error = e
+                    delay = self.record_failure(candidate, breaker, attempt, started, e)
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+                    continue
+                self.record_success(candidate, breaker, started)
+                return result
+        raise self._exhausted(model, last_error)
+
+def estimate_request_tokens(kwargs: dict) -> int:
+    """Rough input token count of a messages request, for the tokens-per-minute bucket"""
+    text = "".join(block.get("text", "") for block in kwargs.get("system") or [] if isinstance(block, dict))
+    for message in kwargs.get("messages", []):
+        content = message.get("content")
+        text += content if isinstance(content, str) else "".join(
+            block.get("text", "") for block in content if isinstance(block, dict)
+        )
+    return estimate_tokens(text, kwargs.get("model", ""))
+
+class _ScheduledStream:
+    """Context manager that opens a stream under the scheduler
+    
+    Only opening the stream is retried; an error after text has started arriving is
+    raised to the caller, since replaying it would duplicate output.
+    """
+    
+    def __init__(self, client, scheduler: RequestScheduler, kwargs: dict):
+        self._client = client
+        self._scheduler = scheduler
+        self._kwargs = kwargs
+        self._manager = None
+    
+    def __enter__(self):
+        def open_stream(model: str):
+            manager = self._client.messages.stream(**{**self._kwargs, "model": model})
+            stream = manager.__enter__()
+            self._manager = manager
+            return stream
+        
+        return self._scheduler.call(open_stream, self._kwargs["model"], estimate_request_tokens(self._kwargs))
+    
+    def __exit__(self, *exc_info):
+        return self._manager.__exit__(*exc_info) if self._manager else False
+
+class _ScheduledMessages:
+    def __init__(self, client, scheduler: RequestScheduler):
+        self._client = client
+        self._scheduler = scheduler
+    
+    def create(self, **kwargs):
+        return self._scheduler.call(
+            lambda model: self._client.messages.create(**{**kwargs, "model": model}),
+            kwargs["model"],
+            estimate_request_tokens(kwargs)
+        )
+    
+    def stream(self, **kwargs):
+        return _ScheduledStream(self._client, self._scheduler, kwargs)
+    
+    def __getattr__(self, name):
+        # count_tokens, batches, ... pass straight through
+        return getattr(self._client.messages, name)
+
+class ScheduledClient:
+    """Drop-in wrapper around anthropic.Anthropic that routes messages calls through a RequestScheduler"""
+    
+    def __init__(self, client, scheduler: RequestScheduler):
+        self.client = client
+        self.scheduler = scheduler
+        self.messages = _ScheduledMessages(client, scheduler)
+    
+    def __getattr__(self, name):
+        return getattr(self.client, name)
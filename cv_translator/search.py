@@ -0,0 +1,138 @@
+"""Incremental full-text search over translation history
+
+An inverted index over both the Spanish input and English output of every
+history entry, so History tab filtering costs a few dictionary lookups instead
+of lower-casing and scanning every stored body on each rerun. Matching is
+accent- and case-insensitive, every query term also matches as a prefix (so
+results keep updating while a word is being typed), and results are ranked
+with BM25.
+"""
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Optional, Set
+
+from .core import safe_get
+
+TOKEN_PATTERN = re.compile(r'\w+')
+COMBINING_MARKS_PATTERN = re.compile(r'[\u0300-\u036f]')
+
+# BM25 parameters (standard defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+def fold_text(text: str) -> str:
+    """Lower-case and strip accents so "Presión" and "presion" match"""
+    if text.isascii():
+        return text.lower()
+    return COMBINING_MARKS_PATTERN.sub('', unicodedata.normalize('NFKD', text.lower()))
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(fold_text(text))
+
+class HistorySearchIndex:
+    """Inverted index over translation history entries, keyed by their position in the list
+    
+    History is append-only, so sync() only indexes entries added since the last call;
+    if the list shrank (history cleared) the index starts over.
+    """
+    
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_lengths: List[int] = []
+        self.by_type: Dict[str, Set[int]] = {}
+        self.by_date: Dict[str, Set[int]] = {}
+        self._total_length = 0
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+    
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+    
+    def clear(self):
+        self.__init__()
+    
+    def add(self, entry: dict) -> int:
+        """Index one entry; returns its document id (its position in history)"""
+        doc_id = len(self.doc_lengths)
+        terms = tokenize(safe_get(entry, 'spanish_input', '') + "\n" + safe_get(entry, 'english_output', ''))
+        for term, frequency in Counter(terms).items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                self._vocabulary_dirty = True
+            postings[doc_id] = frequency
+        self.doc_lengths.append(len(terms))
+        self._total_length += len(terms)
+        self.by_type.setdefault(safe_get(entry, 'type', 'drill'), set()).add(doc_id)
+        self.by_date.setdefault(str(safe_get(entry, 'timestamp', ''))[:10], set()).add(doc_id)
+        return doc_id
+    
+    def sync(self, history: List[dict]):
+        """Index entries appended since the last sync"""
+        if len(history) < len(self):
+            self.clear()
+        for entry in history[len(self):]:
+            self.add(entry)
+    
+    def _expand(self, term: str) -> List[str]:
+        """Indexed terms starting with term (including term itself)"""
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self.postings)
+            self._vocabulary_dirty = False
+        start = bisect_left(self._vocabulary, term)
+        matches = []
+        for candidate in self._vocabulary[start:]:
+            if not candidate.startswith(term):
+                break
+            matches.append(candidate)
+        return matches
+    
+    def search(self, query: str = "", doc_type: Optional[str] = None, date: Optional[str] = None,
+               limit: Optional[int] = None) -> List[int]:
+        """Return matching document ids, best match first (newest first when there is no query)
+        
+        Every query term must match (as a whole word or a prefix) in either language.
+        """
+        candidates: Optional[Set[int]] = None
+        if doc_type is not None:
+            candidates = set(self.by_type.get(doc_type, ()))
+        if date is not None:
+            dated = self.by_date.get(date, set())
+            candidates = dated.copy() if candidates is None else candidates & dated
+        
+        terms = tokenize(query)
+        if not terms:
+            ids = range(len(self) - 1, -1, -1) if candidates is None else sorted(candidates, reverse=True)
+            return list(ids)[:limit] if limit else list(ids)
+        
+        scores: Dict[int, float] = {}
+        doc_count = len(self)
+        average_length = self._total_length / doc_count if doc_count else 0
+        
+        for term in terms:
+            term_scores: Dict[int, float] = {}
+            for expanded in self._expand(term):
+                postings = self.postings[expanded]
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                # Exact word matches outrank prefix matches
+                weight = 1.0 if expanded == term else 0.5
+                for doc_id, frequency in postings.items():
+                    if candidates is not None and doc_id not in candidates:
+                        continue
+                    length_norm = 1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / (average_length or 1)
+                    score = weight * idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+                    term_scores[doc_id] = term_scores.get(doc_id, 0.0) + score
+            if not term_scores:
+                return []
+            if not scores:
+                scores = term_scores
+            else:
+                scores = {doc_id: scores[doc_id] + s for doc_id, s in term_scores.items() if doc_id in scores}
+                if not scores:
+                    return []
+        
+        ranked = sorted(scores, key=lambda doc_id: (-scores[doc_id], -doc_id))
+        return ranked[:limit] if limit else ranked
@@ -0,0 +1,244 @@
+"""Section-level incremental re-translation of drills
+
+Spanish drills follow a fixed set of headed sections (CONTENIDO, CONSIGNA,
+TIEMPO, ...), and each maps onto one or more fields of the English layout.
+Caching translations per section means that after a coach edits one line only
+the fields fed by that section go back to the model; everything else is
+reassembled from the cache.
+"""
+import json
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .core import (
+    GENERATION_PARAMS,
+    build_translation_request,
+    get_cache_key,
+    get_legacy_cache_key,
+    get_usage_tokens,
+    lookup_translation,
+    make_cache_entry,
+    make_history_entry,
+    translate_text,
+    translate_uncached,
+)
+from .metrics import METRICS
+
+# Spanish section headers as they appear at the start of a line ("GRADIENTE (+):", "Nº JUGADORES:", ...)
+SPANISH_SECTION_PATTERNS = {
+    'CONTENIDO': r'CONTENIDOS?',
+    'CONSIGNA': r'CONSIGNAS?',
+    'TIEMPO': r'TIEMPO',
+    'ESPACIO': r'ESPACIO',
+    'JUGADORES': r'(?:N[º°O]\.?[ \t]*(?:DE[ \t]+)?)?JUGADORES',
+    'DESCRIPCION': r'DESCRIPCI[ÓO]N',
+    'NORMATIVAS': r'NORMATIVAS?',
+    # normalize_drill_text() rewrites "GRADIENTE (+)/(-)" to these labels
+    'GRADIENTE': r'GRADIENTES?|MORE[ \t]+ADVANCED|SIMPLIFIED',
+}
+SECTION_HEADER_PATTERN = re.compile(
+    r'^[ \t]*(?:' + '|'.join(f'(?P<{name}>{pattern})' for name, pattern in SPANISH_SECTION_PATTERNS.items()) + r')'
+    r'[ \t]*(?:\([+\-−]\))?[ \t]*(?::|$)',
+    re.MULTILINE | re.IGNORECASE
+)
+
+# English output fields, in the order of the standard layout
+OUTPUT_FIELDS = [
+    "Topic", "Principle", "Microcycle day", "Time", "Players", "Physical focus",
+    "Space/equipment", "Description", "Progressions", "Coaching points"
+]
+
+# Translation units: the English fields each group of Spanish sections produces. The
+# last unit has no section of its own; it is inferred from the core of the drill.
+SECTION_UNITS = [
+    (("Topic",), ("CONTENIDO",)),
+    (("Principle",), ("CONSIGNA",)),
+    (("Time",), ("TIEMPO",)),
+    (("Players",), ("JUGADORES",)),
+    (("Space/equipment",), ("ESPACIO",)),
+    (("Description",), ("DESCRIPCION", "NORMATIVAS")),
+    (("Progressions",), ("GRADIENTE",)),
+    (("Microcycle day", "Physical focus", "Coaching points"), ("PREAMBLE", "CONTENIDO", "CONSIGNA", "DESCRIPCION", "NORMATIVAS")),
+]
+
+# A drill needs at least this many recognised sections to be handled section by section
+MIN_SECTIONS = 3
+
+ENGLISH_FIELD_PATTERN = re.compile(
+    r'^[ \t]*(?:\*\*|#+[ \t]*)?(' + '|'.join(re.escape(f) for f in OUTPUT_FIELDS) + r')(?:\*\*)?[ \t]*:?[ \t]*$',
+    re.MULTILINE | re.IGNORECASE
+)
+FIELD_TAG_PATTERN = re.compile(r'<field name="([^"]+)">\s*(.*?)\s*</field>', re.DOTALL)
+
+def parse_drill_sections(text: str) -> Dict[str, str]:
+    """Split a Spanish drill into its known sections; text before the first header is PREAMBLE"""
+    sections: Dict[str, str] = {}
+    matches = list(SECTION_HEADER_PATTERN.finditer(text))
+    
+    preamble = text[:matches[0].start()] if matches else text
+    if preamble.strip():
+        sections['PREAMBLE'] = preamble.strip()
+    
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        body = text[match.start():end].strip()
+        # Repeated headers (GRADIENTE (+) / GRADIENTE (-)) accumulate into one section
+        sections[match.lastgroup] = (sections[match.lastgroup] + "\n" + body) if match.lastgroup in sections else body
+    
+    return sections
+
+def parse_english_fields(translation: str) -> Dict[str, str]:
+    """Split a translation in the standard layout into {field: content}"""
+    canonical = {field.lower(): field for field in OUTPUT_FIELDS}
+    fields = {}
+    matches = list(ENGLISH_FIELD_PATTERN.finditer(translation))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(translation)
+        fields[canonical[match.group(1).lower()]] = translation[match.end():end].strip()
+    return fields
+
+def render_drill_fields(fields: Dict[str, str]) -> str:
+    """Reassemble field contents into the standard Topic/Principle/... layout"""
+    return "\n\n".join(f"{field}\n{fields[field]}" for field in OUTPUT_FIELDS if fields.get(field))
+
+def get_section_units(sections: Dict[str, str], prompt_template: str, model: str) -> List[Tuple[Tuple[str, ...], str]]:
+    """Return (fields, cache key) for every translation unit of a parsed drill
+    
+    A unit whose sections are all missing is inferred from the rest of the drill, so
+    its key covers the whole drill; keyed on its (empty) sections alone, every drill
+    without, say, ESPACIO would share one Space/equipment translation.
+    """
+    units = []
+    for fields, section_names in SECTION_UNITS:
+        if any(name in sections for name in section_names):
+            source = "\n".join(sections.get(name, "") for name in section_names)
+        else:
+            source = "\n".join(sections.values())
+        units.append((fields, get_cache_key(source, prompt_template, model, kind="section:" + "|".join(fields))))
+    return units
+
+def build_section_request(prompt_template: str, text: str, fields: List[str], reference: Optional[str] = None) -> dict:
+    """The regular cached system block, with the user turn asking only for the listed fields
+    
+    reference is the translation of a very similar drill, given for consistent wording.
+    """
+    request = build_translation_request(prompt_template, text)
+    if reference:
+        request['messages'][0]['content'] += (
+            "\n\nFor consistent wording, here is the translation of a very similar drill. Reuse its terms where "
+            f"the Spanish is the same, but translate this drill's own details:\n<reference_translation>\n{reference}\n"
+            "</reference_translation>"
+        )
+    request['messages'][0]['content'] += (
+        "\n\nThis drill was translated before and only some sections changed. Produce ONLY these sections "
+        f"of the output format: {', '.join(fields)}. Wrap each one in <field name=\"SECTION NAME\"></field> tags "
+        "containing exactly the lines you would write under that heading. Output nothing else."
+    )
+    return request
+
+def request_section_fields(client, text: str, prompt_template: str, model: str, requested: List[str],
+                           reference: Optional[str] = None) -> Tuple[Optional[Dict[str, str]], dict, str]:
+    """Ask the model for only the requested fields of a drill
+    
+    Returns (fields, usage, served model); fields is None when the reply does not
+    contain every requested field. API errors are raised.
+    """
+    message = client.messages.create(
+        model=model,
+        **GENERATION_PARAMS,
+        **build_section_request(prompt_template, text, requested, reference)
+    )
+    # The served model may differ from the requested one when the scheduler fell back
+    served_model = getattr(message, 'model', None) or model
+    returned = {name.strip(): content for name, content in FIELD_TAG_PATTERN.findall(message.content[0].text)}
+    if not all(field in returned for field in requested):
+        returned = None
+    return returned, get_usage_tokens(message.usage), served_model
+
+def seed_section_cache(cache, units, fields: Dict[str, str]):
+    """Cache each unit whose fields are all present in a translated drill"""
+    for unit_fields, unit_key in units:
+        if all(fields.get(field) for field in unit_fields):
+            cache.put(unit_key, {
+                'translation': json.dumps({field: fields[field] for field in unit_fields}, ensure_ascii=False),
+                'input_tokens': 0,
+                'output_tokens': 0
+            })
+
+def translate_drill_incremental(client, text: str, prompt_template: str, model: str, cache=None,
+                                history: Optional[list] = None, stats: Optional[dict] = None,
+                                on_progress: Optional[Callable[[str], None]] = None,
+                                original_text: Optional[str] = None):
+    """Translate a drill, sending only sections whose translation is not cached yet
+    
+    Falls back to a whole-drill translation (which then seeds the section cache) when
+    the drill has too few recognised sections, nothing is cached yet, or the model's
+    partial reply cannot be parsed. stats, if given, receives sections_total and
+    sections_reused. on_progress is passed through to whole-drill translations (partial
+    section replies are short and are not streamed). original_text is recorded in history
+    in place of a normalized text, as in translate_text. Returns (translation, error).
+    """
+    if stats is None:
+        stats = {}
+    stats.update(sections_total=0, sections_reused=0)
+    
+    sections = parse_drill_sections(text)
+    known = [name for name in sections if name != 'PREAMBLE']
+    whole_key = get_cache_key(text, prompt_template, model)
+    legacy_key = get_legacy_cache_key(text, prompt_template, model)
+    if cache is None or len(known) < MIN_SECTIONS:
+        return translate_text(client, text, prompt_template, model, cache=cache, history=history,
+                              on_progress=on_progress, original_text=original_text)
+    cached = lookup_translation(cache, whole_key, legacy_key)
+    if cached is not None:
+        METRICS.increment("translations_total", outcome="cached")
+        return cached, None
+    
+    units = get_section_units(sections, prompt_template, model)
+    fields: Dict[str, str] = {}
+    missing = []
+    for unit_fields, unit_key in units:
+        cached = lookup_translation(cache, unit_key)
+        if cached is None:
+            missing.append((unit_fields, unit_key))
+        else:
+            fields.update(json.loads(cached))
+    stats.update(sections_total=len(units), sections_reused=len(units) - len(missing))
+    
+    if len(missing) == len(units):
+        # The whole-drill key already missed above; translate_uncached does not look it up again
+        translation, error = translate_uncached(client, text, prompt_template, model, whole_key, cache=cache,
+                                                history=history, on_progress=on_progress,
+                                                original_text=original_text)
+        # Only cached when the requested model answered (see record_translation); fallback output is not seeded
+        if translation and cache.get(whole_key) is not None:
+            seed_section_cache(cache, units, parse_english_fields(translation))
+        return translation, error
+    
+    usage = {'input_tokens': 0, 'output_tokens': 0, 'cache_write_tokens': 0, 'cache_read_tokens': 0}
+    if missing:
+        requested = [field for unit_fields, _ in missing for field in unit_fields]
+        try:
+            returned, usage, served_model = request_section_fields(client, text, prompt_template, model, requested)
+        except Exception as e:
+            return None, str(e)
+        if returned is None:
+            stats.update(sections_reused=0)
+            return translate_uncached(client, text, prompt_template, model, whole_key, cache=cache,
+                                      history=history, on_progress=on_progress, original_text=original_text)
+        fields.update(returned)
+        if served_model == model:
+            seed_section_cache(cache, missing, returned)
+    else:
+        served_model = model
+    
+    translation = render_drill_fields(fields)
+    result = {'translation': translation, **usage, 'model': served_model}
+    # Like record_translation: fallback-model output goes to history but is not cached
+    if served_model == model:
+        cache.put(whole_key, make_cache_entry(model, result))
+    if history is not None:
+        entry = make_history_entry(text, prompt_template, model, result, original_text)
+        entry.update(sections_total=stats['sections_total'], sections_reused=stats['sections_reused'])
+        history.append(entry)
+    return translation, None
@@ -0,0 +1,281 @@
+"""Local HTTP/JSON translation service for other internal tools (CMS, subtitle pipeline)
+
+    python -m cv_translator serve --port 8710
+    curl -s localhost:8710/v1/translate -H "X-Client-Id: cms" -d '{"text": "CONTENIDO: ..."}'
+    {"translation": "**Topic**...", "model": "...", "cache_key": "v2_...", "coalesced": false}
+
+Requests go through the same translate_text() core and persistent cache as the
+web app and the CLI, so a drill translated in one is free in the others.
+Concurrent identical requests (same cache key) are coalesced: one API call is
+made and every waiting request gets its result. Each client (X-Client-Id
+header, or its address) may have SERVICE_CLIENT_CONCURRENCY requests in
+flight; further requests get 429 instead of queueing behind them.
+
+With --stub (or CV_TRANSLATOR_STUB_MODEL=1) replies come from an offline stub
+model, so tools can be tested against the service without an API key.
+"""
+import json
+import os
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, Optional, Tuple
+
+from .core import (
+    CLAUDE_MODELS,
+    DEFAULT_MODEL,
+    estimate_tokens,
+    get_cache_key,
+    get_default_drill_prompt,
+    get_default_general_prompt,
+    translate_text,
+)
+from .metrics import METRICS
+
+SERVICE_PORT = int(os.environ.get("CV_TRANSLATOR_SERVICE_PORT", "0"))
+SERVICE_CLIENT_CONCURRENCY = int(os.environ.get("CV_TRANSLATOR_SERVICE_CLIENT_CONCURRENCY", "4"))
+USE_STUB_MODEL = os.environ.get("CV_TRANSLATOR_STUB_MODEL", "") == "1"
+# Requests with a larger body are rejected before it is read
+SERVICE_MAX_BODY_BYTES = 1024 * 1024
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """Run at most one call per key at a time; callers arriving meanwhile wait for and share its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+
+    def do(self, key: str, function: Callable[[], object]) -> Tuple[object, bool]:
+        """Return (result, shared): shared is True when another caller's call produced the result"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = function()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+class ClientLimiter:
+    """Caps the requests each client has in flight; a request over the cap is refused, not queued"""
+
+    def __init__(self, limit: int = SERVICE_CLIENT_CONCURRENCY):
+        self.limit = max(1, limit)
+        self._active: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, client_id: str) -> bool:
+        with self._lock:
+            active = self._active.get(client_id, 0)
+            if active >= self.limit:
+                return False
+            self._active[client_id] = active + 1
+            return True
+
+    def release(self, client_id: str):
+        with self._lock:
+            active = self._active.get(client_id, 0) - 1
+            if active > 0:
+                self._active[client_id] = active
+            else:
+                self._active.pop(client_id, None)
+
+# The text tag build_translation_request wraps around the drill in the user message
+USER_TEXT_TAG_PATTERN = re.compile(r'^<[\w-]+>\n|\n</[\w-]+>$')
+
+class StubMessagesClient:
+    """Offline stand-in for an Anthropic client: messages.create answers after delay seconds, without network
+
+    The reply is produced by respond(params); by default a Topic header followed
+    by the text that was sent, so tests can tell which request a reply belongs
+    to. calls counts the requests that reached the model.
+    """
+
+    def __init__(self, delay: float = 0.0, respond: Optional[Callable[[dict], str]] = None):
+        self.delay = delay
+        self.respond = respond or (lambda params: "Topic\n- [offline translation]\n\nDescription\n- "
+                                   + USER_TEXT_TAG_PATTERN.sub('', params['messages'][0]['content']))
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.messages = SimpleNamespace(create=self.create)
+
+    def create(self, **params):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        text = self.respond(params)
+        return SimpleNamespace(
+            content=[SimpleNamespace(type="text", text=text)],
+            model=params['model'],
+            usage=SimpleNamespace(
+                input_tokens=estimate_tokens(params['system'][0]['text'] + params['messages'][0]['content']),
+                output_tokens=estimate_tokens(text),
+                cache_creation_input_tokens=0,
+                cache_read_input_tokens=0
+            )
+        )
+
+class ServiceError(Exception):
+    """A request the service refuses, with the HTTP status to answer it with"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class TranslationService:
+    """Validates translation requests and runs them through the shared cache, one API call per cache key
+
+    client is a (scheduled) Anthropic client or a StubMessagesClient; cache is
+    any get/put translation cache, normally the persistent one the web app uses.
+    """
+
+    def __init__(self, client, cache=None, history: Optional[list] = None,
+                 client_concurrency: int = SERVICE_CLIENT_CONCURRENCY, normalize: bool = True):
+        self.client = client
+        self.cache = cache
+        self.history = history
+        self.normalize = normalize
+        self.limiter = ClientLimiter(client_concurrency)
+        self.flights = SingleFlight()
+
+    def parse_request(self, request: dict) -> Tuple[str, str, str]:
+        """Return (text, prompt_template, model) for a request body, or raise ServiceError(400)"""
+        if not isinstance(request, dict):
+            raise ServiceError(400, "Request body must be a JSON object")
+        text = request.get('text')
+        if not isinstance(text, str) or not text.strip():
+            raise ServiceError(400, "'text' must be a non-empty string")
+        mode = request.get('mode', 'drill')
+        if not isinstance(mode, str) or mode not in ('drill', 'general'):
+            raise ServiceError(400, "'mode' must be 'drill' or 'general'")
+        model = request.get('model', DEFAULT_MODEL)
+        if not isinstance(model, str) or model not in CLAUDE_MODELS:
+            raise ServiceError(400, f"Unknown model {model!r}; use one of {', '.join(CLAUDE_MODELS)}")
+        prompt_template = request.get('prompt') or (
+            get_default_drill_prompt() if mode == 'drill' else get_default_general_prompt()
+        )
+        if not isinstance(prompt_template, str) or '{spanish_text}' not in prompt_template:
+            raise ServiceError(400, "'prompt' must be a template containing {spanish_text}")
+        # Normalized like the web app's default, so both produce the same cache keys
+        if mode == 'drill' and self.normalize and request.get('normalize', True):
+            from .normalize import normalize_drill_text
+            text = normalize_drill_text(text)
+        return text, prompt_template, model
+
+    def translate(self, request: dict, client_id: str = "") -> dict:
+        """Translate one request body; raises ServiceError for refused or failed requests"""
+        try:
+            text, prompt_template, model = self.parse_request(request)
+        except ServiceError:
+            METRICS.increment("service_requests_total", outcome="invalid")
+            raise
+        if not self.limiter.acquire(client_id):
+            METRICS.increment("service_requests_total", outcome="throttled")
+            raise ServiceError(429, f"Client {client_id!r} already has {self.limiter.limit} requests in flight")
+        try:
+            cache_key = get_cache_key(text, prompt_template, model)
+
+            def run():
+                stats = {}
+                translation, error = translate_text(self.client, text, prompt_template, model, cache=self.cache,
+                                                    history=self.history, stats=stats)
+                return translation, error, stats['model']
+
+            (translation, error, served_model), coalesced = self.flights.do(cache_key, run)
+        finally:
+            self.limiter.release(client_id)
+        if error:
+            METRICS.increment("service_requests_total", outcome="error")
+            raise ServiceError(502, error)
+        METRICS.increment("service_requests_total", outcome="coalesced" if coalesced else "ok")
+        # The model that answered, which differs from the requested one after a scheduler fallback
+        return {'translation': translation, 'model': served_model, 'cache_key': cache_key, 'coalesced': coalesced}
+
+def make_translation_server(service: TranslationService, port: int, host: str = "127.0.0.1"):
+    """Build (but do not start) the HTTP server: POST /v1/translate and GET /healthz"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class TranslationHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/healthz":
+                self.send_json(404, {'error': "Not found"})
+                return
+            self.send_json(200, {'status': "ok", 'in_flight': service.flights.in_flight()})
+
+        def do_POST(self):
+            if self.path.split("?")[0] != "/v1/translate":
+                self.send_json(404, {'error': "Not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                self.send_json(400, {'error': "Invalid Content-Length header"})
+                return
+            if length > SERVICE_MAX_BODY_BYTES:
+                self.send_json(413, {'error': f"Request body is larger than {SERVICE_MAX_BODY_BYTES} bytes"})
+                return
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self.send_json(400, {'error': "Request body is not valid JSON"})
+                return
+            client_id = self.headers.get("X-Client-Id") or self.client_address[0]
+            try:
+                reply = service.translate(request, client_id)
+            except ServiceError as e:
+                self.send_json(e.status, {'error': str(e)}, retry_after=1 if e.status == 429 else None)
+                return
+            except Exception as e:
+                # Answer instead of dropping the connection when a request hits a bug
+                METRICS.increment("service_requests_total", outcome="error")
+                self.send_json(500, {'error': f"Internal error: {type(e).__name__}"})
+                return
+            self.send_json(200, reply)
+
+        def send_json(self, status: int, body: dict, retry_after: Optional[int] = None):
+            data = json.dumps(body, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            if retry_after is not None:
+                self.send_header("Retry-After", str(retry_after))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), TranslationHandler)
+    server.daemon_threads = True
+    return server
+
+def start_translation_server(service: TranslationService, port: int, host: str = "127.0.0.1"):
+    """Serve translations from a daemon thread; returns the server"""
+    server = make_translation_server(service, port, host)
+    threading.Thread(target=server.serve_forever, name="translation-server", daemon=True).start()
+    return server
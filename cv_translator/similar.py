@@ -0,0 +1,202 @@
+"""Near-duplicate drill detection over translated history
+
+Academies reuse drill templates, so many new drills differ from one already
+translated only in whitespace, accents or a single rule line, which the
+exact-match cache key misses. Each Spanish input is reduced to a MinHash
+signature of its word shingles (accent-folded) and bucketed with
+locality-sensitive hashing, so finding close matches touches a handful of
+buckets instead of comparing against every stored drill. Numbers are kept in
+the shingles: a drill for other player counts or pitch sizes needs its own
+translation.
+
+A close match can be reused as-is when its numbers are the same (see
+same_numbers), or used as the base for a diff-only translation: sections with
+the same Spanish keep the match's English and only the others go to the model.
+"""
+import re
+import threading
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .core import make_history_entry
+from .sections import (
+    MIN_SECTIONS,
+    get_section_units,
+    parse_drill_sections,
+    parse_english_fields,
+    render_drill_fields,
+    request_section_fields,
+    seed_section_cache,
+    translate_drill_incremental,
+)
+from .search import tokenize
+
+SHINGLE_SIZE = 3
+MINHASH_PERMUTATIONS = 64
+# 16 bands of 4 rows: pairs above ~0.5 Jaccard similarity very likely share a bucket
+LSH_BANDS = 16
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+SIMILARITY_THRESHOLD = 0.7
+
+# Spreads CRC32 shingle hashes over the bins before binning (Knuth's multiplicative constant)
+HASH_MULTIPLIER = 2654435761
+EMPTY_BIN = 1 << 32
+
+NUMBER_PATTERN = re.compile(r'\d+(?:[.,]\d+)?')
+
+def same_numbers(text: str, other: str) -> bool:
+    """Whether two drills state the same numbers in the same order (players, sizes, times, ...)"""
+    return NUMBER_PATTERN.findall(text) == NUMBER_PATTERN.findall(other)
+
+def get_shingles(text: str) -> set:
+    """Hashed word shingles, numbers included"""
+    words = tokenize(text)
+    if len(words) < SHINGLE_SIZE:
+        words = words + [''] * (SHINGLE_SIZE - len(words))
+    return {
+        zlib.crc32(" ".join(words[i:i + SHINGLE_SIZE]).encode())
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+def get_minhash(shingles: set) -> Tuple[int, ...]:
+    """One-permutation MinHash: the minimum hash in each of MINHASH_PERMUTATIONS bins
+
+    One pass over the shingles instead of one per permutation. Empty bins (short
+    texts) borrow the next non-empty bin's value, offset by the distance, so two
+    signatures still agree only where the underlying sets do.
+    """
+    bins = [EMPTY_BIN] * MINHASH_PERMUTATIONS
+    for shingle in shingles:
+        value = (shingle * HASH_MULTIPLIER) & 0xFFFFFFFF
+        index = value % MINHASH_PERMUTATIONS
+        if value < bins[index]:
+            bins[index] = value
+    if EMPTY_BIN in bins and any(value != EMPTY_BIN for value in bins):
+        filled = list(bins)
+        for index, value in enumerate(bins):
+            offset = 1
+            while value == EMPTY_BIN:
+                value = bins[(index + offset) % MINHASH_PERMUTATIONS]
+                offset += 1
+            filled[index] = value + (offset - 1) * EMPTY_BIN
+        bins = filled
+    return tuple(bins)
+
+def estimate_similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity: the share of MinHash positions that agree"""
+    return sum(x == y for x, y in zip(first, second)) / len(first)
+
+class NearDuplicateIndex:
+    """MinHash/LSH index over Spanish drill inputs, keyed by history entry id
+
+    One instance is shared by all sessions (see get_similarity_index), so updates
+    and queries hold a lock.
+    """
+
+    def __init__(self):
+        self.signatures: Dict[int, Tuple[int, ...]] = {}
+        self.buckets: List[Dict[Tuple[int, ...], List[int]]] = [{} for _ in range(LSH_BANDS)]
+        self.last_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def _bands(self, signature: Tuple[int, ...]):
+        for band in range(LSH_BANDS):
+            yield band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+
+    def add(self, doc_id: int, text: str):
+        signature = get_minhash(get_shingles(text))
+        with self._lock:
+            self.signatures[doc_id] = signature
+            for band, key in self._bands(signature):
+                self.buckets[band].setdefault(key, []).append(doc_id)
+
+    def sync_store(self, store):
+        """Index drills recorded in the shared history store since the last sync"""
+        for entry in store.read_since(self.last_id):
+            if entry['type'] == 'drill':
+                self.add(entry['id'], entry['spanish_input'])
+            self.last_id = entry['id']
+
+    def query(self, text: str, threshold: float = SIMILARITY_THRESHOLD, limit: int = 3) -> List[Tuple[int, float]]:
+        """Ids of indexed drills at least threshold similar to text, most similar (then newest) first
+
+        Entries with identical signatures (the same drill translated again) are
+        reported once, using the newest.
+        """
+        signature = get_minhash(get_shingles(text))
+        with self._lock:
+            candidates = set()
+            for band, key in self._bands(signature):
+                candidates.update(self.buckets[band].get(key, ()))
+            scored = {}
+            for doc_id in candidates:
+                other = self.signatures[doc_id]
+                similarity = estimate_similarity(signature, other)
+                if similarity >= threshold and scored.get(other, (0, -1))[1] < doc_id:
+                    scored[other] = (similarity, doc_id)
+        ranked = sorted(scored.values(), reverse=True)
+        return [(doc_id, similarity) for similarity, doc_id in ranked[:limit]]
+
+def translate_against_neighbour(client, text: str, neighbour: dict, prompt_template: str, model: str,
+                                cache, history: Optional[list] = None, stats: Optional[dict] = None,
+                                on_progress: Optional[Callable[[str], None]] = None,
+                                original_text: Optional[str] = None):
+    """Translate a drill reusing a similar drill's translation for every unchanged section
+
+    Sections whose Spanish text is the same as the neighbour's keep the neighbour's
+    English; only the others go to the model, with the neighbour's translation as
+    reference. The neighbour's fields are never cached: they were written for another
+    drill, possibly with another prompt or model. Only the newly translated sections
+    are cached, and the stitched drill goes to history. Falls back to
+    translate_drill_incremental when no section can be reused. Returns (translation, error).
+    """
+    if stats is None:
+        stats = {}
+    stats.update(sections_total=0, sections_reused=0)
+
+    sections = parse_drill_sections(text)
+    units = get_section_units(sections, prompt_template, model)
+    neighbour_keys = {key for _, key in get_section_units(parse_drill_sections(neighbour['spanish_input']),
+                                                         prompt_template, model)}
+    neighbour_fields = parse_english_fields(neighbour['english_output'])
+    fields: Dict[str, str] = {}
+    missing = []
+    for unit_fields, unit_key in units:
+        if unit_key in neighbour_keys and all(neighbour_fields.get(field) for field in unit_fields):
+            fields.update((field, neighbour_fields[field]) for field in unit_fields)
+        else:
+            missing.append((unit_fields, unit_key))
+
+    known = [name for name in sections if name != 'PREAMBLE']
+    if len(known) < MIN_SECTIONS or len(missing) == len(units):
+        return translate_drill_incremental(client, text, prompt_template, model, cache=cache, history=history,
+                                           stats=stats, on_progress=on_progress, original_text=original_text)
+    stats.update(sections_total=len(units), sections_reused=len(units) - len(missing))
+
+    usage = {'input_tokens': 0, 'output_tokens': 0, 'cache_write_tokens': 0, 'cache_read_tokens': 0}
+    served_model = model
+    if missing:
+        requested = [field for unit_fields, _ in missing for field in unit_fields]
+        try:
+            returned, usage, served_model = request_section_fields(client, text, prompt_template, model, requested,
+                                                                   reference=neighbour['english_output'])
+        except Exception as e:
+            return None, str(e)
+        if returned is None:
+            stats.update(sections_reused=0)
+            return translate_drill_incremental(client, text, prompt_template, model, cache=cache, history=history,
+                                               stats=stats, on_progress=on_progress, original_text=original_text)
+        fields.update(returned)
+        if cache is not None and served_model == model:
+            seed_section_cache(cache, missing, returned)
+
+    translation = render_drill_fields(fields)
+    if history is not None:
+        entry = make_history_entry(text, prompt_template, model, {'translation': translation, **usage,
+                                                                  'model': served_model}, original_text)
+        entry.update(sections_total=stats['sections_total'], sections_reused=stats['sections_reused'])
+        history.append(entry)
+    return translation, None
@@ -0,0 +1,235 @@
+"""Structured drill translations: typed fields through tool use instead of free text
+
+The free-text reply has to be cleaned (clean_translation_output) and split back
+into fields with regexes before sections can be cached or compared. Here the
+model is made to call a record_drill_translation tool whose input schema has
+one property per field of the standard layout. The tool input is validated
+and rendered into the layout locally, so no output cleanup runs at all.
+
+The cache stores the fields as JSON, and history entries carry them under
+'fields', so single fields can be stored, indexed and diffed without parsing
+the rendered text.
+
+    translation, error = translate_drill_structured(client, text, prompt, model, cache=cache)
+"""
+import json
+import time
+from typing import Callable, Dict, List, Optional
+
+from .core import (
+    GENERATION_PARAMS,
+    build_translation_request,
+    get_cache_key,
+    get_usage_tokens,
+    lookup_translation,
+    make_cache_entry,
+    make_history_entry,
+    record_call_metrics,
+)
+from .metrics import METRICS
+from .sections import OUTPUT_FIELDS, render_drill_fields
+
+DRILL_TOOL_NAME = "record_drill_translation"
+
+# Tool input property for each field of the layout, in layout order
+FIELD_PROPERTIES = dict(zip(OUTPUT_FIELDS, [
+    "topic", "principle", "microcycle_day", "time", "players", "physical_focus",
+    "space_equipment", "description", "progressions", "coaching_points"
+]))
+# Fields a drill often does not state; the model may leave these empty
+OPTIONAL_FIELDS = ("Microcycle day", "Physical focus")
+
+def _text_property(description: str) -> dict:
+    return {"type": "string", "description": description}
+
+DRILL_TOOL = {
+    "name": DRILL_TOOL_NAME,
+    "description": "Record the English translation of the drill, one property per section of the output format.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "topic": _text_property("Main skill or technique focus"),
+            "principle": _text_property("Key coaching instruction or technical teaching point"),
+            "microcycle_day": _text_property("When this drill fits in training cycles; empty if not stated"),
+            "time": _text_property("Duration and number of sets"),
+            "players": _text_property("Total number of players needed"),
+            "physical_focus": _text_property("Specific conditioning aspect; empty if not stated"),
+            "space_equipment": _text_property("Field dimensions in yards and required equipment"),
+            "description": _text_property("Clear, step-by-step explanation in natural, flowing English"),
+            "progressions": {
+                "type": "object",
+                "properties": {
+                    "more_advanced": _text_property("Ways to increase difficulty"),
+                    "simplified": _text_property("Ways to reduce complexity"),
+                },
+                "required": ["more_advanced", "simplified"],
+            },
+            "coaching_points": {
+                "type": "array",
+                "minItems": 1,
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "title": _text_property("Brief title"),
+                        "instruction": _text_property("Specific, actionable instruction"),
+                    },
+                    "required": ["title", "instruction"],
+                },
+            },
+        },
+        "required": list(FIELD_PROPERTIES.values()),
+    },
+}
+
+def build_structured_request(prompt_template: str, text: str) -> dict:
+    """The regular cached system block and user turn, with the reply forced through the drill tool"""
+    request = build_translation_request(prompt_template, text)
+    request['messages'][0]['content'] += (
+        f"\n\nRecord the translation with the {DRILL_TOOL_NAME} tool. Put in each property exactly what "
+        "you would write under that heading, without the heading itself or leading dashes."
+    )
+    request['tools'] = [DRILL_TOOL]
+    request['tool_choice'] = {"type": "tool", "name": DRILL_TOOL_NAME}
+    return request
+
+def _require_text(value, name: str, problems: List[str], optional: bool = False) -> str:
+    if value is None and optional:
+        return ""
+    if not isinstance(value, str):
+        problems.append(f"{name} must be a string")
+        return ""
+    value = value.strip()
+    if not value and not optional:
+        problems.append(f"{name} is empty")
+    return value
+
+def validate_drill_fields(data) -> dict:
+    """Check a tool input against the drill schema and return it with stripped strings
+
+    Raises ValueError listing every problem, so one failed reply reports all of them.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Drill fields must be an object")
+    problems: List[str] = []
+    fields = {}
+    for field, name in FIELD_PROPERTIES.items():
+        if field in ("Progressions", "Coaching points"):
+            continue
+        fields[name] = _require_text(data.get(name), name, problems, optional=field in OPTIONAL_FIELDS)
+
+    progressions = data.get("progressions")
+    if isinstance(progressions, dict):
+        fields["progressions"] = {
+            key: _require_text(progressions.get(key), f"progressions.{key}", problems)
+            for key in ("more_advanced", "simplified")
+        }
+    else:
+        problems.append("progressions must be an object")
+
+    points = data.get("coaching_points")
+    if isinstance(points, list) and points:
+        fields["coaching_points"] = []
+        for i, point in enumerate(points):
+            if not isinstance(point, dict):
+                problems.append(f"coaching_points[{i}] must be an object")
+                continue
+            fields["coaching_points"].append({
+                key: _require_text(point.get(key), f"coaching_points[{i}].{key}", problems)
+                for key in ("title", "instruction")
+            })
+    else:
+        problems.append("coaching_points must be a non-empty list")
+
+    if problems:
+        raise ValueError("Invalid drill fields: " + "; ".join(problems))
+    return fields
+
+def _bullet(text: str) -> str:
+    return text if text.startswith("- ") else f"- {text}"
+
+def format_drill_fields(fields: dict) -> Dict[str, str]:
+    """The text under each heading of the layout, as the free-text prompt would have written it"""
+    formatted = {
+        field: _bullet(fields[name]) for field, name in FIELD_PROPERTIES.items()
+        if isinstance(fields.get(name), str) and fields[name]
+    }
+    progressions = fields["progressions"]
+    formatted["Progressions"] = (
+        f"- More advanced: {progressions['more_advanced']}\n- Simplified: {progressions['simplified']}"
+    )
+    formatted["Coaching points"] = "\n".join(
+        f"- {point['title']}: {point['instruction']}" for point in fields["coaching_points"]
+    )
+    return formatted
+
+def render_structured_drill(fields: dict) -> str:
+    """Render validated fields into the standard Topic/Principle/... layout"""
+    return render_drill_fields(format_drill_fields(fields))
+
+def get_tool_input(message) -> dict:
+    """The input of the drill tool call in a message; raises ValueError when the model did not call it"""
+    for block in message.content:
+        if getattr(block, 'type', None) == "tool_use" and block.name == DRILL_TOOL_NAME:
+            return block.input
+    raise ValueError(f"The model did not call {DRILL_TOOL_NAME}")
+
+def request_structured_translation(client, text: str, prompt_template: str, model: str) -> dict:
+    """Call the API for one structured translation; the result also carries the validated 'fields'"""
+    started = time.perf_counter()
+    message = client.messages.create(
+        model=model,
+        **GENERATION_PARAMS,
+        **build_structured_request(prompt_template, text)
+    )
+    fields = validate_drill_fields(get_tool_input(message))
+    result = {
+        'translation': render_structured_drill(fields),
+        'fields': fields,
+        **get_usage_tokens(message.usage),
+        # May differ from the requested model when the scheduler fell back
+        'model': getattr(message, 'model', None) or model
+    }
+    record_call_metrics(result, 'structured', time.perf_counter() - started)
+    return result
+
+def translate_drill_structured(client, text: str, prompt_template: str, model: str, cache=None,
+                               history: Optional[list] = None, on_progress: Optional[Callable[[str], None]] = None,
+                               original_text: Optional[str] = None):
+    """Translate a drill into validated fields and render them locally; returns (translation, error)
+
+    Same cache and history contract as translate_text, but the cache entry holds the
+    fields as JSON (under its own key kind) and the history entry has them under
+    'fields'. Tool input is not streamed; on_progress receives the rendered drill once.
+    """
+    if not text.strip():
+        return None, "Please enter text to translate"
+
+    cache_key = get_cache_key(text, prompt_template, model, kind="structured")
+    cached = lookup_translation(cache, cache_key)
+    if cached is not None:
+        METRICS.increment("translations_total", outcome="cached")
+        translation = render_structured_drill(json.loads(cached))
+        if on_progress:
+            on_progress(translation)
+        return translation, None
+
+    try:
+        result = request_structured_translation(client, text, prompt_template, model)
+    except Exception as e:
+        METRICS.increment("translations_total", outcome="error")
+        return None, str(e)
+
+    # Reported before anything is recorded: a cancelled job (on_progress raising) then stores nothing,
+    # as with a cancelled stream, instead of ending "cancelled" with its translation kept
+    if on_progress:
+        on_progress(result['translation'])
+    # Like record_translation: fallback-model results go to history but are not cached
+    if cache is not None and result['model'] == model:
+        cache.put(cache_key, make_cache_entry(model, {**result, 'translation': json.dumps(result['fields'],
+                                                                                          ensure_ascii=False)}))
+    if history is not None:
+        entry = make_history_entry(text, prompt_template, model, result, original_text)
+        entry['fields'] = result['fields']
+        history.append(entry)
+    METRICS.increment("translations_total", outcome="translated")
+    return result['translation'], None
@@ -0,0 +1,179 @@
+"""Token and cost forecasting calibrated against real API usage
+
+The character-count heuristic in core.estimate_tokens is only a starting point.
+Every finished translation records the true input/output token counts, so a
+least-squares line per (model, translation type) maps input length to tokens
+far more closely than a fixed chars-per-token ratio. Fits are updated
+incrementally from history and estimates are memoized per text hash, so
+Streamlit reruns on every keystroke do no repeated work.
+"""
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .core import (
+    build_translation_request,
+    calculate_estimated_cost,
+    estimate_tokens,
+    get_text_hash,
+    get_translation_type,
+    safe_get,
+)
+
+# Below this many observations a fit is too noisy to trust; fall back to the heuristic
+MIN_CALIBRATION_SAMPLES = 3
+MEMO_SIZE = 512
+
+class LinearFit:
+    """Running ordinary least squares fit of y = slope * x + intercept"""
+    
+    __slots__ = ('n', 'sum_x', 'sum_y', 'sum_xx', 'sum_xy')
+    
+    def __init__(self):
+        self.n = 0
+        self.sum_x = self.sum_y = self.sum_xx = self.sum_xy = 0.0
+    
+    def add(self, x: float, y: float):
+        self.n += 1
+        self.sum_x += x
+        self.sum_y += y
+        self.sum_xx += x * x
+        self.sum_xy += x * y
+    
+    def coefficients(self) -> Optional[Tuple[float, float]]:
+        """Return (slope, intercept), or None if there is not enough spread in x to fit"""
+        if self.n < MIN_CALIBRATION_SAMPLES:
+            return None
+        denominator = self.n * self.sum_xx - self.sum_x ** 2
+        if denominator <= 1e-9:
+            return None
+        slope = (self.n * self.sum_xy - self.sum_x * self.sum_y) / denominator
+        intercept = (self.sum_y - slope * self.sum_x) / self.n
+        return slope, intercept
+    
+    def predict(self, x: float) -> Optional[int]:
+        coefficients = self.coefficients()
+        if coefficients is None:
+            return None
+        slope, intercept = coefficients
+        return max(int(round(slope * x + intercept)), 0)
+
+def is_whole_request(entry: dict) -> bool:
+    """Whether an entry's usage is one plain request for its whole input
+    
+    Section replies (sections_total), document chunks (chunks) and structured
+    tool calls (fields) use other request shapes and would skew the fits.
+    """
+    return not any(safe_get(entry, key, None) is not None for key in ('sections_total', 'chunks', 'fields'))
+
+@lru_cache(maxsize=32)
+def estimate_prompt_overhead(prompt_template: str, model: str) -> int:
+    """Heuristic token count of a template's static instructions (computed once per template)"""
+    return estimate_tokens(prompt_template.format(spanish_text=""), model)
+
+class TokenEstimator:
+    """Forecast input/output tokens for a translation, calibrated from translation history"""
+    
+    def __init__(self):
+        self._fits: Dict[Tuple[str, str, str], LinearFit] = {}
+        self._seen = 0
+        self._memo: "OrderedDict[tuple, dict]" = OrderedDict()
+    
+    def observe(self, entry: dict):
+        """Add one history entry's real usage to the fits
+        
+        Input is fitted on plain input_tokens, which is what an estimate is priced at;
+        prompt cache writes and reads are billed separately.
+        """
+        text = safe_get(entry, 'spanish_input', '')
+        if not text or not is_whole_request(entry):
+            return
+        key = (safe_get(entry, 'model', ''), safe_get(entry, 'type', 'drill'))
+        self._fits.setdefault(key + ('input',), LinearFit()).add(len(text), safe_get(entry, 'input_tokens', 0))
+        self._fits.setdefault(key + ('output',), LinearFit()).add(len(text), safe_get(entry, 'output_tokens', 0))
+    
+    def calibrate(self, history: List[dict]):
+        """Fold in history entries added since the last call (history is append-only)"""
+        if len(history) < self._seen:
+            # History was cleared; start over
+            self._fits.clear()
+            self._seen = 0
+        if len(history) == self._seen:
+            return
+        for entry in history[self._seen:]:
+            self.observe(entry)
+        self._seen = len(history)
+        self._memo.clear()
+    
+    def samples(self, model: str, kind: str) -> int:
+        fit = self._fits.get((model, kind, 'input'))
+        return fit.n if fit else 0
+    
+    def estimate(self, text: str, prompt_template: str, model: str) -> dict:
+        """Forecast tokens for translating text with prompt_template on model
+        
+        Returns input_tokens, output_tokens, text_tokens and whether the numbers
+        come from a calibrated fit or the heuristic fallback.
+        """
+        memo_key = (get_text_hash(text), get_text_hash(prompt_template), model)
+        if memo_key in self._memo:
+            self._memo.move_to_end(memo_key)
+            return self._memo[memo_key]
+        
+        kind = get_translation_type(prompt_template)
+        text_tokens = estimate_tokens(text, model)
+        input_fit = self._fits.get((model, kind, 'input'))
+        output_fit = self._fits.get((model, kind, 'output'))
+        input_tokens = input_fit.predict(len(text)) if input_fit else None
+        output_tokens = output_fit.predict(len(text)) if output_fit else None
+        calibrated = input_tokens is not None and output_tokens is not None
+        
+        if input_tokens is None:
+            input_tokens = estimate_prompt_overhead(prompt_template, model) + text_tokens
+        if output_tokens is None:
+            # Same rule of thumb the app has always used
+            output_tokens = max(len(text) // 2, 500) if kind == 'drill' else text_tokens // 2
+        
+        result = {
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'text_tokens': text_tokens,
+            'calibrated': calibrated
+        }
+        self._memo[memo_key] = result
+        if len(self._memo) > MEMO_SIZE:
+            self._memo.popitem(last=False)
+        return result
+    
+    def forecast_cost(self, texts: Iterable[str], prompt_template: str, model: str, batch: bool = False) -> dict:
+        """Total forecast tokens and cost for translating many texts"""
+        input_tokens = output_tokens = 0
+        for text in texts:
+            estimate = self.estimate(text, prompt_template, model)
+            input_tokens += estimate['input_tokens']
+            output_tokens += estimate['output_tokens']
+        return {
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'cost': calculate_estimated_cost(input_tokens, output_tokens, model, batch=batch)
+        }
+
+# Shared by every session's thread
+_api_count_memo: "OrderedDict[tuple, int]" = OrderedDict()
+_api_count_lock = threading.Lock()
+
+def count_tokens_api(client, text: str, prompt_template: str, model: str) -> int:
+    """Exact input token count from the token counting endpoint (free, but a network call)"""
+    memo_key = (get_text_hash(text), get_text_hash(prompt_template), model)
+    with _api_count_lock:
+        if memo_key in _api_count_memo:
+            _api_count_memo.move_to_end(memo_key)
+            return _api_count_memo[memo_key]
+    # The call is made outside the lock, so one slow count does not hold up the others
+    response = client.messages.count_tokens(model=model, **build_translation_request(prompt_template, text))
+    with _api_count_lock:
+        _api_count_memo[memo_key] = response.input_tokens
+        if len(_api_count_memo) > MEMO_SIZE:
+            _api_count_memo.popitem(last=False)
+    return response.input_tokens
@@ -0,0 +1,115 @@
+"""Bulk jobs: submit and collect through FakeMessageBatches, resumed from saved manifests"""
+import os
+
+import pytest
+
+from cv_translator.bulk import (
+    FakeMessageBatches,
+    collect_bulk_job,
+    load_bulk_manifests,
+    release_bulk_job,
+    submit_bulk_job,
+)
+from cv_translator.cache import PersistentTranslationCache
+from cv_translator.core import DEFAULT_MODEL, get_cache_key, get_default_drill_prompt
+
+PROMPT = get_default_drill_prompt()
+DRILLS = [
+    "CONTENIDO: Pase\nDESCRIPCIÓN: Rondo 4v4+2.",
+    "CONTENIDO: Presión\nDESCRIPCIÓN: 6v6 en 40x30.",
+    "CONTENIDO: Pase\nDESCRIPCIÓN: Rondo 4v4+2.",
+]
+
+@pytest.fixture
+def jobs_dir(tmp_path):
+    return str(tmp_path / "bulk_jobs")
+
+@pytest.fixture
+def cache(tmp_path):
+    return PersistentTranslationCache(str(tmp_path / "cache.db"), 3600, 1000)
+
+def fake_batches(jobs_dir, complete_after=0.0):
+    """A fake endpoint reading the batches earlier runs submitted, like a separate CLI run"""
+    return FakeMessageBatches(complete_after, state_path=os.path.join(jobs_dir, "fake_batches.state"))
+
+def test_submit_then_collect_across_manifest_loads(jobs_dir, cache):
+    batches = fake_batches(jobs_dir, complete_after=3600)
+    manifest = submit_bulk_job(batches, DRILLS, PROMPT, DEFAULT_MODEL, cache=cache, jobs_dir=jobs_dir)
+    assert manifest['status'] == 'submitted'
+    assert len(manifest['drills']) == 2
+    sent = [request['custom_id'] for request in batches._batches[manifest['batch_ids'][0]]['requests']]
+    assert sorted(sent) == sorted({get_cache_key(drill, PROMPT, DEFAULT_MODEL) for drill in DRILLS})
+
+    # First collection: the batch is still running
+    history = []
+    [loaded] = load_bulk_manifests(jobs_dir)
+    loaded = collect_bulk_job(fake_batches(jobs_dir, complete_after=3600), loaded, cache, history, jobs_dir)
+    assert loaded['status'] == 'in_progress' and not history
+
+    # Second collection from freshly loaded manifests: the batch has ended
+    [loaded] = load_bulk_manifests(jobs_dir)
+    loaded = collect_bulk_job(fake_batches(jobs_dir), loaded, cache, history, jobs_dir)
+    assert loaded['status'] == 'complete'
+    assert sorted(loaded['collected']) == sorted(sent)
+    assert len(history) == 2 and all(entry['batch'] for entry in history)
+    for drill in DRILLS:
+        assert cache.get(get_cache_key(drill, PROMPT, DEFAULT_MODEL)) is not None
+
+    # Collecting again records nothing twice, and everything is now cached
+    [loaded] = load_bulk_manifests(jobs_dir)
+    collect_bulk_job(fake_batches(jobs_dir), loaded, cache, history, jobs_dir)
+    assert len(history) == 2
+    assert submit_bulk_job(fake_batches(jobs_dir), DRILLS, PROMPT, DEFAULT_MODEL, cache=cache,
+                           jobs_dir=jobs_dir) is None
+
+def test_drills_waiting_in_an_unfinished_job_are_not_sent_again(jobs_dir, cache):
+    submit_bulk_job(fake_batches(jobs_dir, complete_after=3600), DRILLS[:2], PROMPT, DEFAULT_MODEL,
+                    cache=cache, jobs_dir=jobs_dir)
+    manifest = submit_bulk_job(fake_batches(jobs_dir, complete_after=3600), DRILLS + ["CONTENIDO: Tiro"],
+                               PROMPT, DEFAULT_MODEL, cache=cache, jobs_dir=jobs_dir)
+    assert list(manifest['drills'].values()) == ["CONTENIDO: Tiro"]
+
+def test_manifest_is_saved_pending_before_the_batch_is_created(jobs_dir, cache):
+    class CrashingBatches(FakeMessageBatches):
+        def create(self, requests):
+            [manifest] = load_bulk_manifests(jobs_dir)
+            assert manifest['status'] == 'pending'
+            assert sorted(manifest['drills']) == sorted(request['custom_id'] for request in requests)
+            raise RuntimeError("connection reset")
+
+    with pytest.raises(RuntimeError):
+        submit_bulk_job(CrashingBatches(), DRILLS, PROMPT, DEFAULT_MODEL, cache=cache, jobs_dir=jobs_dir)
+    [manifest] = load_bulk_manifests(jobs_dir)
+    assert manifest['status'] == 'pending' and manifest['batch_ids'] == []
+
+    # Collecting finds nothing to wait for, but the job is not complete: the batch may exist anyway
+    manifest = collect_bulk_job(fake_batches(jobs_dir), manifest, cache, [], jobs_dir)
+    assert manifest['status'] == 'pending'
+    assert submit_bulk_job(fake_batches(jobs_dir), DRILLS, PROMPT, DEFAULT_MODEL, cache=cache,
+                           jobs_dir=jobs_dir) is None
+
+    # Once released, the drills can be submitted again
+    release_bulk_job(manifest, jobs_dir)
+    manifest = submit_bulk_job(fake_batches(jobs_dir), DRILLS, PROMPT, DEFAULT_MODEL, cache=cache, jobs_dir=jobs_dir)
+    assert len(manifest['drills']) == 2
+
+def test_drills_of_an_unsent_batch_are_not_marked_complete(jobs_dir, cache):
+    class FailingSecondBatch(FakeMessageBatches):
+        def create(self, requests):
+            if self._batches:
+                raise RuntimeError("connection reset")
+            return super().create(requests)
+
+    batches = FailingSecondBatch(state_path=os.path.join(jobs_dir, "fake_batches.state"))
+    with pytest.raises(RuntimeError):
+        submit_bulk_job(batches, DRILLS, PROMPT, DEFAULT_MODEL, cache=cache, jobs_dir=jobs_dir,
+                        max_requests_per_batch=1)
+    [manifest] = load_bulk_manifests(jobs_dir)
+    assert len(manifest['batch_ids']) == 1
+
+    history = []
+    manifest = collect_bulk_job(fake_batches(jobs_dir), manifest, cache, history, jobs_dir)
+    assert len(history) == 1 and len(manifest['collected']) == 1
+    assert manifest['status'] == 'pending'
+    [manifest] = load_bulk_manifests(jobs_dir)
+    assert manifest['status'] == 'pending'
@@ -0,0 +1,26 @@
+"""Command line: cost estimates calibrated from several history files"""
+import json
+
+import pytest
+
+from cv_translator.cli import main
+from cv_translator.core import DEFAULT_MODEL
+
+def write_history_file(path, count, offset=0):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(offset, offset + count):
+            text = "CONTENIDO: Rondo " + "x" * (100 * (i + 1))
+            f.write(json.dumps({'type': 'drill', 'model': DEFAULT_MODEL, 'spanish_input': text,
+                                'english_output': "**Topic**", 'input_tokens': 1000 + len(text) // 4,
+                                'output_tokens': len(text) // 2}) + "\n")
+
+@pytest.mark.parametrize("first, second", [(5, 3), (5, 6)])
+def test_estimate_calibrates_from_every_history_file(tmp_path, capsys, first, second):
+    drill = tmp_path / "drill.txt"
+    drill.write_text("CONTENIDO: Pase\nDESCRIPCIÓN: Rondo 4v4+2.", encoding="utf-8")
+    write_history_file(tmp_path / "a.jsonl", first)
+    write_history_file(tmp_path / "b.jsonl", second, offset=first)
+
+    assert main(["estimate", str(drill), "--calibrate-from", str(tmp_path / "a.jsonl"),
+                 "--calibrate-from", str(tmp_path / "b.jsonl")]) == 0
+    assert f"Calibrated from {first + second} drill translations" in capsys.readouterr().out
@@ -0,0 +1,51 @@
+"""History export in every format, from the compact records the web app keeps"""
+import csv
+import json
+
+import pytest
+
+from cv_translator.export import EXPORT_FORMATS, pyarrow_available, write_export
+from cv_translator.history import RecordedHistory
+from cv_translator.memory import TextStore
+
+ENTRIES = [
+    {'timestamp': "2026-10-01 09:00:00", 'type': 'drill', 'model': "claude-sonnet-4-5-20250929",
+     'spanish_input': "CONTENIDO: Pase", 'english_output': "**Topic**\n- Passing",
+     'input_tokens': 900, 'output_tokens': 300, 'cache_write_tokens': 0, 'cache_read_tokens': 800},
+    {'timestamp': "2026-10-01 09:05:00", 'type': 'general', 'model': "claude-sonnet-4-5-20250929",
+     'spanish_input': "Presión tras pérdida", 'english_output': "Counter-pressing",
+     'input_tokens': 400, 'output_tokens': 100, 'batch': True, 'chunks': 2},
+]
+
+@pytest.fixture
+def history(tmp_path):
+    store = TextStore(1024 * 1024, str(tmp_path))
+    history = RecordedHistory(None, bodies=store)
+    for entry in ENTRIES:
+        history.append(entry)
+    yield history
+    store.close()
+
+@pytest.mark.parametrize("export_format", sorted(EXPORT_FORMATS))
+def test_recorded_history_exports_in_every_format(history, tmp_path, export_format):
+    if export_format in ("parquet", "arrow") and not pyarrow_available():
+        pytest.skip("pyarrow is not installed")
+    path = str(tmp_path / f"history.{export_format}")
+    assert write_export(history, path) == len(ENTRIES)
+
+    if export_format == "json":
+        with open(path, encoding="utf-8") as f:
+            assert json.load(f) == ENTRIES
+    elif export_format == "jsonl":
+        with open(path, encoding="utf-8") as f:
+            assert [json.loads(line) for line in f] == ENTRIES
+    elif export_format == "csv":
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+        assert [row['english_output'] for row in rows] == [entry['english_output'] for entry in ENTRIES]
+    else:
+        import pyarrow.ipc
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(path) if export_format == "parquet" else pyarrow.ipc.open_file(path).read_all()
+        assert table.column('spanish_input').to_pylist() == [entry['spanish_input'] for entry in ENTRIES]
+        assert table.column('batch').to_pylist() == [False, True]
@@ -0,0 +1,157 @@
+"""Translation service: request coalescing, served model and error responses, against the offline stub"""
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+from cv_translator.cache import PersistentTranslationCache
+from cv_translator.core import DEFAULT_MODEL, FALLBACK_MODELS
+from cv_translator.service import (
+    SERVICE_MAX_BODY_BYTES,
+    StubMessagesClient,
+    TranslationService,
+    make_translation_server,
+)
+
+DRILL = "CONTENIDO: Pase\nCONSIGNA: Apoyo\nDESCRIPCIÓN: Rondo 4v4+2 en 20x20."
+
+@pytest.fixture
+def cache(tmp_path):
+    return PersistentTranslationCache(str(tmp_path / "cache.db"), 3600, 1000)
+
+def serve(service):
+    """Start the HTTP server on a free port; returns (server, post(body, headers) -> (status, json, headers))"""
+    server = make_translation_server(service, 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def post(body, headers=None, path="/v1/translate"):
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        conn.request("POST", path, data, {"Content-Type": "application/json", **(headers or {})})
+        response = conn.getresponse()
+        result = response.status, json.loads(response.read()), dict(response.getheaders())
+        conn.close()
+        return result
+
+    return server, post
+
+@pytest.fixture
+def stub():
+    return StubMessagesClient(delay=0.3)
+
+@pytest.fixture
+def post(stub, cache):
+    server, post = serve(TranslationService(stub, cache=cache, history=[]))
+    yield post
+    server.shutdown()
+    server.server_close()
+
+def test_concurrent_identical_requests_make_one_upstream_call(stub, post):
+    barrier = threading.Barrier(6)
+    replies = []
+
+    def request(index):
+        barrier.wait()
+        replies.append(post({"text": DRILL}, {"X-Client-Id": f"tool-{index}"}))
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stub.calls == 1
+    assert [status for status, _, _ in replies] == [200] * 6
+    assert sorted(body['coalesced'] for _, body, _ in replies) == [False] + [True] * 5
+    assert len({body['translation'] for _, body, _ in replies}) == 1
+
+    # Served from the cache afterwards
+    status, body, _ = post({"text": DRILL})
+    assert status == 200 and stub.calls == 1 and not body['coalesced']
+
+def test_reply_reports_the_model_that_served_it(cache):
+    fallback = FALLBACK_MODELS[DEFAULT_MODEL]
+    stub = StubMessagesClient()
+    create = stub.create
+    stub.messages.create = lambda **params: create(**{**params, 'model': fallback})
+    service = TranslationService(stub, cache=cache)
+
+    reply = service.translate({"text": DRILL})
+    assert reply['model'] == fallback
+    # Fallback output is not cached, so the preferred model is tried again
+    service.translate({"text": DRILL})
+    assert stub.calls == 2
+
+@pytest.mark.parametrize("body, message", [
+    (b"{not json", "not valid JSON"),
+    ({"text": ""}, "'text'"),
+    ({"text": DRILL, "mode": "poem"}, "'mode'"),
+    ({"text": DRILL, "model": "gpt-4"}, "Unknown model"),
+    ({"text": DRILL, "model": ["x"]}, "Unknown model"),
+    ({"text": DRILL, "mode": {"drill": True}}, "'mode'"),
+    ({"text": DRILL, "prompt": "Translate this"}, "'prompt'"),
+    ([DRILL], "JSON object"),
+])
+def test_invalid_requests_get_400(post, stub, body, message):
+    status, reply, _ = post(body)
+    assert status == 400
+    assert message in reply['error']
+    assert stub.calls == 0
+
+@pytest.mark.parametrize("length", ["abc", "-5"])
+def test_malformed_content_length_gets_400(post, length):
+    status, reply, _ = post(b"{}", {"Content-Length": length})
+    assert status == 400
+    assert "Content-Length" in reply['error']
+
+def test_oversized_body_gets_413(post):
+    status, _, _ = post(b"{}", {"Content-Length": str(SERVICE_MAX_BODY_BYTES + 1)})
+    assert status == 413
+
+def test_unknown_path_gets_404(post):
+    status, _, _ = post({"text": DRILL}, path="/v1/other")
+    assert status == 404
+
+def test_requests_over_the_client_limit_get_429(cache):
+    stub = StubMessagesClient(delay=0.5)
+    server, post = serve(TranslationService(stub, cache=cache, client_concurrency=1))
+    try:
+        first = threading.Thread(target=post, args=({"text": DRILL}, {"X-Client-Id": "cms"}))
+        first.start()
+        while stub.calls == 0:
+            time.sleep(0.01)
+        status, reply, headers = post({"text": DRILL + " Variante."}, {"X-Client-Id": "cms"})
+        first.join()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert status == 429
+    assert headers.get("Retry-After") == "1"
+    assert stub.calls == 1
+
+def test_unexpected_errors_get_500(cache):
+    service = TranslationService(StubMessagesClient(), cache=cache)
+    service.parse_request = lambda request: 1 / 0
+    server, post = serve(service)
+    try:
+        status, reply, _ = post({"text": DRILL})
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert status == 500
+    assert "ZeroDivisionError" in reply['error']
+
+def test_upstream_errors_get_502(cache):
+    def fail(params):
+        raise RuntimeError("overloaded")
+
+    server, post = serve(TranslationService(StubMessagesClient(respond=fail), cache=cache))
+    try:
+        status, reply, _ = post({"text": DRILL})
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert status == 502
+    assert "overloaded" in reply['error']